@@ -10,40 +10,113 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import sys
+from types import ModuleType
+
 __version__ = '0.11.dev0'
 
-# utilities we import from Werkzeug and Jinja2 that are unused
-# in the module but are exported as public interface.
-from werkzeug.exceptions import abort
-from werkzeug.utils import redirect
-from jinja2 import Markup, escape
-
-from .app import Keyes, Request, Response
-from .config import Config
-from .helpers import url_for, flash, send_file, send_from_directory, \
-     get_flashed_messages, get_template_attribute, make_response, safe_join, \
-     stream_with_context
-from .globals import current_app, g, request, session, _request_ctx_stack, \
-     _app_ctx_stack
-from .ctx import has_request_context, has_app_context, \
-     after_this_request, copy_current_request_context
-from .blueprints import Blueprint
-from .templating import render_template, render_template_string
-
-# the signals
-from .signals import signals_available, template_rendered, request_started, \
-     request_finished, got_request_exception, request_tearing_down, \
-     appcontext_tearing_down, appcontext_pushed, \
-     appcontext_popped, message_flashed, before_render_template
-
-# We're not exposing the actual json module but a convenient wrapper around
-# it.
-from . import json
-
-# This was the only thing that keyes used to export at one point and it had
-# a more generic name.
-jsonify = json.jsonify
-
-# backwards compat, goes away in 1.0
-from .sessions import SecureCookieSession as Session
-json_available = True
+# The public interface is imported lazily so that importing the package
+# does not pull in Jinja2, Werkzeug's routing, itsdangerous and click
+# before they are needed.  The objects are grouped by the module they come
+# from, accessing one of them imports the module and sets all objects of
+# the group on the package.  Modules starting with a dot are relative to
+# the package.
+all_by_module = {
+    # utilities we import from Werkzeug and Jinja2 that are unused
+    # in the module but are exported as public interface.
+    'werkzeug.exceptions': ['abort'],
+    'werkzeug.utils': ['redirect'],
+    'jinja2': ['Markup', 'escape'],
+
+    '.app': ['Keyes', 'Request', 'Response'],
+    '.wrappers': ['DeadlineExceeded'],
+    '.config': ['Config'],
+    '.helpers': ['url_for', 'flash', 'send_file', 'send_from_directory',
+                 'get_flashed_messages', 'get_template_attribute',
+                 'make_response', 'safe_join', 'stream_with_context'],
+    '.globals': ['current_app', 'g', 'request', 'session',
+                 '_request_ctx_stack', '_app_ctx_stack'],
+    '.ctx': ['has_request_context', 'has_app_context',
+             'after_this_request', 'copy_current_request_context'],
+    '.blueprints': ['Blueprint'],
+    '.templating': ['render_template', 'render_template_string'],
+
+    # the signals
+    '.signals': ['signals_available', 'template_rendered', 'request_started',
+                 'request_finished', 'got_request_exception',
+                 'request_tearing_down', 'appcontext_tearing_down',
+                 'appcontext_pushed', 'appcontext_popped', 'message_flashed',
+                 'before_render_template'],
+
+    # This was the only thing that keyes used to export at one point and it
+    # had a more generic name.
+    '.json': ['jsonify'],
+
+    # backwards compat, goes away in 1.0
+    '.sessions': ['Session'],
+}
+
+# objects that are exported under a different name than in their module.
+renamed_objects = {'Session': 'SecureCookieSession'}
+
+# modules that are available as attributes of the package.  We're not
+# exposing the actual json module but a convenient wrapper around it.
+attribute_modules = frozenset(['app', 'blueprints', 'cli', 'config', 'ctx',
+                               'globals', 'helpers', 'json', 'sessions',
+                               'signals', 'templating', 'wrappers'])
+
+# attribute modules that ``from keyes import *`` does not import because
+# they pull in optional dependencies such as click.
+unexported_modules = frozenset(['cli'])
+
+object_origins = {}
+for module, items in all_by_module.items():
+    for item in items:
+        object_origins[item] = module
+
+
+class module(ModuleType):
+    """Automatically import objects from the modules."""
+
+    def __getattr__(self, name):
+        if name in object_origins:
+            module_name = object_origins[name]
+            if module_name.startswith('.'):
+                module_name = __name__ + module_name
+            module = __import__(module_name, None, None, ['__name__'])
+            for extra_name in all_by_module[object_origins[name]]:
+                setattr(self, extra_name,
+                        getattr(module, renamed_objects.get(extra_name,
+                                                            extra_name)))
+        elif name in attribute_modules:
+            __import__(__name__ + '.' + name)
+        return ModuleType.__getattribute__(self, name)
+
+    def __dir__(self):
+        """Just show what we want to show."""
+        result = list(new_module.__all__)
+        result.extend(('__file__', '__doc__', '__all__', '__docformat__',
+                       '__name__', '__path__', '__package__',
+                       '__version__'))
+        return result
+
+
+# keep a reference to this module so that it's not garbage collected
+old_module = sys.modules[__name__]
+
+# setup the new module and patch it into the dict of loaded modules
+new_module = sys.modules[__name__] = module(__name__)
+new_module.__dict__.update({
+    '__file__':         __file__,
+    '__package__':      __name__,
+    '__path__':         __path__,
+    '__doc__':          __doc__,
+    '__version__':      __version__,
+    '__all__':          tuple(object_origins) +
+                        tuple(attribute_modules - unexported_modules),
+    '__docformat__':    'restructuredtext en',
+    'json_available':   True,
+})
+for _key in '__loader__', '__spec__':
+    if _key in old_module.__dict__:
+        new_module.__dict__[_key] = old_module.__dict__[_key]
@@ -53,6 +53,14 @@ else:
         return cls
 
 
+# a high resolution clock for measuring durations.  ``perf_counter`` only
+# exists on Python 3.3 and later.
+try:
+    from time import perf_counter as timer
+except ImportError:
+    from timeit import default_timer as timer
+
+
 def with_metaclass(meta, *bases):
     """Create a base class with a metaclass."""
     # This requires a bit of explanation: the basic idea is to make a
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.accesslog
+    ~~~~~~~~~~~~~~~
+
+    Implements a structured access log that knows about endpoints and
+    blueprints.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import time
+import atexit
+import random
+from threading import Lock, Thread
+
+try:
+    from queue import Queue, Full, Empty
+except ImportError:
+    from Queue import Queue, Full, Empty
+
+from . import json
+from ._compat import text_type
+
+
+_stop_writer = object()
+
+
+class AccessLog(object):
+    """Writes one structured entry per request into a file.  Once attached
+    to an application :meth:`~keyes.Keyes.wsgi_app` records every request
+    right before the request context is popped::
+
+        from keyes.accesslog import AccessLog
+
+        AccessLog(app, filename='/var/log/myapp/access.jsonl',
+                  endpoint_rates={'static': 0.01, 'health': 0})
+
+    Every entry is a dictionary with the following keys:
+
+    ``time``, ``method``, ``path``, ``remote_addr``
+        when and by whom the request was made.
+    ``endpoint``, ``blueprint``
+        the matched endpoint and blueprint or ``None``.
+    ``status``
+        the status code of the response.
+    ``latency``
+        the time spent in the application in seconds.
+    ``bytes_in``, ``bytes_out``
+        the content lengths of the request and the response.
+    ``session``
+        ``True`` if the session was read or modified.
+    ``cache_hit``
+        ``True`` if a conditional request was answered with
+        ``304 Not Modified``.
+
+    Only the entry is built on the request thread.  A writer thread
+    formats the entries with :meth:`format_entry` (a JSON object per line
+    by default) and writes them in batches of up to `batch_size` entries,
+    at the latest after `flush_interval` seconds.  If more than `maxsize`
+    entries are waiting new entries are dropped and counted in
+    :attr:`dropped`.  The writer is started lazily and restarted in forked
+    processes.  Waiting entries are written when :meth:`close` is called,
+    which happens automatically when the interpreter exits.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param stream: a file object the entries are written to.
+    :param filename: a file the entries are appended to if no `stream` is
+                     given.
+    :param sample_rate: the fraction of requests that are logged.
+    :param endpoint_rates: a dictionary of endpoints to the fraction of
+                           their requests that are logged, overriding
+                           `sample_rate`.
+    :param batch_size: the maximum number of entries written at once.
+    :param flush_interval: the maximum number of seconds an entry waits
+                           before it is written.
+    :param maxsize: the maximum number of entries waiting to be written.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, stream=None, filename=None, sample_rate=1,
+                 endpoint_rates=None, batch_size=100, flush_interval=1.0,
+                 maxsize=10000):
+        if stream is None and filename is None:
+            raise TypeError('Either a stream or a filename is required')
+        self.stream = stream
+        self.filename = filename
+        self.sample_rate = sample_rate
+        self.endpoint_rates = dict(endpoint_rates or ())
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        #: the number of entries that were dropped because too many were
+        #: waiting to be written.
+        self.dropped = 0
+        #: the number of entries that were written.
+        self.written = 0
+        self._start_lock = Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._close_at_exit = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the access log to the given application."""
+        app.access_log = self
+
+    def should_log(self, endpoint):
+        """Returns ``True`` if a request to the given endpoint should be
+        logged.
+        """
+        rate = self.endpoint_rates.get(endpoint, self.sample_rate)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def log_request(self, request, session, response, latency):
+        """Records a request.  This is called by
+        :meth:`~keyes.Keyes.wsgi_app` with the session of the request
+        context and the response, which is ``None`` if the response could
+        not be created.
+        """
+        endpoint = request.endpoint
+        if not self.should_log(endpoint):
+            return
+        if response is not None:
+            status = response.status_code
+            bytes_out = response.content_length
+        else:
+            status = 500
+            bytes_out = None
+        entry = {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'remote_addr': request.remote_addr,
+            'endpoint': endpoint,
+            'blueprint': request.blueprint,
+            'status': status,
+            'latency': latency,
+            'bytes_in': request.content_length or 0,
+            'bytes_out': bytes_out or 0,
+            'session': session is not None and bool(
+                session.accessed or session.modified),
+            'cache_hit': status == 304,
+        }
+        try:
+            self._ensure_writer().put_nowait(entry)
+        except Full:
+            self.dropped += 1
+
+    def format_entry(self, entry):
+        """Formats an entry as a line of text.  The default implementation
+        writes a JSON object.
+        """
+        return text_type(json.dumps(entry, separators=(',', ':'))) + u'\n'
+
+    def _ensure_writer(self):
+        if self._pid == os.getpid():
+            return self._queue
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = Queue(self.maxsize)
+                self._thread = Thread(target=self._write,
+                                      args=(self._queue,),
+                                      name='keyes-access-log')
+                self._thread.daemon = True
+                self._thread.start()
+                self._pid = os.getpid()
+                # the writer is a daemon thread, write what is left when
+                # the interpreter exits.
+                if not self._close_at_exit:
+                    atexit.register(self.close)
+                    self._close_at_exit = True
+        return self._queue
+
+    def _write(self, queue):
+        stream = self.stream
+        if stream is None:
+            stream = open(self.filename, 'a')
+        try:
+            while 1:
+                entry = queue.get()
+                stop = entry is _stop_writer
+                batch = []
+                if not stop:
+                    batch.append(entry)
+                deadline = time.time() + self.flush_interval
+                while not stop and len(batch) < self.batch_size:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        entry = queue.get(True, timeout)
+                    except Empty:
+                        break
+                    if entry is _stop_writer:
+                        stop = True
+                    else:
+                        batch.append(entry)
+                if batch:
+                    stream.write(u''.join(map(self.format_entry, batch)))
+                    stream.flush()
+                    self.written += len(batch)
+                if stop:
+                    return
+        finally:
+            if self.stream is None:
+                stream.close()
+
+    def close(self, timeout=5):
+        """Stops the writer after the waiting entries were written."""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and \
+           thread.is_alive():
+            self._queue.put(_stop_writer)
+            thread.join(timeout)
+        self._pid = self._thread = None
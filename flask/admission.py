@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.admission
+    ~~~~~~~~~~~~~~~
+
+    Implements admission control which sheds load instead of queueing an
+    unbounded number of requests when an application is overloaded.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+from threading import Condition, Lock
+
+from werkzeug.exceptions import ServiceUnavailable
+
+from ._compat import timer
+
+
+class AdmissionController(object):
+    """Limits the number of requests an application handles concurrently.
+    Once attached to an application :meth:`~keyes.Keyes.wsgi_app` asks the
+    controller for a slot after the URL was matched and before the request
+    context is pushed, so rejected requests do not open a session or run
+    any request callbacks::
+
+        from keyes.admission import AdmissionController
+
+        AdmissionController(app, max_concurrency=32,
+                            endpoint_limits={'reports.export': 2},
+                            priorities={'api': 1, 'admin': 2})
+
+    A request is admitted if fewer than `max_concurrency` requests are in
+    flight, fewer than the limit of its endpoint in `endpoint_limits` are
+    in flight for that endpoint and no request of a higher priority class
+    that could be admitted is waiting.  Waiting requests that are only
+    held back by the limit of their own endpoint do not block requests of
+    lower priority classes.  Otherwise it waits up to `max_wait` seconds
+    for a slot.  If the wait times out or `max_queue` requests are already
+    waiting the request is rejected right away with the response from
+    :meth:`reject`, a ``503 Service Unavailable`` with a ``Retry-After``
+    header.  Rejected requests are recorded by the request metrics and the
+    access log like any other request.
+
+    The priority class of a request is looked up by its blueprint in
+    `priorities`.  Requests outside of these blueprints have priority
+    ``0``.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param max_concurrency: the maximum number of requests in flight or
+                            ``None`` for no global limit.
+    :param endpoint_limits: a dictionary of endpoints to the maximum
+                            number of their requests in flight.
+    :param max_wait: the maximum number of seconds a request waits for a
+                     slot.  ``0`` rejects requests that cannot be admitted
+                     immediately.
+    :param max_queue: the maximum number of waiting requests or ``None``.
+    :param retry_after: the value of the ``Retry-After`` header of rejected
+                        requests in seconds.
+    :param priorities: a dictionary of blueprint names to priority classes.
+                       Higher numbers are admitted first.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, max_concurrency=None, endpoint_limits=None,
+                 max_wait=0.1, max_queue=None, retry_after=1,
+                 priorities=None):
+        self.max_concurrency = max_concurrency
+        self.endpoint_limits = dict(endpoint_limits or ())
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.priorities = dict(priorities or ())
+        #: the number of admitted and rejected requests.
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = Condition(Lock())
+        self._in_flight = 0
+        self._endpoint_in_flight = {}
+        # the number of waiting requests per priority class and endpoint.
+        self._waiting = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the controller to the given application."""
+        app.admission = self
+
+    @property
+    def in_flight(self):
+        """The number of admitted requests that did not finish yet."""
+        return self._in_flight
+
+    @property
+    def waiting(self):
+        """The number of requests that wait for a slot."""
+        return sum(self._waiting.values())
+
+    def get_priority(self, request):
+        """Returns the priority class of the given request."""
+        return self.priorities.get(request.blueprint, 0)
+
+    def _can_admit(self, endpoint, limit, priority):
+        if self.max_concurrency is not None and \
+           self._in_flight >= self.max_concurrency:
+            return False
+        if limit is not None and \
+           self._endpoint_in_flight.get(endpoint, 0) >= limit:
+            return False
+        # only yield to waiters with a higher priority that could take
+        # the slot, not to those held back by their endpoint limit.
+        for waiter_priority, waiter_endpoint in self._waiting:
+            if waiter_priority <= priority:
+                continue
+            waiter_limit = self.endpoint_limits.get(waiter_endpoint)
+            if waiter_limit is None or self._endpoint_in_flight.get(
+                    waiter_endpoint, 0) < waiter_limit:
+                return False
+        return True
+
+    def _admit(self, endpoint):
+        self._in_flight += 1
+        self._endpoint_in_flight[endpoint] = \
+            self._endpoint_in_flight.get(endpoint, 0) + 1
+        self.admitted += 1
+        return True
+
+    def acquire(self, request):
+        """Tries to admit the given request and returns ``True`` if it was
+        admitted.  Every admitted request has to be passed to
+        :meth:`release` once it finished.
+        """
+        endpoint = request.endpoint
+        limit = self.endpoint_limits.get(endpoint)
+        priority = self.get_priority(request)
+        with self._cond:
+            if self._can_admit(endpoint, limit, priority):
+                return self._admit(endpoint)
+            if self.max_wait <= 0 or (self.max_queue is not None and
+                                      self.waiting >= self.max_queue):
+                self.rejected += 1
+                return False
+            deadline = timer() + self.max_wait
+            key = (priority, endpoint)
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+            try:
+                while 1:
+                    remaining = deadline - timer()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self._cond.wait(remaining)
+                    self._waiting[key] -= 1
+                    try:
+                        if self._can_admit(endpoint, limit, priority):
+                            return self._admit(endpoint)
+                    finally:
+                        self._waiting[key] += 1
+            finally:
+                self._waiting[key] -= 1
+                if not self._waiting[key]:
+                    del self._waiting[key]
+                # a waiter with a higher priority that gives up may
+                # unblock waiters with a lower one.
+                self._cond.notify_all()
+
+    def release(self, request):
+        """Releases the slot of a request admitted by :meth:`acquire`."""
+        endpoint = request.endpoint
+        with self._cond:
+            self._in_flight -= 1
+            count = self._endpoint_in_flight[endpoint] - 1
+            if count:
+                self._endpoint_in_flight[endpoint] = count
+            else:
+                del self._endpoint_in_flight[endpoint]
+            self._cond.notify_all()
+
+    def reject(self, request):
+        """Returns the response for a rejected request.  The default is a
+        ``503 Service Unavailable`` error with a ``Retry-After`` header.
+        """
+        response = ServiceUnavailable().get_response(request.environ)
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
@@ -10,20 +10,23 @@
 """
 import os
 import sys
+from io import BytesIO
 from threading import Lock
 from datetime import timedelta
 from itertools import chain
-from functools import update_wrapper
-from collections import deque
+from functools import update_wrapper, partial
 
+from jinja2 import TemplateError
 from werkzeug.datastructures import ImmutableDict
-from werkzeug.routing import Map, Rule, RequestRedirect, BuildError
+from werkzeug.routing import Map, Rule, RequestRedirect, BuildError, \
+     parse_rule, UnicodeConverter, IntegerConverter, FloatConverter
+from werkzeug.urls import url_parse, url_unquote
 from werkzeug.exceptions import HTTPException, InternalServerError, \
      MethodNotAllowed, BadRequest, default_exceptions
 
 from .helpers import _PackageBoundObject, url_for, get_flashed_messages, \
      locked_cached_property, _endpoint_from_view_func, find_package
-from . import json, cli
+from . import json
 from .wrappers import Request, Response
 from .config import ConfigAttribute, Config
 from .ctx import RequestContext, AppContext, _AppCtxGlobals
@@ -33,7 +36,9 @@ from .templating import DispatchingJinjaLoader, Environment, \
      _default_template_ctx_processor
 from .signals import request_started, request_finished, got_request_exception, \
      request_tearing_down, appcontext_tearing_down
-from ._compat import reraise, string_types, text_type, integer_types
+from .tracing import PhaseTimer
+from ._compat import reraise, string_types, text_type, integer_types, \
+     timer, iteritems, PY2
 
 # a lock used for logger initialization
 _logger_lock = Lock()
@@ -48,6 +53,114 @@ def _make_timedelta(value):
     return value
 
 
+class _ErrorHandlerSpec(dict):
+    """A dictionary that calls `on_change` when it or one of its nested
+    dictionaries is changed.  Used for :attr:`Keyes.error_handler_spec` to
+    clear the cache of resolved error handlers.
+    """
+
+    def __init__(self, on_change, *args, **kwargs):
+        dict.__init__(self)
+        self.on_change = on_change
+        self.update(*args, **kwargs)
+
+    def _wrap(self, value):
+        if isinstance(value, dict) and \
+           not isinstance(value, _ErrorHandlerSpec):
+            value = _ErrorHandlerSpec(self.on_change, value)
+        return value
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, self._wrap(value))
+        self.on_change()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.on_change()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in iteritems(dict(*args, **kwargs)):
+            self[key] = value
+
+    def pop(self, key, *args):
+        rv = dict.pop(self, key, *args)
+        self.on_change()
+        return rv
+
+    def popitem(self):
+        rv = dict.popitem(self)
+        self.on_change()
+        return rv
+
+    def clear(self):
+        dict.clear(self)
+        self.on_change()
+
+
+def _get_rule_group(rule):
+    """Returns the key of the rules sharing `rule`'s rule string."""
+    return (rule.rule, rule.subdomain, getattr(rule, 'host', None))
+
+
+# the converters that never match a slash.
+_slash_free_converters = (UnicodeConverter, IntegerConverter, FloatConverter)
+
+
+def _get_rule_segments(rule):
+    """Splits the rule string of `rule` into its path segments.  Static
+    segments are strings, segments with a variable are ``None``.  If a
+    variable can match a slash the segments end with its segment and the
+    second return value is ``True``.  A trailing slash is ignored because
+    such a rule also answers the URL without it with a redirect.
+    """
+    segments = [[]]
+    open_ended = False
+    for converter, arguments, variable in parse_rule(rule.rule):
+        if converter is None:
+            parts = variable.split('/')
+            segments[-1].append(parts[0])
+            segments.extend([part] for part in parts[1:])
+        elif type(rule._converters.get(variable)) in _slash_free_converters:
+            segments[-1].append(None)
+        else:
+            segments[-1].append(None)
+            open_ended = True
+            break
+    rv = []
+    for parts in segments:
+        rv.append(None if None in parts else ''.join(parts))
+    if not open_ended and len(rv) > 1 and rv[-1] == '':
+        rv.pop()
+    return rv, open_ended
+
+
+def _rules_can_overlap(a, b):
+    """Checks if a URL could be matched by both rules.  This errs on the
+    side of ``True`` if that cannot be told from the rule strings alone.
+    """
+    for attr in 'subdomain', 'host':
+        x = getattr(a, attr, None)
+        y = getattr(b, attr, None)
+        if x is not None and y is not None and x != y and \
+           '<' not in x and '<' not in y:
+            return False
+    a_segments, a_open = _get_rule_segments(a)
+    b_segments, b_open = _get_rule_segments(b)
+    # an open ended rule matches its number of segments or more.
+    if not a_open and len(a_segments) < len(b_segments) or \
+       not b_open and len(b_segments) < len(a_segments):
+        return False
+    for x, y in zip(a_segments, b_segments):
+        if x is not None and y is not None and x != y:
+            return False
+    return True
+
+
 def setupmethod(f):
     """Wraps a method so that it performs a check in debug mode if the
     first request was already handled.
@@ -298,6 +411,8 @@ class Keyes(_PackageBoundObject):
         'USE_X_SENDFILE':                       False,
         'LOGGER_NAME':                          None,
         'LOGGER_HANDLER_POLICY':               'always',
+        'LOGGER_QUEUE_SIZE':                    None,
+        'LOGGER_QUEUE_OVERFLOW':                'drop',
         'SERVER_NAME':                          None,
         'APPLICATION_ROOT':                     None,
         'SESSION_COOKIE_NAME':                  'session',
@@ -307,6 +422,9 @@ class Keyes(_PackageBoundObject):
         'SESSION_COOKIE_SECURE':                False,
         'SESSION_REFRESH_EACH_REQUEST':         True,
         'MAX_CONTENT_LENGTH':                   None,
+        'REQUEST_TIMEOUT':                      None,
+        'FAST_ROUTING_ERRORS':                  False,
+        'FREEZE_CONFIG':                        False,
         'SEND_FILE_MAX_AGE_DEFAULT':            timedelta(hours=12),
         'TRAP_BAD_REQUEST_ERRORS':              False,
         'TRAP_HTTP_EXCEPTIONS':                 False,
@@ -369,6 +487,14 @@ class Keyes(_PackageBoundObject):
         #: to load a config from files.
         self.config = self.make_config(instance_relative_config)
 
+        #: The :class:`~keyes.config.ConfigSnapshot` of the frozen config or
+        #: ``None`` if the config is not frozen.  Keyes reads the config
+        #: values it needs for every request from it.  See
+        #: :meth:`freeze_config`.
+        #:
+        #: .. versionadded:: 1.0
+        self.config_snapshot = None
+
         # Prepare the deferred setup of the logger.
         self._logger = None
         self.logger_name = self.import_name
@@ -379,9 +505,15 @@ class Keyes(_PackageBoundObject):
         #: To register a view function, use the :meth:`route` decorator.
         self.view_functions = {}
 
+        # maps ``(blueprint, exception class)`` to the resolved error
+        # handler or ``None``.  Cleared whenever :attr:`error_handler_spec`
+        # changes.
+        self._error_handler_cache = {}
+
         # support for the now deprecated `error_handlers` attribute.  The
         # :attr:`error_handler_spec` shall be used now.
-        self._error_handlers = {}
+        self._error_handlers = _ErrorHandlerSpec(
+            self._error_handler_cache.clear)
 
         #: A dictionary of all registered error handlers.  The key is ``None``
         #: for error handlers active on the application, otherwise the key is
@@ -393,7 +525,21 @@ class Keyes(_PackageBoundObject):
         #:
         #: To register a error handler, use the :meth:`errorhandler`
         #: decorator.
-        self.error_handler_spec = {None: self._error_handlers}
+        self.error_handler_spec = _ErrorHandlerSpec(
+            self._error_handler_cache.clear, {None: self._error_handlers})
+
+        # the prebuilt bodies of the responses for ``FAST_ROUTING_ERRORS``.
+        self._routing_error_bodies = {}
+
+        # groups the URL rules registered through :meth:`add_url_rule` by
+        # their rule string to compute their ``allowed_methods``.
+        self._rules_by_string = {}
+
+        # whether the ``allowed_methods`` of a group of rules are all the
+        # methods of their URLs, that is no other rule can match them.  This
+        # is checked once per group and cleared when the URL map changes.
+        self._exclusive_rule_groups = {}
+        self._exclusive_rule_groups_size = 0
 
         #: A list of functions that are called when :meth:`url_for` raises a
         #: :exc:`~werkzeug.routing.BuildError`.  Each function registered here
@@ -525,6 +671,67 @@ class Keyes(_PackageBoundObject):
         #:    app.url_map.converters['list'] = ListConverter
         self.url_map = Map()
 
+        #: The :class:`~keyes.metrics.RequestMetrics` the requests of this
+        #: application are recorded into or ``None`` if no metrics are
+        #: collected.  This is set by
+        #: :meth:`~keyes.metrics.RequestMetrics.init_app`.
+        #:
+        #: .. versionadded:: 1.0
+        self.metrics = None
+
+        #: The :class:`~keyes.tracing.RequestTracer` that records the
+        #: phases of each request or ``None`` if requests are not traced.
+        #: This is set by :meth:`~keyes.tracing.RequestTracer.init_app`.
+        #:
+        #: .. versionadded:: 1.0
+        self.request_tracer = None
+
+        #: The :class:`~keyes.profiling.RequestProfiler` that profiles a
+        #: sample of the requests or ``None`` if requests are not profiled.
+        #: This is set by :meth:`~keyes.profiling.RequestProfiler.init_app`.
+        #:
+        #: .. versionadded:: 1.0
+        self.profiler = None
+
+        #: The :class:`~keyes.memory.MemoryTracker` that tracks the memory
+        #: allocations of a sample of the requests or ``None`` if memory is
+        #: not tracked.  This is set by
+        #: :meth:`~keyes.memory.MemoryTracker.init_app`.
+        #:
+        #: .. versionadded:: 1.0
+        self.memory_tracker = None
+
+        #: The :class:`~keyes.accesslog.AccessLog` that records every
+        #: request or ``None`` if there is no access log.  This is set by
+        #: :meth:`~keyes.accesslog.AccessLog.init_app`.
+        #:
+        #: .. versionadded:: 1.0
+        self.access_log = None
+
+        #: The :class:`~keyes.admission.AdmissionController` that limits
+        #: the number of concurrent requests or ``None`` if every request
+        #: is admitted.  This is set by
+        #: :meth:`~keyes.admission.AdmissionController.init_app`.
+        #:
+        #: .. versionadded:: 1.0
+        self.admission = None
+
+        #: The :class:`~keyes.configwatch.ConfigWatcher` that reloads the
+        #: config when its files change or ``None`` if the config is only
+        #: loaded once.  This is set by
+        #: :meth:`~keyes.configwatch.ConfigWatcher.init_app`.
+        #:
+        #: .. versionadded:: 1.0
+        self.config_watcher = None
+
+        #: The :class:`~keyes.routecache.RouteCache` that reuses the URL
+        #: rules compiled by an earlier process or ``None`` if every rule
+        #: is compiled when it is added.  This is set by
+        #: :meth:`~keyes.routecache.RouteCache.init_app`.
+        #:
+        #: .. versionadded:: 1.0
+        self.route_cache = None
+
         # tracks internally if the application already handled at least one
         # request.
         self._got_first_request = False
@@ -540,22 +747,14 @@ class Keyes(_PackageBoundObject):
                               endpoint='static',
                               view_func=self.send_static_file)
 
-        #: The click command line context for this application.  Commands
-        #: registered here show up in the :command:`keyes` command once the
-        #: application has been discovered.  The default commands are
-        #: provided by Keyes itself and can be overridden.
-        #:
-        #: This is an instance of a :class:`click.Group` object.
-        self.cli = cli.AppGroup(self.name)
-
     def _get_error_handlers(self):
         from warnings import warn
         warn(DeprecationWarning('error_handlers is deprecated, use the '
             'new error_handler_spec attribute instead.'), stacklevel=1)
         return self._error_handlers
     def _set_error_handlers(self, value):
-        self._error_handlers = value
         self.error_handler_spec[None] = value
+        self._error_handlers = self.error_handler_spec[None]
     error_handlers = property(_get_error_handlers, _set_error_handlers)
     del _get_error_handlers, _set_error_handlers
 
@@ -623,6 +822,22 @@ class Keyes(_PackageBoundObject):
             self._logger = rv = create_logger(self)
             return rv
 
+    @locked_cached_property
+    def cli(self):
+        """The click command line context for this application.  Commands
+        registered here show up in the :command:`keyes` command once the
+        application has been discovered.  The default commands are
+        provided by Keyes itself and can be overridden.
+
+        This is an instance of a :class:`click.Group` object.
+
+        .. versionchanged:: 1.0
+           Created on first access so that click is only imported if the
+           application uses the command line interface.
+        """
+        from .cli import AppGroup
+        return AppGroup(self.name)
+
     @locked_cached_property
     def jinja_env(self):
         """The Jinja2 environment used to load templates."""
@@ -651,6 +866,38 @@ class Keyes(_PackageBoundObject):
             root_path = self.instance_path
         return self.config_class(root_path, self.default_config)
 
+    def freeze_config(self):
+        """Freezes the config and stores a
+        :class:`~keyes.config.ConfigSnapshot` of it in
+        :attr:`config_snapshot`.  Keyes then reads the values it needs while
+        handling requests from the snapshot and changing the config raises
+        a :exc:`RuntimeError`.  This happens automatically
+        before the first request if ``FREEZE_CONFIG`` is enabled.  To
+        change the config later call :meth:`unfreeze_config` and freeze it
+        again afterwards.
+
+        .. versionadded:: 1.0
+        """
+        self.config_snapshot = self.config.freeze()
+
+    def unfreeze_config(self):
+        """Makes the config writable again and drops the snapshot.
+
+        .. versionadded:: 1.0
+        """
+        self.config.thaw()
+        self.config_snapshot = None
+
+    @property
+    def _config_view(self):
+        """The config snapshot if the config is frozen, otherwise the
+        config.  Values read while handling requests are looked up here.
+        """
+        snapshot = self.config_snapshot
+        if snapshot is not None:
+            return snapshot
+        return self.config
+
     def auto_find_instance_path(self):
         """Tries to locate the instance path if it was not provided to the
         constructor of the application class.  It will basically calculate
@@ -993,6 +1240,9 @@ class Keyes(_PackageBoundObject):
         .. versionchanged:: 0.6
            ``OPTIONS`` is added automatically as method.
 
+        .. versionchanged:: 1.0
+           The ``timeout`` option was added.
+
         :param rule: the URL rule as string
         :param endpoint: the endpoint for the registered URL rule.  Keyes
                          itself assumes the name of the view function as
@@ -1007,6 +1257,9 @@ class Keyes(_PackageBoundObject):
                         just listens for ``GET`` (and implicitly ``HEAD``).
                         Starting with Keyes 0.6, ``OPTIONS`` is implicitly
                         added and handled by the standard request handling.
+                        Starting with Keyes 1.0, ``timeout`` sets the
+                        number of seconds after which requests to this
+                        rule pass their :attr:`~keyes.Request.deadline`.
         """
         if endpoint is None:
             endpoint = _endpoint_from_view_func(view_func)
@@ -1041,10 +1294,17 @@ class Keyes(_PackageBoundObject):
         # Add the required methods now.
         methods |= required_methods
 
+        # the deadline for requests to this rule, see REQUEST_TIMEOUT.
+        timeout = options.pop('timeout', None)
+
         rule = self.url_rule_class(rule, methods=methods, **options)
+        if self.route_cache is not None:
+            rule = self.route_cache.get_rule(rule)
         rule.provide_automatic_options = provide_automatic_options
+        rule.timeout = timeout
 
         self.url_map.add(rule)
+        self._update_allowed_methods(rule)
         if view_func is not None:
             old_func = self.view_functions.get(endpoint)
             if old_func is not None and old_func != view_func:
@@ -1052,6 +1312,24 @@ class Keyes(_PackageBoundObject):
                                      'existing endpoint function: %s' % endpoint)
             self.view_functions[endpoint] = view_func
 
+    def _update_allowed_methods(self, rule):
+        """Computes the methods allowed for the URLs of `rule`: the methods
+        of all rules registered for the same rule string.  They are stored
+        on every rule of the group as ``allowed_methods`` so that
+        :meth:`make_default_options_response` does not have to match the
+        URL again.  Different rule strings that happen to match the same
+        URL, for instance through different converters, are not merged, so
+        the set is only used for rules that no other rule can match, see
+        :meth:`_is_exclusive_rule_group`.
+        """
+        key = _get_rule_group(rule)
+        rules = self._rules_by_string.setdefault(key, [])
+        rules.append(rule)
+        allowed = frozenset(chain.from_iterable(r.methods or ()
+                                                for r in rules))
+        for r in rules:
+            r.allowed_methods = allowed
+
     def route(self, rule, **options):
         """A decorator that is used to register a view function for a
         given URL rule.  This does the same thing as :meth:`add_url_rule`
@@ -1134,7 +1412,7 @@ class Keyes(_PackageBoundObject):
 
             def page_not_found(error):
                 return 'This page does not exist', 404
-            app.error_handler_spec[None][404] = page_not_found
+            app.error_handler_spec[None][404] = {NotFound: page_not_found}
 
         Setting error handlers via assignments to :attr:`error_handler_spec`
         however is discouraged as it requires fiddling with nested dictionaries
@@ -1430,39 +1708,37 @@ class Keyes(_PackageBoundObject):
         """Finds a registered error handler for the request’s blueprint.
         Otherwise falls back to the app, returns None if not a suitable
         handler is found.
+
+        The result, including a missing handler, is cached per blueprint
+        and exception class until :attr:`error_handler_spec` changes.
         """
-        exc_class, code = self._get_exc_class_and_code(type(e))
+        return self._lookup_error_handler(request.blueprint, type(e))
+
+    def _lookup_error_handler(self, blueprint, exc_class):
+        key = (blueprint, exc_class)
+        try:
+            return self._error_handler_cache[key]
+        except KeyError:
+            pass
+        exc_class, code = self._get_exc_class_and_code(exc_class)
 
         def find_handler(handler_map):
             if not handler_map:
                 return
-            queue = deque(exc_class.__mro__)
-            # Protect from geniuses who might create circular references in
-            # __mro__
-            done = set()
-
-            while queue:
-                cls = queue.popleft()
-                if cls in done:
-                    continue
-                done.add(cls)
+            for cls in exc_class.__mro__:
                 handler = handler_map.get(cls)
                 if handler is not None:
-                    # cache for next time exc_class is raised
-                    handler_map[exc_class] = handler
                     return handler
 
-                queue.extend(cls.__mro__)
-
         # try blueprint handlers
         handler = find_handler(self.error_handler_spec
-                               .get(request.blueprint, {})
+                               .get(blueprint, {})
                                .get(code))
-        if handler is not None:
-            return handler
-
-        # fall back to app handlers
-        return find_handler(self.error_handler_spec[None].get(code))
+        if handler is None:
+            # fall back to app handlers
+            handler = find_handler(self.error_handler_spec[None].get(code))
+        self._error_handler_cache[key] = handler
+        return handler
 
     def handle_http_exception(self, e):
         """Handles an HTTP exception.  By default this will invoke the
@@ -1495,9 +1771,10 @@ class Keyes(_PackageBoundObject):
 
         .. versionadded:: 0.8
         """
-        if self.config['TRAP_HTTP_EXCEPTIONS']:
+        config = self._config_view
+        if config['TRAP_HTTP_EXCEPTIONS']:
             return True
-        if self.config['TRAP_BAD_REQUEST_ERRORS']:
+        if config['TRAP_BAD_REQUEST_ERRORS']:
             return isinstance(e, BadRequest)
         return False
 
@@ -1599,6 +1876,8 @@ class Keyes(_PackageBoundObject):
         req = _request_ctx_stack.top.request
         if req.routing_exception is not None:
             self.raise_routing_exception(req)
+        if req.deadline is not None:
+            req.check_deadline()
         rule = req.url_rule
         # if we provide automatic options for this URL and the
         # request came with the OPTIONS method, reply automatically
@@ -1616,6 +1895,9 @@ class Keyes(_PackageBoundObject):
         .. versionadded:: 0.7
         """
         self.try_trigger_before_first_request_functions()
+        timings = _request_ctx_stack.top.request.phase_timings
+        if timings is not None:
+            return self._traced_full_dispatch_request(timings)
         try:
             request_started.send(self)
             rv = self.preprocess_request()
@@ -1628,6 +1910,26 @@ class Keyes(_PackageBoundObject):
         request_finished.send(self, response=response)
         return response
 
+    def _traced_full_dispatch_request(self, timings):
+        """Like :meth:`full_dispatch_request` but records the durations of
+        the view and the response conversion.  The hooks report their
+        durations themselves.
+        """
+        try:
+            request_started.send(self)
+            rv = self.preprocess_request()
+            if rv is None:
+                with PhaseTimer('view', timings):
+                    rv = self.dispatch_request()
+        except Exception as e:
+            rv = self.handle_user_exception(e)
+        with PhaseTimer('serialize', timings):
+            response = self.make_response(rv)
+        response = self.process_response(response)
+        timings.tracer.finish_response(timings, response)
+        request_finished.send(self, response=response)
+        return response
+
     def try_trigger_before_first_request_functions(self):
         """Called before each request and will ensure that it triggers
         the :attr:`before_first_request_funcs` and only exactly once per
@@ -1642,16 +1944,88 @@ class Keyes(_PackageBoundObject):
                 return
             for func in self.before_first_request_funcs:
                 func()
+            if self.config['FREEZE_CONFIG'] and self.config_snapshot is None:
+                self.freeze_config()
             self._got_first_request = True
 
+    def warmup(self, requests=None, templates=True):
+        """Does the work that otherwise slows down the first requests of a
+        process: the URL map is sorted, the Jinja environment and the logger
+        are created, the templates are compiled and the
+        :attr:`before_first_request_funcs` run in a
+        :meth:`test_request_context` for ``/``.  Call this before a server
+        starts accepting requests, for instance before worker processes are
+        forked so that they share the result::
+
+            app.warmup(requests=['/', ('POST', '/api/ping')])
+
+        Afterwards the `requests` are sent through the :meth:`test_client`
+        so that lazily initialized code of the views runs as well.  A
+        request is a path, a ``(method, path)`` tuple or a dictionary of
+        arguments for :meth:`~werkzeug.test.Client.open`.  Such requests
+        are handled like any other request, including metrics and logging.
+        A warning is logged for every request that fails with a server
+        error.
+
+        :param requests: an optional list of requests to send.
+        :param templates: if ``True`` all templates of the application and
+                          its blueprints are compiled.  Files that cannot
+                          be decoded, such as images, are skipped and a
+                          warning is logged for templates that do not
+                          compile.
+
+        .. versionadded:: 1.0
+        """
+        self.url_map.update()
+        self.logger
+        with self.app_context():
+            env = self.jinja_env
+            if templates:
+                for name in env.list_templates():
+                    try:
+                        env.get_template(name)
+                    except UnicodeDecodeError:
+                        pass
+                    except TemplateError as e:
+                        self.logger.warning('Could not compile template '
+                                            '%s: %s', name, e)
+        # like on the first request the functions can use the request.
+        with self.test_request_context():
+            self.try_trigger_before_first_request_functions()
+
+        if requests:
+            client = self.test_client()
+            for request in requests:
+                if isinstance(request, dict):
+                    kwargs = request
+                elif isinstance(request, tuple):
+                    kwargs = {'method': request[0], 'path': request[1]}
+                else:
+                    kwargs = {'path': request}
+                rv = client.open(**kwargs)
+                if rv.status_code >= 500:
+                    self.logger.warning('Warmup request to %s failed with %s',
+                                        kwargs.get('path'), rv.status)
+
     def make_default_options_response(self):
         """This method is called to create the default ``OPTIONS`` response.
         This can be changed through subclassing to change the default
         behavior of ``OPTIONS`` responses.
 
         .. versionadded:: 0.7
+
+        .. versionchanged:: 1.0
+           The allowed methods are precomputed when the URL rule is added
+           and used if no other rule can match the URL.
         """
-        adapter = _request_ctx_stack.top.url_adapter
+        ctx = _request_ctx_stack.top
+        rule = ctx.request.url_rule
+        methods = getattr(rule, 'allowed_methods', None)
+        if methods is not None and self._is_exclusive_rule_group(rule):
+            rv = self.response_class()
+            rv.allow.update(methods)
+            return rv
+        adapter = ctx.url_adapter
         if hasattr(adapter, 'allowed_methods'):
             methods = adapter.allowed_methods()
         else:
@@ -1667,6 +2041,29 @@ class Keyes(_PackageBoundObject):
         rv.allow.update(methods)
         return rv
 
+    def _is_exclusive_rule_group(self, rule):
+        """Checks if no rule outside of the group of `rule` can match the
+        URLs of the group, so that its ``allowed_methods`` are all the
+        methods of these URLs.  The result is cached per group until a rule
+        is added to the URL map, also if it is added to the map directly.
+        """
+        size = len(self.url_map._rules)
+        if size != self._exclusive_rule_groups_size:
+            self._exclusive_rule_groups.clear()
+            self._exclusive_rule_groups_size = size
+        key = _get_rule_group(rule)
+        rv = self._exclusive_rule_groups.get(key)
+        if rv is None:
+            group = set(id(r) for r in self._rules_by_string.get(key, ()))
+            rv = True
+            for other in self.url_map._rules:
+                if id(other) not in group and not other.build_only and \
+                   _rules_can_overlap(rule, other):
+                    rv = False
+                    break
+            self._exclusive_rule_groups[key] = rv
+        return rv
+
     def should_ignore_error(self, error):
         """This is called to figure out if an error should be ignored
         or not as far as the teardown system is concerned.  If this
@@ -1750,16 +2147,17 @@ class Keyes(_PackageBoundObject):
            This can now also be called without a request object when the
            URL adapter is created for the application context.
         """
+        config = self._config_view
         if request is not None:
             return self.url_map.bind_to_environ(request.environ,
-                server_name=self.config['SERVER_NAME'])
+                server_name=config['SERVER_NAME'])
         # We need at the very least the server name to be set for this
         # to work.
-        if self.config['SERVER_NAME'] is not None:
+        if config['SERVER_NAME'] is not None:
             return self.url_map.bind(
-                self.config['SERVER_NAME'],
-                script_name=self.config['APPLICATION_ROOT'] or '/',
-                url_scheme=self.config['PREFERRED_URL_SCHEME'])
+                config['SERVER_NAME'],
+                script_name=config['APPLICATION_ROOT'] or '/',
+                url_scheme=config['PREFERRED_URL_SCHEME'])
 
     def inject_url_defaults(self, endpoint, values):
         """Injects the URL defaults for the given endpoint directly into
@@ -1806,19 +2204,30 @@ class Keyes(_PackageBoundObject):
         This also triggers the :meth:`url_value_processor` functions before
         the actual :meth:`before_request` functions are called.
         """
-        bp = _request_ctx_stack.top.request.blueprint
+        req = _request_ctx_stack.top.request
+        bp = req.blueprint
+        timings = req.phase_timings
 
         funcs = self.url_value_preprocessors.get(None, ())
         if bp is not None and bp in self.url_value_preprocessors:
             funcs = chain(funcs, self.url_value_preprocessors[bp])
         for func in funcs:
-            func(request.endpoint, request.view_args)
+            if timings is None:
+                func(request.endpoint, request.view_args)
+            else:
+                timings.call_hook('before_request', func,
+                                  request.endpoint, request.view_args)
 
         funcs = self.before_request_funcs.get(None, ())
         if bp is not None and bp in self.before_request_funcs:
             funcs = chain(funcs, self.before_request_funcs[bp])
         for func in funcs:
-            rv = func()
+            if req.deadline is not None:
+                req.check_deadline()
+            if timings is None:
+                rv = func()
+            else:
+                rv = timings.call_hook('before_request', func)
             if rv is not None:
                 return rv
 
@@ -1837,15 +2246,24 @@ class Keyes(_PackageBoundObject):
         """
         ctx = _request_ctx_stack.top
         bp = ctx.request.blueprint
+        timings = ctx.request.phase_timings
         funcs = ctx._after_request_functions
         if bp is not None and bp in self.after_request_funcs:
             funcs = chain(funcs, reversed(self.after_request_funcs[bp]))
         if None in self.after_request_funcs:
             funcs = chain(funcs, reversed(self.after_request_funcs[None]))
         for handler in funcs:
-            response = handler(response)
+            if timings is None:
+                response = handler(response)
+            else:
+                response = timings.call_hook('after_request', handler,
+                                             response)
         if not self.session_interface.is_null_session(ctx.session):
-            self.save_session(ctx.session, response)
+            if timings is None:
+                self.save_session(ctx.session, response)
+            else:
+                with PhaseTimer('session_save', timings):
+                    self.save_session(ctx.session, response)
         return response
 
     def do_teardown_request(self, exc=_sentinel):
@@ -1862,11 +2280,16 @@ class Keyes(_PackageBoundObject):
         if exc is _sentinel:
             exc = sys.exc_info()[1]
         funcs = reversed(self.teardown_request_funcs.get(None, ()))
-        bp = _request_ctx_stack.top.request.blueprint
+        req = _request_ctx_stack.top.request
+        bp = req.blueprint
+        timings = req.phase_timings
         if bp is not None and bp in self.teardown_request_funcs:
             funcs = chain(funcs, reversed(self.teardown_request_funcs[bp]))
         for func in funcs:
-            func(exc)
+            if timings is None:
+                func(exc)
+            else:
+                timings.call_hook('teardown', func, exc)
         request_tearing_down.send(self, exc=exc)
 
     def do_teardown_appcontext(self, exc=_sentinel):
@@ -1939,6 +2362,105 @@ class Keyes(_PackageBoundObject):
         finally:
             builder.close()
 
+    def dispatch_internal(self, endpoint, _method='GET', **view_args):
+        """Calls the view of `endpoint` in the same process and returns its
+        response object without going through HTTP or WSGI.  This is useful
+        to compose a page out of fragments rendered by other views::
+
+            sidebar = app.dispatch_internal('sidebar', user_id=42)
+            return render_template('page.html',
+                                   sidebar=sidebar.get_data(as_text=True))
+
+        The URL is built from `endpoint` and `view_args` like :func:`url_for`
+        does, arguments that are not part of the URL rule end up in the
+        query string.  The internal request goes through the regular
+        request handling including the request callbacks and error
+        handlers, but exceptions that are not handled are raised to the
+        caller.
+
+        If this is called while a request of this application is handled,
+        the internal request is based on its WSGI environment, so headers
+        and cookies are the same, and it shares its session.  Otherwise a
+        minimal environment is built from the ``SERVER_NAME``,
+        ``APPLICATION_ROOT`` and ``PREFERRED_URL_SCHEME`` config values.
+
+        .. versionadded:: 1.0
+
+        :param endpoint: the endpoint of the view to call.
+        :param _method: the HTTP method of the internal request.
+        :param view_args: the values for the URL rule.
+        """
+        outer = _request_ctx_stack.top
+        if outer is not None and outer.app is self:
+            environ = dict(outer.request.environ)
+            environ.pop('CONTENT_TYPE', None)
+            environ.pop('CONTENT_LENGTH', None)
+            environ.pop('werkzeug.request', None)
+            session = outer.session
+        else:
+            environ = self._make_internal_environ()
+            session = None
+        adapter = self.url_map.bind_to_environ(
+            environ, server_name=self.config['SERVER_NAME'])
+        url = url_parse(adapter.build(endpoint, view_args, method=_method))
+        if url.netloc:
+            # rules for other subdomains or hosts build external URLs.
+            host, port = url.host, url.port
+            environ.update({
+                'wsgi.url_scheme': url.scheme,
+                'HTTP_HOST': url.netloc,
+                'SERVER_NAME': host,
+                'SERVER_PORT': str(port or (url.scheme == 'https' and 443
+                                            or 80)),
+            })
+        path = url_unquote(url.path[len(adapter.script_name.rstrip('/')):])
+        # WSGI environments carry the path as latin-1 decoded bytes.
+        path = path.encode(self.url_map.charset)
+        if not PY2:
+            path = path.decode('latin1')
+        environ.update({
+            'REQUEST_METHOD': _method,
+            'PATH_INFO': path,
+            'QUERY_STRING': url.query,
+            'wsgi.input': BytesIO(),
+        })
+
+        ctx = self.request_context(environ)
+        ctx.session = session
+        ctx.push()
+        error = None
+        try:
+            try:
+                return self.full_dispatch_request()
+            except Exception as e:
+                error = e
+                raise
+        finally:
+            ctx.pop(error)
+
+    def _make_internal_environ(self):
+        scheme = self.config['PREFERRED_URL_SCHEME']
+        server_name = self.config['SERVER_NAME'] or 'localhost'
+        host, _, port = server_name.partition(':')
+        return {
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': (self.config['APPLICATION_ROOT'] or '').rstrip('/'),
+            'PATH_INFO': '/',
+            'QUERY_STRING': '',
+            'SERVER_NAME': host,
+            'SERVER_PORT': port or (scheme == 'https' and '443' or '80'),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': server_name,
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scheme,
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
     def wsgi_app(self, environ, start_response):
         """The actual WSGI application.  This is not implemented in
         `__call__` so that middlewares can be applied without losing a
@@ -1964,12 +2486,54 @@ class Keyes(_PackageBoundObject):
                                a list of headers and an optional
                                exception context to start the response
         """
+        if self.config_watcher is not None:
+            self.config_watcher.poll()
+        metrics = self.metrics
+        access_log = self.access_log
+        if metrics is not None or access_log is not None:
+            started = timer()
         ctx = self.request_context(environ)
-        ctx.push()
-        error = None
+        if ctx.request.routing_exception is not None and \
+           self._config_view['FAST_ROUTING_ERRORS']:
+            response = self._make_fast_routing_error_response(ctx.request)
+            if response is not None:
+                if metrics is not None:
+                    metrics.request_finished(metrics.request_started(),
+                                             ctx.request, response,
+                                             timer() - started)
+                if access_log is not None:
+                    access_log.log_request(ctx.request, None, response,
+                                           timer() - started)
+                return response(environ, start_response)
+        admission = self.admission
+        if admission is not None:
+            if not admission.acquire(ctx.request):
+                response = admission.reject(ctx.request)
+                if metrics is not None:
+                    metrics.request_finished(metrics.request_started(),
+                                             ctx.request, response,
+                                             timer() - started)
+                if access_log is not None:
+                    access_log.log_request(ctx.request, None, response,
+                                           timer() - started)
+                return response(environ, start_response)
+            try:
+                ctx.push()
+            except:
+                admission.release(ctx.request)
+                raise
+        else:
+            ctx.push()
+        if metrics is not None:
+            shard = metrics.request_started()
+        error = response = None
         try:
             try:
-                response = self.full_dispatch_request()
+                if self.profiler is None and self.memory_tracker is None:
+                    response = self.full_dispatch_request()
+                else:
+                    response = self._sampled_full_dispatch_request(
+                        ctx.request)
             except Exception as e:
                 error = e
                 response = self.make_response(self.handle_exception(e))
@@ -1977,7 +2541,50 @@ class Keyes(_PackageBoundObject):
         finally:
             if self.should_ignore_error(error):
                 error = None
-            ctx.auto_pop(error)
+            if metrics is not None or access_log is not None:
+                duration = timer() - started
+                if metrics is not None:
+                    metrics.request_finished(shard, ctx.request, response,
+                                             duration)
+                if access_log is not None:
+                    access_log.log_request(ctx.request, ctx.session,
+                                           response, duration)
+            try:
+                ctx.auto_pop(error)
+            finally:
+                if admission is not None:
+                    admission.release(ctx.request)
+
+    def _sampled_full_dispatch_request(self, request):
+        """Runs :meth:`full_dispatch_request` under the memory tracker and
+        the profiler if they want to sample the request.
+        """
+        func = self.full_dispatch_request
+        tracker = self.memory_tracker
+        if tracker is not None and tracker.should_track(request):
+            func = partial(tracker.track, request, func)
+        profiler = self.profiler
+        if profiler is not None and profiler.should_profile(request):
+            func = partial(profiler.profile, request, func)
+        return func()
+
+    def _make_fast_routing_error_response(self, request):
+        """Returns the response for a request that did not match a URL
+        rule if the error can be answered without pushing the request
+        context, otherwise ``None``.  This is only used if
+        ``FAST_ROUTING_ERRORS`` is enabled.
+        """
+        e = request.routing_exception
+        if e.code not in (404, 405) or self.trap_http_exception(e) or \
+           self._lookup_error_handler(None, type(e)) is not None:
+            return None
+        key = (type(e), e.description)
+        body = self._routing_error_bodies.get(key)
+        if body is None:
+            body = e.get_body(request.environ).encode('utf-8')
+            self._routing_error_bodies[key] = body
+        return self.response_class(body, e.code,
+                                   e.get_headers(request.environ))
 
     def __call__(self, environ, start_response):
         """Shortcut for :attr:`wsgi_app`."""
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.batch
+    ~~~~~~~~~~~
+
+    Implements an endpoint that dispatches a batch of sub-requests inside
+    the application.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import sys
+import base64
+from threading import Lock
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.exceptions import BadRequest, InternalServerError
+
+from . import json
+from .globals import current_app, request, _request_ctx_stack
+from ._compat import string_types, iteritems
+
+
+# headers of the batch request that are not passed on to sub-requests.
+_skipped_headers = frozenset(['content-type', 'content-length'])
+
+
+class BatchDispatcher(object):
+    """Registers a view at `url` that accepts a JSON array of sub-requests
+    and dispatches each of them through
+    :meth:`~keyes.Keyes.full_dispatch_request` without a round trip
+    through HTTP::
+
+        from keyes.batch import BatchDispatcher
+
+        BatchDispatcher(app, url='/batch', max_workers=4)
+
+    Every sub-request is an object with a ``path`` (which may contain a
+    query string) and optionally a ``method`` (``GET`` by default),
+    ``headers`` and either a ``body`` string or a ``json`` value.  The
+    headers of the batch request, such as ``Cookie`` or ``Authorization``,
+    are passed on unless the sub-request overrides them.
+
+    The response is a JSON array with an object per sub-request, in the
+    same order, with the ``status``, the ``headers`` and the ``body`` of
+    the response.  JSON bodies are embedded as JSON, other bodies as text.
+    Bodies that are not valid UTF-8 are encoded with base64 and the entry
+    has an additional ``encoding`` key set to ``base64``.  A malformed
+    sub-request results in a ``400`` entry and a sub-request that fails
+    with an unhandled exception in a ``500`` entry; neither affects the
+    other sub-requests.
+
+    Every sub-request runs in its own application context, so it starts
+    with an empty :data:`~keyes.g` in both modes.  All sub-requests share
+    the session of the batch request, which is saved once with the
+    response of the batch request.  ``Set-Cookie`` headers of the
+    sub-requests are therefore dropped.  With `max_workers` the
+    sub-requests use the session object at the same time without a lock,
+    so sub-requests that change the session should not be batched in
+    parallel.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param url: the URL rule of the batch view.
+    :param endpoint: the endpoint of the batch view.
+    :param max_requests: the maximum number of sub-requests per batch.
+    :param max_workers: if given, the sub-requests are dispatched in
+                        parallel on a pool of this many threads.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, url='/batch', endpoint='batch',
+                 max_requests=20, max_workers=None):
+        self.url = url
+        self.endpoint = endpoint
+        self.max_requests = max_requests
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registers the batch view on the given application."""
+        app.add_url_rule(self.url, self.endpoint, self.view,
+                         methods=['POST'])
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                from multiprocessing.pool import ThreadPool
+                self._pool = ThreadPool(self.max_workers)
+            return self._pool
+
+    def close(self):
+        """Shuts down the thread pool if one was started."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+    def view(self):
+        """The view function of the batch endpoint."""
+        items = request.get_json()
+        if not isinstance(items, list):
+            raise BadRequest('Expected a JSON array of requests.')
+        if len(items) > self.max_requests:
+            raise BadRequest('At most %d requests can be batched.'
+                             % self.max_requests)
+        app = current_app._get_current_object()
+        outer = _request_ctx_stack.top
+        jobs = [(app, outer.request, outer.session, item) for item in items]
+        if self.max_workers and len(jobs) > 1:
+            results = self._get_pool().map(self._dispatch_job, jobs)
+        else:
+            results = [self._dispatch_job(job) for job in jobs]
+        return app.response_class(json.dumps(results),
+                                  mimetype='application/json')
+
+    def _dispatch_job(self, job):
+        app, outer_request, session, item = job
+        try:
+            environ = self.make_environ(outer_request, item)
+        except (TypeError, ValueError) as e:
+            return {'status': 400, 'headers': {}, 'body': str(e)}
+        try:
+            return self.dispatch(app, environ, session)
+        except Exception:
+            # the request context may be gone or was never pushed, so the
+            # error is logged without it.
+            app.logger.error('Exception on batch sub-request %s [%s]',
+                             environ.get('PATH_INFO'),
+                             environ.get('REQUEST_METHOD'),
+                             exc_info=sys.exc_info())
+            return {'status': 500, 'headers': {},
+                    'body': InternalServerError.description}
+
+    def make_environ(self, outer_request, item):
+        """Creates the WSGI environment of a sub-request described by
+        `item` for the batch request `outer_request`.
+        """
+        if not isinstance(item, dict) or \
+           not isinstance(item.get('path'), string_types):
+            raise ValueError('A request needs a path.')
+        method = item.get('method', 'GET')
+        if not isinstance(method, string_types):
+            raise ValueError('The method has to be a string.')
+        headers = [(key, value) for key, value in outer_request.headers
+                   if key.lower() not in _skipped_headers]
+        sub_headers = item.get('headers') or {}
+        if not isinstance(sub_headers, dict) or \
+           not all(isinstance(value, string_types)
+                   for value in sub_headers.values()):
+            raise ValueError('The headers have to be an object of strings.')
+        overridden = set(key.lower() for key in sub_headers)
+        headers = [(key, value) for key, value in headers
+                   if key.lower() not in overridden]
+        headers.extend(iteritems(sub_headers))
+        data = item.get('body')
+        if data is not None and not isinstance(data, string_types):
+            raise ValueError('The body has to be a string.')
+        content_type = None
+        if 'json' in item:
+            data = json.dumps(item['json'])
+            content_type = 'application/json'
+        builder = EnvironBuilder(
+            path=item['path'], base_url=outer_request.url_root,
+            method=method.upper(), headers=headers,
+            data=data, content_type=content_type,
+            environ_base={'REMOTE_ADDR': outer_request.remote_addr})
+        try:
+            return builder.get_environ()
+        finally:
+            builder.close()
+
+    def dispatch(self, app, environ, session):
+        """Dispatches a sub-request with the given session and returns its
+        result entry.
+        """
+        ctx = app.request_context(environ)
+        if ctx.request.url_rule is not None and \
+           ctx.request.url_rule.endpoint == self.endpoint:
+            return {'status': 400, 'headers': {},
+                    'body': 'Batch requests cannot be nested.'}
+        ctx.session = session
+        # a context preserved on this thread has to be popped before the
+        # application context is pushed, the request context would pop it
+        # together with its own application context otherwise.
+        top = _request_ctx_stack.top
+        if top is not None and top.preserved:
+            top.pop(top._preserved_exc)
+        # a new application context gives every sub-request its own g,
+        # whether it runs on the thread of the batch request or not.
+        app_ctx = app.app_context()
+        app_ctx.push()
+        error = None
+        try:
+            ctx.push()
+            try:
+                try:
+                    response = app.full_dispatch_request()
+                except Exception as e:
+                    error = e
+                    # errors are isolated even if the application
+                    # propagates exceptions.
+                    if app.propagate_exceptions:
+                        app.log_exception(sys.exc_info())
+                        rv = InternalServerError()
+                    else:
+                        rv = app.handle_exception(e)
+                    response = app.make_response(rv)
+                return self.make_result(response)
+            finally:
+                ctx.pop(error)
+        finally:
+            app_ctx.pop(error)
+
+    def make_result(self, response):
+        """Converts the response of a sub-request into its result entry."""
+        headers = dict((key, value) for key, value in response.headers
+                       if key.lower() != 'set-cookie')
+        rv = {'status': response.status_code, 'headers': headers}
+        data = response.get_data()
+        try:
+            body = data.decode('utf-8')
+        except UnicodeDecodeError:
+            rv['body'] = base64.b64encode(data).decode('ascii')
+            rv['encoding'] = 'base64'
+            return rv
+        if response.mimetype == 'application/json':
+            try:
+                body = json.loads(body)
+            except ValueError:
+                pass
+        rv['body'] = body
+        return rv
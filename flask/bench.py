@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.bench
+    ~~~~~~~~~~~
+
+    Implements an in-process load generator that measures the throughput
+    and latency of an application without going through sockets.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import sys
+import math
+import time
+from io import BytesIO
+from threading import Thread
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.exceptions import HTTPException
+
+from ._compat import timer
+
+
+# the benchmark run by the worker processes, set before they are forked.
+_process_benchmark = None
+
+
+def find_get_routes(app):
+    """Returns the paths of all rules of `app` that accept ``GET`` requests
+    and can be built without arguments, except for the static files.
+
+    .. versionadded:: 1.0
+    """
+    rv = []
+    adapter = app.url_map.bind('localhost')
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or rule.endpoint.endswith('.static') or \
+           'GET' not in (rule.methods or ('GET',)):
+            continue
+        try:
+            path = adapter.build(rule.endpoint, method='GET')
+        except Exception:
+            continue
+        if path not in rv:
+            rv.append(path)
+    return sorted(rv)
+
+
+def parse_server_timing(value):
+    """Parses a ``Server-Timing`` header into a list of ``(name, duration)``
+    tuples with the durations in milliseconds.  Metrics without a duration
+    are skipped.
+
+    .. versionadded:: 1.0
+    """
+    rv = []
+    for metric in value.split(','):
+        parts = [part.strip() for part in metric.split(';')]
+        for param in parts[1:]:
+            key, _, duration = param.partition('=')
+            if key.strip() == 'dur':
+                try:
+                    rv.append((parts[0], float(duration.strip('"'))))
+                except ValueError:
+                    pass
+                break
+    return rv
+
+
+def percentile(values, fraction):
+    """Returns the nearest rank percentile of the sorted list `values`."""
+    if not values:
+        return None
+    # the epsilon keeps float errors such as 0.9 * 10 > 9 from picking
+    # the next rank.
+    idx = int(math.ceil(fraction * len(values) - 1e-9)) - 1
+    return values[max(0, min(idx, len(values) - 1))]
+
+
+class _Recorder(object):
+    """Collects the measurements of one worker."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.phases = {}
+
+    def merge(self, other):
+        for attr in 'latencies', 'errors', 'phases':
+            mine = getattr(self, attr)
+            for key, value in getattr(other, attr).items():
+                if key in mine:
+                    if isinstance(value, dict):
+                        for phase, duration in value.items():
+                            mine[key][phase] = \
+                                mine[key].get(phase, 0) + duration
+                    else:
+                        mine[key] += value
+                else:
+                    mine[key] = value
+
+
+class Benchmark(object):
+    """Sends requests for `paths` directly to the WSGI application and
+    measures them::
+
+        from keyes.bench import Benchmark
+
+        result = Benchmark(app, ['/', '/api/items'], requests=1000,
+                           concurrency=4).run()
+
+    Every path is requested `requests` times, spread over `concurrency`
+    threads or, if `processes` is ``True``, forked processes.  The
+    environments are built once per path and copied for every request, so
+    the measurement covers the application and not the benchmark.  The
+    first `warmup` requests per path and worker are not measured.
+
+    If a :class:`~keyes.tracing.RequestTracer` adds ``Server-Timing``
+    headers the time spent in each phase is reported as well.
+
+    :param app: the application to benchmark.
+    :param paths: a list of paths, optionally with a query string.
+    :param requests: the number of measured requests per path.
+    :param concurrency: the number of threads or processes.
+    :param processes: if ``True`` forked processes are used instead of
+                      threads.
+    :param warmup: the number of requests per path and worker that are
+                   sent before measuring.
+    :param method: the HTTP method of the requests.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app, paths, requests=1000, concurrency=1,
+                 processes=False, warmup=10, method='GET'):
+        self.app = app
+        self.paths = list(paths)
+        self.requests = requests
+        self.concurrency = max(1, concurrency)
+        self.processes = processes
+        self.warmup = warmup
+        self.method = method
+        self._environs = {}
+        for path in self.paths:
+            builder = EnvironBuilder(path=path, method=method)
+            try:
+                self._environs[path] = builder.get_environ()
+            finally:
+                builder.close()
+
+    def _get_endpoint(self, path):
+        environ = self._environs[path]
+        adapter = self.app.url_map.bind_to_environ(environ)
+        try:
+            return adapter.match(method=self.method)[0]
+        except HTTPException:
+            return None
+
+    def _request(self, environ):
+        environ = dict(environ)
+        environ['wsgi.input'] = BytesIO()
+        headers = []
+
+        def start_response(status, response_headers, exc_info=None):
+            headers.append((int(status.split(None, 1)[0]), response_headers))
+            return lambda data: None
+
+        started = timer()
+        app_iter = self.app(environ, start_response)
+        try:
+            for chunk in app_iter:
+                pass
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        return timer() - started, headers[0][0], headers[0][1]
+
+    def _run_worker(self, count):
+        recorder = _Recorder()
+        for path in self.paths:
+            environ = self._environs[path]
+            for x in range(self.warmup):
+                self._request(environ)
+            latencies = recorder.latencies[path] = []
+            recorder.errors[path] = 0
+            phases = recorder.phases[path] = {}
+            for x in range(count):
+                duration, status, headers = self._request(environ)
+                latencies.append(duration)
+                if status >= 500:
+                    recorder.errors[path] += 1
+                for key, value in headers:
+                    if key.lower() == 'server-timing':
+                        for name, ms in parse_server_timing(value):
+                            phases[name] = phases.get(name, 0) + ms
+        return recorder
+
+    def _get_counts(self):
+        base, extra = divmod(self.requests, self.concurrency)
+        return [base + (idx < extra) for idx in range(self.concurrency)]
+
+    def _run_threads(self, counts):
+        results = []
+        threads = [Thread(target=lambda c=c: results.append(
+            self._run_worker(c))) for c in counts]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def _run_processes(self, counts):
+        global _process_benchmark
+        import multiprocessing
+        if sys.platform == 'win32':
+            raise RuntimeError('Benchmarking with processes requires fork')
+        # the workers have to inherit the application.
+        if hasattr(multiprocessing, 'get_context'):
+            multiprocessing = multiprocessing.get_context('fork')
+        _process_benchmark = self
+        pool = multiprocessing.Pool(len(counts))
+        try:
+            return pool.map(_run_process_worker, counts)
+        finally:
+            pool.close()
+            pool.join()
+            _process_benchmark = None
+
+    def run(self):
+        """Runs the benchmark and returns the results as a dictionary that
+        can be serialized as JSON.  Durations are in milliseconds.
+        """
+        counts = self._get_counts()
+        started = timer()
+        if self.processes:
+            recorders = self._run_processes(counts)
+        else:
+            recorders = self._run_threads(counts)
+        elapsed = timer() - started
+        recorder = _Recorder()
+        for other in recorders:
+            recorder.merge(other)
+
+        paths = {}
+        for path in self.paths:
+            latencies = sorted(recorder.latencies.get(path, ()))
+            count = len(latencies)
+            busy = sum(latencies)
+            phases = recorder.phases.get(path, {})
+            paths[path] = {
+                'endpoint': self._get_endpoint(path),
+                'requests': count,
+                'errors': recorder.errors.get(path, 0),
+                # the requests per second if only this path was requested
+                'throughput': busy and count * self.concurrency / busy,
+                'mean': count and busy / count * 1000,
+                'p50': count and percentile(latencies, 0.5) * 1000,
+                'p90': count and percentile(latencies, 0.9) * 1000,
+                'p99': count and percentile(latencies, 0.99) * 1000,
+                'max': count and latencies[-1] * 1000,
+                'phases': dict((name, total / count) for name, total
+                               in phases.items()) if count else {},
+            }
+        total = sum(path['requests'] for path in paths.values())
+        return {
+            'created': time.time(),
+            'python': sys.version.split()[0],
+            'mode': self.processes and 'processes' or 'threads',
+            'concurrency': self.concurrency,
+            'requests': total,
+            'elapsed': elapsed,
+            'throughput': elapsed and total / elapsed,
+            'paths': paths,
+        }
+
+
+def _run_process_worker(count):
+    return _process_benchmark._run_worker(count)
+
+
+def format_results(results):
+    """Formats the results of :meth:`Benchmark.run` as a table.
+
+    .. versionadded:: 1.0
+    """
+    lines = ['%d requests in %.2fs with %d %s, %.1f requests/s' % (
+        results['requests'], results['elapsed'], results['concurrency'],
+        results['mode'], results['throughput'])]
+    lines.append('%-30s %8s %6s %9s %9s %9s %9s %9s' % (
+        'path', 'requests', 'errors', 'req/s', 'mean ms', 'p50 ms',
+        'p90 ms', 'p99 ms'))
+    for path, stats in sorted(results['paths'].items()):
+        lines.append('%-30s %8d %6d %9.1f %9.3f %9.3f %9.3f %9.3f' % (
+            path, stats['requests'], stats['errors'], stats['throughput'],
+            stats['mean'], stats['p50'], stats['p90'], stats['p99']))
+        for name, duration in sorted(stats['phases'].items()):
+            lines.append('  %-28s %55.3f' % (name, duration))
+    return '\n'.join(lines)
@@ -11,6 +11,7 @@
 
 import os
 import sys
+import hashlib
 from threading import Lock, Thread
 from functools import update_wrapper
 
@@ -233,6 +234,156 @@ app_option = click.Option(['-a', '--app'],
     callback=set_app_value, is_eager=True)
 
 
+def _find_module_file(name):
+    """Returns the file of the module `name` without importing it, or
+    ``None`` if it cannot be found.  Parent packages are imported.
+    """
+    try:
+        try:
+            from importlib.util import find_spec
+        except ImportError:
+            import pkgutil
+            loader = pkgutil.get_loader(name)
+            return loader and loader.get_filename()
+        spec = find_spec(name)
+        return spec and spec.origin
+    except (ImportError, AttributeError, ValueError):
+        return None
+
+
+def _get_cache_folder():
+    """Returns the folder for the cache files of the current user."""
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.expanduser('~/.cache')
+    return os.path.join(base, 'keyes')
+
+
+class CommandIndex(object):
+    """Caches the names and short help texts of the commands of an
+    application in a file in the cache folder of the user, so that
+    :class:`KeyesGroup` can list and resolve them without importing the
+    application.  The index is considered stale once the module of the
+    application is modified, and it is rewritten whenever the application
+    is loaded, so commands that are registered in other modules show up
+    after the next command that loads the application.  If the index
+    cannot be written the commands are listed by importing the
+    application.
+
+    :param path: the filename of the index.
+    :param import_path: the import path of the application.
+    :param source: the filename of the module of the application.
+
+    .. versionadded:: 1.0
+    """
+
+    #: the folder of the index files.  Defaults to a ``keyes`` folder in
+    #: the cache folder of the user, for instance :file:`~/.cache/keyes`.
+    cache_folder = None
+
+    def __init__(self, path, import_path, source):
+        self.path = path
+        self.import_path = import_path
+        self.source = source
+
+    @classmethod
+    def for_script_info(cls, info):
+        """Returns the index for the application of a :class:`ScriptInfo`
+        or ``None`` if the application is not loaded from an import path.
+        """
+        if info.create_app is not None or info.app_import_path is None:
+            return None
+        source = _find_module_file(info.app_import_path.split(':', 1)[0])
+        if not source or not os.path.isfile(source):
+            return None
+        source = os.path.abspath(source)
+        key = hashlib.sha1(repr((source, info.app_import_path))
+                           .encode('utf-8')).hexdigest()
+        folder = cls.cache_folder or _get_cache_folder()
+        return cls(os.path.join(folder, 'commands-%s.json' % key),
+                   info.app_import_path, source)
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.source).st_mtime
+        except OSError:
+            return None
+
+    def load(self):
+        """Returns a dictionary of the command names to their short help
+        or ``None`` if there is no up to date index.
+        """
+        import json
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if not isinstance(data, dict) or \
+           data.get('app') != self.import_path or \
+           data.get('mtime') != self._get_mtime():
+            return None
+        return data.get('commands')
+
+    def store(self, ctx, group):
+        """Writes the commands of `group`, the :attr:`~keyes.Keyes.cli`
+        group of the application, into the index unless they are already
+        stored.  Errors are ignored, for instance if the folder is not
+        writable.
+        """
+        import json
+        commands = {}
+        for name in group.list_commands(ctx):
+            command = group.get_command(ctx, name)
+            if command is None:
+                continue
+            if hasattr(command, 'get_short_help_str'):
+                commands[name] = command.get_short_help_str()
+            else:
+                commands[name] = command.short_help or ''
+        if self.load() == commands:
+            return
+        data = {'app': self.import_path, 'mtime': self._get_mtime(),
+                'commands': commands}
+        tmp = '%s.%d' % (self.path, os.getpid())
+        try:
+            folder = os.path.dirname(self.path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+class LazyCommand(click.Command):
+    """Stands in for a command of the application that is known from the
+    :class:`CommandIndex`.  The application is only loaded once the
+    command is invoked.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, name, short_help, group):
+        click.Command.__init__(self, name, short_help=short_help)
+        self.group = group
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        command = self.group.get_app_command(parent, self.name)
+        if command is None:
+            raise click.UsageError('No such command "%s".' % self.name,
+                                   parent)
+        return command.make_context(info_name, args, parent=parent, **extra)
+
+
 class AppGroup(click.Group):
     """This works similar to a regular click :class:`~click.Group` but it
     changes the behavior of the :meth:`command` decorator so that it
@@ -279,10 +430,17 @@ class KeyesGroup(AppGroup):
     :param add_debug_option: adds the default :option:`--debug` option.
     :param create_app: an optional callback that is passed the script info
                        and returns the loaded app.
+    :param use_command_index: if this is True the commands of the app are
+                              cached in a :class:`CommandIndex` so that
+                              listing them does not load the app.
+
+    .. versionchanged:: 1.0
+       Added the `use_command_index` parameter.
     """
 
     def __init__(self, add_default_commands=True, add_app_option=None,
-                 add_debug_option=True, create_app=None, **extra):
+                 add_debug_option=True, create_app=None,
+                 use_command_index=True, **extra):
         params = list(extra.pop('params', None) or ())
         if add_app_option is None:
             add_app_option = create_app is None
@@ -293,10 +451,15 @@ class KeyesGroup(AppGroup):
 
         AppGroup.__init__(self, params=params, **extra)
         self.create_app = create_app
+        self.use_command_index = use_command_index
 
         if add_default_commands:
             self.add_command(run_command)
             self.add_command(shell_command)
+            self.add_command(profile_command)
+            self.add_command(serve_command)
+            self.add_command(warmup_command)
+            self.add_command(bench_command)
 
     def get_command(self, ctx, name):
         # We load built-in commands first as these should always be the
@@ -310,21 +473,51 @@ class KeyesGroup(AppGroup):
         if rv is not None:
             return rv
 
-        info = ctx.ensure_object(ScriptInfo)
+        # Commands known from the index are resolved without loading the
+        # app, it is loaded once the command runs.  Unknown names might be
+        # commands that were added since the index was written.
+        commands = self._load_command_index(ctx)
+        if commands is not None and name in commands:
+            return LazyCommand(name, commands[name], self)
         try:
-            rv = info.load_app().cli.get_command(ctx, name)
-            if rv is not None:
-                return rv
+            return self.get_app_command(ctx, name)
         except NoAppException:
             pass
 
+    def get_app_command(self, ctx, name):
+        """Loads the app and returns its command `name` or ``None``.
+
+        .. versionadded:: 1.0
+        """
+        return self._load_app_cli(ctx).get_command(ctx, name)
+
+    def _load_app_cli(self, ctx):
+        info = ctx.ensure_object(ScriptInfo)
+        cli = info.load_app().cli
+        if self.use_command_index:
+            index = CommandIndex.for_script_info(info)
+            if index is not None:
+                index.store(ctx, cli)
+        return cli
+
+    def _load_command_index(self, ctx):
+        info = ctx.ensure_object(ScriptInfo)
+        if not self.use_command_index or info._loaded_app is not None:
+            return None
+        index = CommandIndex.for_script_info(info)
+        if index is not None:
+            return index.load()
+
     def list_commands(self, ctx):
         # The commands available is the list of both the application (if
         # available) plus the builtin commands.
         rv = set(click.Group.list_commands(self, ctx))
-        info = ctx.ensure_object(ScriptInfo)
+        commands = self._load_command_index(ctx)
+        if commands is not None:
+            rv.update(commands)
+            return sorted(rv)
         try:
-            rv.update(info.load_app().cli.list_commands(ctx))
+            rv.update(self._load_app_cli(ctx).list_commands(ctx))
         except Exception:
             # Here we intentionally swallow all exceptions as we don't
             # want the help page to break if the app does not exist.
@@ -460,6 +653,172 @@ def shell_command():
     code.interact(banner=banner, local=ctx)
 
 
+@click.command('profile', short_help='Reports the collected request '
+               'profiles.')
+@click.option('--dir', 'directory', default=None,
+              type=click.Path(file_okay=False),
+              help='The folder with the profiles.  Defaults to the '
+              '"profiles" folder in the instance path.')
+@click.option('--endpoint', '-e', default=None,
+              help='Only report the profiles of this endpoint.')
+@click.option('--sort', default='cumulative',
+              help='The pstats sort key for cProfile profiles.')
+@click.option('--limit', default=20,
+              help='The number of functions or stacks to show.')
+@click.option('--output', '-o', default=None,
+              type=click.Path(file_okay=False),
+              help='Also write the merged profiles into this folder.')
+@with_appcontext
+def profile_command(directory, endpoint, sort, limit, output):
+    """Merges the request profiles written by all processes of the
+    application (see keyes.profiling.RequestProfiler) and prints a report
+    for every endpoint.  Optionally the merged profiles are written into a
+    folder, either as pstats files or as collapsed stacks that can be fed
+    to flame graph tools.
+    """
+    from keyes.globals import _app_ctx_stack
+    from keyes.profiling import report_profiles, write_collapsed, \
+         PSTATS_EXTENSION
+    app = _app_ctx_stack.top.app
+    if directory is None:
+        profiler = getattr(app, 'profiler', None)
+        if profiler is not None and profiler.output_dir is not None:
+            directory = profiler.output_dir
+        else:
+            directory = os.path.join(app.instance_path, 'profiles')
+
+    merged = report_profiles(directory, sys.stdout, endpoint=endpoint,
+                             sort=sort, limit=limit)
+    if not merged:
+        raise click.ClickException('No profiles found in %s' % directory)
+
+    if output is not None:
+        if not os.path.isdir(output):
+            os.makedirs(output)
+        for (name, ext), data in iteritems(merged):
+            filename = os.path.join(output, name + ext)
+            if ext == PSTATS_EXTENSION:
+                data.dump_stats(filename)
+            else:
+                write_collapsed(filename, data)
+
+
+@click.command('serve', short_help='Runs a preforking production server.')
+@click.option('--host', '-h', default='127.0.0.1',
+              help='The interface to bind to.')
+@click.option('--port', '-p', default=5000,
+              help='The port to bind to.')
+@click.option('--workers', '-w', default=None, type=int,
+              help='The number of worker processes.  Defaults to the '
+              'number of CPUs.')
+@click.option('--max-requests', default=0,
+              help='Restart a worker after this many requests.  0 '
+              'disables restarting.')
+@click.option('--max-requests-jitter', default=0,
+              help='Add a random number of up to this many requests to '
+              'the limit of every worker.')
+@click.option('--graceful-timeout', default=30,
+              help='The seconds workers get to finish their requests when '
+              'the server stops.')
+@click.option('--warmup/--no-warmup', default=True,
+              help='Enable or disable warming up the app before the '
+              'workers are forked.')
+@click.option('--warmup-request', 'warmup_requests', multiple=True,
+              help='A path that is requested while warming up.  Can be '
+              'given multiple times.')
+@pass_script_info
+def serve_command(info, host, port, workers, max_requests,
+                  max_requests_jitter, graceful_timeout, warmup,
+                  warmup_requests):
+    """Runs the Keyes application with a preforking server.
+
+    The application is loaded and warmed up once in the master process
+    which then forks the worker processes.  Every worker handles one
+    request at a time.  Send SIGHUP to the master to replace the workers
+    gracefully and SIGTERM or SIGINT to stop the server.
+    """
+    from keyes.prefork import PreforkServer
+    if not hasattr(os, 'fork'):
+        raise click.ClickException('The serve command requires os.fork '
+                                   'which is not available on this '
+                                   'platform.')
+    if workers is None:
+        import multiprocessing
+        workers = multiprocessing.cpu_count()
+    app = info.load_app()
+    if info.app_import_path is not None:
+        print(' * Serving Keyes app "%s"' % info.app_import_path)
+    PreforkServer(app, host, port, workers=workers,
+                  max_requests=max_requests,
+                  max_requests_jitter=max_requests_jitter,
+                  graceful_timeout=graceful_timeout, warmup=warmup,
+                  warmup_requests=warmup_requests).serve()
+
+
+@click.command('warmup', short_help='Warms up the app and reports the time '
+               'it took.')
+@click.argument('paths', nargs=-1)
+@click.option('--templates/--no-templates', default=True,
+              help='Enable or disable compiling all templates.')
+@pass_script_info
+def warmup_command(info, paths, templates):
+    """Runs Keyes.warmup for the application, requesting the given
+    paths, and reports how long it took.  This shows how much the first
+    request of a process is slowed down without warming up and verifies
+    that all templates compile.
+    """
+    from keyes._compat import timer
+    started = timer()
+    app = info.load_app()
+    loaded = timer()
+    app.warmup(requests=paths, templates=templates)
+    finished = timer()
+    click.echo('Loaded the app in %.3fs and warmed it up in %.3fs.'
+               % (loaded - started, finished - loaded))
+
+
+@click.command('bench', short_help='Benchmarks the app in-process.')
+@click.argument('paths', nargs=-1)
+@click.option('--requests', '-n', default=1000,
+              help='The number of measured requests per path.')
+@click.option('--concurrency', '-c', default=1,
+              help='The number of threads or processes.')
+@click.option('--processes/--threads', default=False,
+              help='Send the requests from forked processes instead of '
+              'threads.')
+@click.option('--warmup', default=10,
+              help='The number of unmeasured requests per path and worker.')
+@click.option('--output', '-o', default=None, type=click.Path(dir_okay=False),
+              help='Write the results as JSON into this file.')
+@pass_script_info
+def bench_command(info, paths, requests, concurrency, processes, warmup,
+                  output):
+    """Benchmarks the application by calling it directly with
+    synthetic requests for the given paths, or for all routes that accept
+    GET requests without arguments, and reports the throughput and the
+    latency percentiles per path.  If the app uses a
+    keyes.tracing.RequestTracer the time of each phase is reported too.
+    """
+    from keyes.bench import Benchmark, find_get_routes, format_results
+    app = info.load_app()
+    if not paths:
+        paths = find_get_routes(app)
+        if not paths:
+            raise click.UsageError('The app has no GET routes without '
+                                   'arguments, pass the paths to request.')
+    try:
+        results = Benchmark(app, paths, requests=requests,
+                            concurrency=concurrency, processes=processes,
+                            warmup=warmup).run()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(format_results(results))
+    if output is not None:
+        import json
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
 cli = KeyesGroup(help="""\
 This shell command acts as general utility script for Keyes applications.
 
@@ -10,11 +10,13 @@
 """
 
 import os
+import re
 import types
 import errno
+from datetime import timedelta
 
 from werkzeug.utils import import_string
-from ._compat import string_types, iteritems
+from ._compat import string_types, integer_types, iteritems
 from . import json
 
 
@@ -28,7 +30,11 @@ class ConfigAttribute(object):
     def __get__(self, obj, type=None):
         if obj is None:
             return self
-        rv = obj.config[self.__name__]
+        snapshot = obj.config_snapshot
+        if snapshot is not None:
+            rv = getattr(snapshot, self.__name__)
+        else:
+            rv = obj.config[self.__name__]
         if self.get_converter is not None:
             rv = self.get_converter(rv)
         return rv
@@ -37,6 +43,137 @@ class ConfigAttribute(object):
         obj.config[self.__name__] = value
 
 
+_true_strings = frozenset(['1', 'true', 'yes', 'on'])
+_false_strings = frozenset(['0', 'false', 'no', 'off', ''])
+_missing = object()
+
+# keys of the default config that are ``None`` by default but hold
+# strings, so their values are never parsed as JSON.
+_string_keys = frozenset(['SECRET_KEY', 'LOGGER_NAME', 'SERVER_NAME',
+                          'APPLICATION_ROOT', 'SESSION_COOKIE_DOMAIN',
+                          'SESSION_COOKIE_PATH'])
+
+
+def _coerce_env_value(key, value, default):
+    """Converts the string `value` of an environment variable to the type
+    of `default`.  Values of string keys such as ``SECRET_KEY`` are kept as
+    they are.  Values without a default or with ``None`` as default are
+    parsed as JSON if possible and kept as string otherwise.
+    """
+    if key in _string_keys:
+        return value
+    if isinstance(default, bool):
+        lowered = value.strip().lower()
+        if lowered in _true_strings:
+            return True
+        if lowered in _false_strings:
+            return False
+        raise ValueError('%r is not a boolean' % value)
+    if isinstance(default, string_types):
+        return value
+    if isinstance(default, integer_types):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    if isinstance(default, timedelta):
+        return timedelta(seconds=float(value))
+    if default is _missing or default is None:
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return json.loads(value)
+
+
+def _set_env_value(mapping, path, value):
+    """Sets the item of `mapping` or of a nested dictionary at `path`,
+    copying the nested dictionaries on the way.
+    """
+    key = path[0]
+    if len(path) == 1:
+        mapping[key] = _coerce_env_value(key, value,
+                                         mapping.get(key, _missing))
+        return
+    nested = mapping.get(key)
+    if nested is None:
+        nested = {}
+    elif not isinstance(nested, dict):
+        raise TypeError('%s is not a dictionary' % key)
+    nested = dict(nested)
+    _set_env_value(nested, path[1:], value)
+    mapping[key] = nested
+
+
+_snapshot_key_re = re.compile(r'^[A-Za-z][A-Za-z0-9_]*$')
+_snapshot_classes = {}
+
+
+def _frozen_error():
+    raise RuntimeError('The config is frozen.  Thaw it (for instance with '
+                       'Keyes.unfreeze_config) before changing it.')
+
+
+class ConfigSnapshot(object):
+    """An immutable copy of a :class:`Config` with attribute access to the
+    configuration values::
+
+        snapshot = app.config.freeze()
+        snapshot.SERVER_NAME
+
+    The values are stored in slots so reading them is as fast as reading
+    a regular attribute.  Item access and :meth:`get` work like on the
+    config.  Keys that are not valid identifiers are not included.
+
+    .. versionadded:: 1.0
+    """
+
+    __slots__ = ('_keys',)
+
+    def __new__(cls, mapping):
+        # the keys are ASCII, so ``str`` also turns unicode keys on
+        # Python 2 into valid slot names.
+        keys = tuple(sorted(str(key) for key in mapping
+                            if isinstance(key, string_types) and
+                            _snapshot_key_re.match(key) and
+                            not hasattr(cls, key)))
+        snapshot_cls = _snapshot_classes.get((cls, keys))
+        if snapshot_cls is None:
+            snapshot_cls = type(cls.__name__, (cls,), {'__slots__': keys})
+            _snapshot_classes[(cls, keys)] = snapshot_cls
+        self = object.__new__(snapshot_cls)
+        for key in keys:
+            object.__setattr__(self, key, mapping[key])
+        object.__setattr__(self, '_keys', keys)
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Config snapshots are immutable')
+
+    __delattr__ = __setattr__
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def to_dict(self):
+        """Returns the values as a new dictionary."""
+        return dict((key, getattr(self, key)) for key in self._keys)
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.to_dict())
+
+
 class Config(dict):
     """Works exactly like a dict but provides ways to fill it from files
     or special dictionaries.  There are two common patterns to populate the
@@ -81,9 +218,74 @@ class Config(dict):
     :param defaults: an optional dictionary of default values
     """
 
+    #: ``True`` while the config is frozen, see :meth:`freeze`.
+    #:
+    #: .. versionadded:: 1.0
+    frozen = False
+
     def __init__(self, root_path, defaults=None):
         dict.__init__(self, defaults or {})
         self.root_path = root_path
+        #: The files the config was loaded from as ``(loader, filename,
+        #: silent)`` tuples in the order they were loaded, where `loader`
+        #: is the name of the method that loaded the file.  Files that were
+        #: silently skipped because they did not exist are included.  This
+        #: is used by the :class:`~keyes.configwatch.ConfigWatcher`.
+        #:
+        #: .. versionadded:: 1.0
+        self.sources = []
+
+    def freeze(self):
+        """Makes the config read-only and returns a :class:`ConfigSnapshot`
+        of it.  Changing a frozen config raises a :exc:`RuntimeError` until
+        :meth:`thaw` is called.
+
+        .. versionadded:: 1.0
+        """
+        self.frozen = True
+        return ConfigSnapshot(self)
+
+    def thaw(self):
+        """Makes a frozen config writable again.
+
+        .. versionadded:: 1.0
+        """
+        self.frozen = False
+
+    def __setitem__(self, key, value):
+        if self.frozen:
+            _frozen_error()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if self.frozen:
+            _frozen_error()
+        dict.__delitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        if self.frozen:
+            _frozen_error()
+        dict.update(self, *args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        if self.frozen and key not in self:
+            _frozen_error()
+        return dict.setdefault(self, key, default)
+
+    def pop(self, *args):
+        if self.frozen:
+            _frozen_error()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        if self.frozen:
+            _frozen_error()
+        return dict.popitem(self)
+
+    def clear(self):
+        if self.frozen:
+            _frozen_error()
+        dict.clear(self)
 
     def from_envvar(self, variable_name, silent=False):
         """Loads a configuration from an environment variable pointing to
@@ -123,6 +325,7 @@ class Config(dict):
            `silent` parameter.
         """
         filename = os.path.join(self.root_path, filename)
+        self.sources.append(('from_pyfile', filename, silent))
         d = types.ModuleType('config')
         d.__file__ = filename
         try:
@@ -179,6 +382,7 @@ class Config(dict):
         .. versionadded:: 1.0
         """
         filename = os.path.join(self.root_path, filename)
+        self.sources.append(('from_json', filename, silent))
 
         try:
             with open(filename) as json_file:
@@ -213,6 +417,53 @@ class Config(dict):
                     self[key] = value
         return True
 
+    def from_prefixed_env(self, prefix='KEYES', environ=None):
+        """Updates the config from the environment variables that start
+        with ``prefix + '_'``.  The prefix is removed, so ``KEYES_SECRET_KEY``
+        sets ``SECRET_KEY`` and ``KEYES_CACHE_TYPE`` can be read with
+        ``get_namespace('CACHE_')`` like any other key.
+
+        The values are converted to the type of the current value of the
+        key, for instance the default from
+        :attr:`~keyes.Keyes.default_config`: booleans accept ``1``,
+        ``true``, ``yes`` and ``on`` as well as ``0``, ``false``, ``no`` and
+        ``off``, integers and floats are parsed as numbers and
+        :class:`~datetime.timedelta` values as seconds.  Strings are kept
+        as they are, and so are the values of ``SECRET_KEY``,
+        ``SERVER_NAME``, ``APPLICATION_ROOT``, ``LOGGER_NAME`` and the
+        ``SESSION_COOKIE_DOMAIN`` and ``SESSION_COOKIE_PATH`` keys even
+        though they default to ``None``.  Values of other keys are parsed
+        as JSON, and values of keys that are not set or set to ``None``,
+        such as ``MAX_CONTENT_LENGTH``, are parsed as JSON if possible and
+        kept as strings otherwise.
+
+        Double underscores set an item of a nested dictionary, so
+        ``KEYES_DATABASE__POOL_SIZE=10`` sets the ``POOL_SIZE`` item of the
+        ``DATABASE`` dictionary.  The dictionary is copied, not changed in
+        place.
+
+        Invalid values raise a :exc:`ValueError` naming the variable.
+
+        :param prefix: the prefix of the environment variables without the
+                       trailing underscore.
+        :param environ: the environment to read instead of
+                        :data:`os.environ`.
+
+        .. versionadded:: 1.0
+        """
+        if environ is None:
+            environ = os.environ
+        prefix = prefix + '_'
+        for name in sorted(environ):
+            if not name.startswith(prefix) or name == prefix:
+                continue
+            path = name[len(prefix):].split('__')
+            try:
+                _set_env_value(self, path, environ[name])
+            except (TypeError, ValueError) as e:
+                raise ValueError('Invalid value for %s: %s' % (name, e))
+        return True
+
     def get_namespace(self, namespace, lowercase=True, trim_namespace=True):
         """Returns a dictionary containing a subset of configuration options
         that match the specified namespace/prefix. Example usage::
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.configwatch
+    ~~~~~~~~~~~~~~~~~
+
+    Reloads the configuration of a running application when its files
+    change.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+from threading import Lock
+
+from ._compat import timer
+
+
+_missing = object()
+
+
+class ConfigWatcher(object):
+    """Reloads the config of an application when one of the files it was
+    loaded from with :meth:`~keyes.Config.from_pyfile`,
+    :meth:`~keyes.Config.from_json` or :meth:`~keyes.Config.from_envvar`
+    changes::
+
+        from keyes.configwatch import ConfigWatcher
+
+        app.config.from_envvar('MYAPP_SETTINGS')
+        watcher = ConfigWatcher(app, interval=5)
+
+        @watcher.connect(keys=['CACHE_SIZE'])
+        def resize_cache(app, changed):
+            cache.resize(app.config['CACHE_SIZE'])
+
+    Once attached :meth:`~keyes.Keyes.wsgi_app` calls :meth:`poll` before
+    every request, which compares the modification times of the files at
+    most every `interval` seconds.  If a file changed the sources are
+    loaded again, in their original order, into a new config that starts
+    out as a copy of the current one.  The new config then replaces
+    :attr:`~keyes.Keyes.config` at once, so a request never sees a half
+    loaded config, and requests that are in flight are not interrupted.
+    A frozen config (see :meth:`~keyes.Keyes.freeze_config`) is frozen
+    again after the swap.
+
+    Keys that were removed from a file keep their previous value.  If a
+    file cannot be loaded the error is logged and the current config stays
+    in place until the file changes again.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param interval: the minimum number of seconds between two checks of
+                     the files.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, interval=1.0):
+        self.interval = interval
+        self.app = None
+        self._lock = Lock()
+        self._callbacks = []
+        self._mtimes = {}
+        self._next_check = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the watcher to the given application."""
+        self.app = app
+        self._mtimes = self._get_mtimes()
+        self._next_check = timer() + self.interval
+        app.config_watcher = self
+
+    def connect(self, f=None, keys=None):
+        """Registers a function that is called with the application and the
+        set of changed keys after the config was reloaded.  If `keys` is
+        given the function is only called if one of them changed.  Can be
+        used as a decorator, with or without arguments.
+        """
+        if f is None:
+            return lambda f: self.connect(f, keys)
+        if keys is not None:
+            keys = frozenset(keys)
+        self._callbacks.append((f, keys))
+        return f
+
+    def disconnect(self, f):
+        """Removes a function registered with :meth:`connect`."""
+        self._callbacks = [(func, keys) for func, keys in self._callbacks
+                           if func is not f]
+
+    def _get_mtimes(self):
+        rv = {}
+        for loader, filename, silent in self.app.config.sources:
+            try:
+                rv[filename] = os.stat(filename).st_mtime
+            except OSError:
+                rv[filename] = None
+        return rv
+
+    def poll(self):
+        """Reloads the config if the check interval passed and one of the
+        files changed.  Only one thread checks at a time, the others go on
+        with the current config.  Returns the set of changed keys or
+        ``None`` if the config was not reloaded.
+        """
+        if timer() < self._next_check or not self._lock.acquire(False):
+            return None
+        try:
+            self._next_check = timer() + self.interval
+            mtimes = self._get_mtimes()
+            if mtimes == self._mtimes:
+                return None
+            self._mtimes = mtimes
+            return self._reload()
+        finally:
+            self._lock.release()
+
+    def reload(self):
+        """Loads the config files again right away and returns the set of
+        changed keys.
+        """
+        with self._lock:
+            self._mtimes = self._get_mtimes()
+            return self._reload()
+
+    def _reload(self):
+        app = self.app
+        old = app.config
+        new = old.__class__(old.root_path, old)
+        try:
+            for loader, filename, silent in old.sources:
+                getattr(new, loader)(filename, silent=silent)
+        except Exception:
+            app.logger.exception('Could not reload the configuration')
+            return None
+
+        changed = set()
+        for key in set(old) | set(new):
+            if old.get(key, _missing) != new.get(key, _missing):
+                changed.add(key)
+        if not changed:
+            return changed
+
+        if app.config_snapshot is not None:
+            snapshot = new.freeze()
+            app.config = new
+            app.config_snapshot = snapshot
+        else:
+            app.config = new
+        app.logger.info('Reloaded the configuration, changed keys: %s',
+                        ', '.join(sorted(changed)))
+        self.notify(changed)
+        return changed
+
+    def notify(self, changed):
+        """Calls the registered functions for the changed keys.  Errors
+        are logged and do not keep the other functions from being called.
+        """
+        for f, keys in self._callbacks:
+            if keys is not None and not keys & changed:
+                continue
+            try:
+                f(self.app, changed)
+            except Exception:
+                self.app.logger.exception('Error in config change callback')
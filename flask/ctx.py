@@ -16,7 +16,8 @@ from werkzeug.exceptions import HTTPException
 
 from .globals import _request_ctx_stack, _app_ctx_stack
 from .signals import appcontext_pushed, appcontext_popped
-from ._compat import BROKEN_PYPY_CTXMGR_EXIT, reraise
+from .tracing import PhaseTimer
+from ._compat import BROKEN_PYPY_CTXMGR_EXIT, reraise, timer
 
 
 # a singleton sentinel value for parameter defaults
@@ -260,7 +261,19 @@ class RequestContext(object):
         # functions.
         self._after_request_functions = []
 
-        self.match_request()
+        # The timings are only started for new requests, copies of the
+        # context keep reporting into the timings of the original request.
+        timings = None
+        if self.request.phase_timings is None and \
+           app.request_tracer is not None:
+            timings = self.request.phase_timings = \
+                app.request_tracer.start_request()
+
+        if timings is None:
+            self.match_request()
+        else:
+            with PhaseTimer('routing', timings):
+                self.match_request()
 
     def _get_g(self):
         return _app_ctx_stack.top.g
@@ -323,13 +336,27 @@ class RequestContext(object):
 
         _request_ctx_stack.push(self)
 
+        if self.request.deadline is None:
+            timeout = getattr(self.request.url_rule, 'timeout', None)
+            if timeout is None:
+                timeout = self.app._config_view['REQUEST_TIMEOUT']
+            if timeout is not None:
+                self.request.deadline = timer() + timeout
+
         # Open the session at the moment that the request context is
         # available. This allows a custom open_session method to use the
         # request context (e.g. code that access database information
-        # stored on `g` instead of the appcontext).
-        self.session = self.app.open_session(self.request)
+        # stored on `g` instead of the appcontext).  A session that was
+        # already set, for instance by a batch request, is kept.
         if self.session is None:
-            self.session = self.app.make_null_session()
+            timings = self.request.phase_timings
+            if timings is not None:
+                started = timer()
+            self.session = self.app.open_session(self.request)
+            if self.session is None:
+                self.session = self.app.make_null_session()
+            if timings is not None:
+                timings.add('session_open', timer() - started)
 
     def pop(self, exc=_sentinel):
         """Pops the request context and unbinds it by doing that.  This will
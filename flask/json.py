@@ -12,6 +12,7 @@ import io
 import uuid
 from datetime import date
 from .globals import current_app, request
+from .tracing import PhaseTimer
 from ._compat import text_type, PY2
 
 from werkzeug.http import http_date
@@ -95,9 +96,10 @@ def _dump_arg_defaults(kwargs):
     """Inject default arguments for dump functions."""
     if current_app:
         kwargs.setdefault('cls', current_app.json_encoder)
-        if not current_app.config['JSON_AS_ASCII']:
+        config = current_app._config_view
+        if not config['JSON_AS_ASCII']:
             kwargs.setdefault('ensure_ascii', False)
-        kwargs.setdefault('sort_keys', current_app.config['JSON_SORT_KEYS'])
+        kwargs.setdefault('sort_keys', config['JSON_SORT_KEYS'])
     else:
         kwargs.setdefault('sort_keys', True)
         kwargs.setdefault('cls', JSONEncoder)
@@ -251,7 +253,8 @@ def jsonify(*args, **kwargs):
     indent = None
     separators = (',', ':')
 
-    if current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] and not request.is_xhr:
+    config = current_app._config_view
+    if config['JSONIFY_PRETTYPRINT_REGULAR'] and not request.is_xhr:
         indent = 2
         separators = (', ', ': ')
 
@@ -262,9 +265,11 @@ def jsonify(*args, **kwargs):
     else:
         data = args or kwargs
 
+    with PhaseTimer('serialize'):
+        rv = dumps(data, indent=indent, separators=separators)
     return current_app.response_class(
-        (dumps(data, indent=indent, separators=separators), '\n'),
-        mimetype=current_app.config['JSONIFY_MIMETYPE']
+        (rv, '\n'),
+        mimetype=config['JSONIFY_MIMETYPE']
     )
 
 
@@ -11,11 +11,20 @@
 
 from __future__ import absolute_import
 
+import os
 import sys
+import copy
+import atexit
+from threading import Lock, Thread
+
+try:
+    from queue import Queue, Full, Empty
+except ImportError:
+    from Queue import Queue, Full, Empty
 
 from werkzeug.local import LocalProxy
-from logging import getLogger, StreamHandler, Formatter, getLoggerClass, \
-     DEBUG, ERROR
+from logging import getLogger, Handler, StreamHandler, Formatter, \
+     getLoggerClass, DEBUG, ERROR
 from .globals import _request_ctx_stack
 
 
@@ -47,12 +56,190 @@ def _should_log_for(app, mode):
     return False
 
 
+def _emit_to_record_stream(handler, record):
+    """Emits a record on a stream handler.  If the record was queued it
+    carries the stream :data:`_proxy_stream` resolved to on the request
+    thread and is written there instead of the handler's stream.  If the
+    request closed that stream in the meantime the record is written to
+    ``sys.stderr``.
+    """
+    stream = getattr(record, 'keyes_stream', None)
+    if stream is None:
+        return StreamHandler.emit(handler, record)
+    if getattr(stream, 'closed', False):
+        stream = sys.stderr
+    # the handler lock is held while emitting so swapping the stream
+    # is safe.
+    old_stream = handler.stream
+    handler.stream = stream
+    try:
+        StreamHandler.emit(handler, record)
+    finally:
+        handler.stream = old_stream
+
+
+_stop_listener = object()
+
+# the queueing handlers with a running listener, closed at exit.
+_running_handlers = set()
+
+
+def _close_running_handlers():
+    for handler in list(_running_handlers):
+        handler.close()
+
+
+atexit.register(_close_running_handlers)
+
+
+class QueueingHandler(Handler):
+    """A handler that puts log records into a bounded queue and returns
+    immediately.  A listener thread drains the queue and passes the records
+    to the `handlers`.  This keeps slow log sinks from adding to the latency
+    of requests.  It is used by the application logger if the
+    ``LOGGER_QUEUE_SIZE`` config key is set.
+
+    Records are prepared before they are queued: the message is formatted,
+    exception information is rendered to text and the stream that
+    :data:`_proxy_stream` resolves to on the request thread is stored on
+    the record so that request scoped output still ends up in
+    ``wsgi.errors``.  Records whose request closed that stream before they
+    were handled are written to ``sys.stderr``.
+
+    If the queue is full the `overflow` policy decides what happens:
+    ``'drop'`` discards the new record, ``'drop_oldest'`` discards the
+    oldest queued record and ``'block'`` waits for the listener.  The
+    number of queued, handled and dropped records is available as
+    :attr:`queued`, :attr:`handled` and :attr:`dropped`.
+
+    The listener is started lazily and restarted in forked processes.
+    Listeners that are still running when the interpreter exits are
+    stopped after the queued records were handled.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, handlers, maxsize=10000, overflow='drop'):
+        if overflow not in ('drop', 'drop_oldest', 'block'):
+            raise ValueError('Unknown overflow policy %r' % overflow)
+        Handler.__init__(self)
+        self.handlers = list(handlers)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.queued = 0
+        self.handled = 0
+        self.dropped = 0
+        self._start_lock = Lock()
+        self._count_lock = Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return self._queue
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = Queue(self.maxsize)
+                self._thread = Thread(target=self._listen,
+                                      args=(self._queue,),
+                                      name='keyes-log-listener')
+                self._thread.daemon = True
+                self._thread.start()
+                self._pid = os.getpid()
+                _running_handlers.add(self)
+        return self._queue
+
+    def _listen(self, queue):
+        while 1:
+            record = queue.get()
+            if record is _stop_listener:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            self._count('handled')
+
+    def prepare(self, record):
+        """Prepares a copy of the record for being handled on another
+        thread.  The record itself is passed on to the handlers of the
+        parent loggers and is therefore not changed.
+        """
+        msg = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = _exc_formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = msg
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        record.keyes_stream = _proxy_stream._get_current_object()
+        return record
+
+    def _count(self, attr):
+        with self._count_lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def emit(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                break
+        else:
+            return
+        try:
+            record = self.prepare(record)
+            self._enqueue(self._ensure_listener(), record)
+        except Exception:
+            self.handleError(record)
+
+    def _enqueue(self, queue, record):
+        if self.overflow == 'block':
+            queue.put(record)
+        else:
+            try:
+                queue.put_nowait(record)
+            except Full:
+                if self.overflow == 'drop':
+                    self._count('dropped')
+                    return
+                try:
+                    queue.get_nowait()
+                    self._count('dropped')
+                except Empty:
+                    pass
+                try:
+                    queue.put_nowait(record)
+                except Full:
+                    self._count('dropped')
+                    return
+        self._count('queued')
+
+    def close(self, timeout=5):
+        """Stops the listener after the queued records were handled."""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and \
+           thread.is_alive():
+            self._queue.put(_stop_listener)
+            thread.join(timeout)
+        self._pid = self._thread = None
+        _running_handlers.discard(self)
+        Handler.close(self)
+
+
+_exc_formatter = Formatter()
+
+
 def create_logger(app):
     """Creates a logger for the given application.  This logger works
     similar to a regular Python logger but changes the effective logging
     level based on the application's debug flag.  Furthermore this
     function also removes all attached handlers in case there was a
     logger with the log name before.
+
+    If ``LOGGER_QUEUE_SIZE`` is set the default handlers are wrapped in a
+    :class:`QueueingHandler` so that records are written from a background
+    thread instead of the thread that logs them.
     """
     Logger = getLoggerClass()
 
@@ -65,12 +252,12 @@ def create_logger(app):
     class DebugHandler(StreamHandler):
         def emit(self, record):
             if app.debug and _should_log_for(app, 'debug'):
-                StreamHandler.emit(self, record)
+                _emit_to_record_stream(self, record)
 
     class ProductionHandler(StreamHandler):
         def emit(self, record):
             if not app.debug and _should_log_for(app, 'production'):
-                StreamHandler.emit(self, record)
+                _emit_to_record_stream(self, record)
 
     debug_handler = DebugHandler()
     debug_handler.setLevel(DEBUG)
@@ -83,8 +270,18 @@ def create_logger(app):
     logger = getLogger(app.logger_name)
     # just in case that was not a new logger, get rid of all the handlers
     # already attached to it.
+    for handler in logger.handlers:
+        if isinstance(handler, QueueingHandler):
+            handler.close()
     del logger.handlers[:]
     logger.__class__ = DebugLogger
-    logger.addHandler(debug_handler)
-    logger.addHandler(prod_handler)
+
+    queue_size = app.config['LOGGER_QUEUE_SIZE']
+    if queue_size:
+        handler = QueueingHandler([debug_handler, prod_handler], queue_size,
+                                  app.config['LOGGER_QUEUE_OVERFLOW'])
+        logger.addHandler(handler)
+    else:
+        logger.addHandler(debug_handler)
+        logger.addHandler(prod_handler)
     return logger
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.memory
+    ~~~~~~~~~~~~
+
+    Implements per request memory allocation tracking on top of
+    :mod:`tracemalloc`.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+from threading import Lock
+
+from .profiling import RequestSampler
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class EndpointMemoryStats(object):
+    """The memory statistics of the tracked requests of one endpoint.  All
+    sizes are in bytes.
+
+    .. versionadded:: 1.0
+    """
+
+    __slots__ = ('count', 'peak_total', 'peak_max', 'retained_total',
+                 'retained_max')
+
+    def __init__(self):
+        #: the number of tracked requests.
+        self.count = 0
+        #: the sum and the maximum of the peak memory allocated while the
+        #: requests were handled.
+        self.peak_total = self.peak_max = 0
+        #: the sum and the maximum of the memory that was allocated during
+        #: the requests and was still allocated when they finished.
+        self.retained_total = self.retained_max = 0
+
+    def add(self, peak, retained):
+        self.count += 1
+        self.peak_total += peak
+        self.peak_max = max(self.peak_max, peak)
+        self.retained_total += retained
+        self.retained_max = max(self.retained_max, retained)
+
+    def __repr__(self):
+        return '<%s count=%d peak_max=%d retained_max=%d>' % (
+            self.__class__.__name__, self.count, self.peak_max,
+            self.retained_max)
+
+
+class MemoryTracker(object):
+    """Tracks the memory allocations of a sample of the requests handled
+    by an application with :mod:`tracemalloc`.  Once attached to an
+    application :meth:`~keyes.Keyes.wsgi_app` runs the sampled requests
+    under the tracker::
+
+        from keyes.memory import MemoryTracker
+
+        MemoryTracker(app, sample_rate=0.01, threshold=10 * 1024 * 1024)
+
+    For every sampled request the peak and the retained allocations (the
+    memory allocated while handling the request that is still allocated
+    afterwards, for instance because it was stored on a global cache) are
+    recorded per endpoint and available through :meth:`get_stats`.  If a
+    request retains at least `threshold` bytes the top allocation sites are
+    reported through :meth:`report`.
+
+    Unless tracing was already started, :mod:`tracemalloc` only traces
+    while a sampled request is running and at most one request is tracked
+    at any time.  The reported allocation sites are the difference to a
+    snapshot taken when the request started, so allocations that were
+    traced before are not included.  Taking that snapshot is expensive if
+    tracing was already started.  Note that allocations made by other
+    threads while a request is tracked are attributed to it as well.
+
+    This requires Python 3.4 or later.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param sample_rate: the fraction of requests to track.
+    :param endpoints: endpoints that are always tracked.
+    :param header: a request header that forces tracking if sent.
+    :param threshold: the number of retained bytes above which the top
+                      allocation sites of a request are reported.
+    :param top: the number of allocation sites to report.
+    :param frames: the number of frames :mod:`tracemalloc` stores per
+                   allocation.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, sample_rate=0.01, endpoints=None,
+                 header=None, threshold=1024 * 1024, top=10, frames=1):
+        if tracemalloc is None:
+            raise RuntimeError('Tracking memory allocations requires the '
+                               'tracemalloc module (Python 3.4 or later).')
+        self.sampler = RequestSampler(sample_rate, endpoints, header)
+        self.threshold = threshold
+        self.top = top
+        self.frames = frames
+        self.app = app
+        self._busy = Lock()
+        self._stats_lock = Lock()
+        self._stats = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the tracker to the given application."""
+        self.app = app
+        app.memory_tracker = self
+
+    def should_track(self, request):
+        """Returns ``True`` if the given request should be tracked."""
+        return self.sampler.should_sample(request)
+
+    def track(self, request, func):
+        """Calls `func` while tracing allocations and records the memory
+        statistics for the request's endpoint.
+        """
+        if not self._busy.acquire(False):
+            return func()
+        try:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(self.frames)
+            elif hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            start_snapshot = tracemalloc.take_snapshot()
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                return func()
+            finally:
+                self._finish(request, before, start_snapshot,
+                             started_tracing)
+        finally:
+            self._busy.release()
+
+    def _finish(self, request, before, start_snapshot, started_tracing):
+        try:
+            current, peak = tracemalloc.get_traced_memory()
+            retained = max(current - before, 0)
+            peak = max(peak - before, 0)
+            snapshot = None
+            if retained >= self.threshold:
+                snapshot = tracemalloc.take_snapshot()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        endpoint = request.endpoint
+        with self._stats_lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointMemoryStats()
+            stats.add(peak, retained)
+
+        if snapshot is not None:
+            filters = (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            )
+            statistics = snapshot.filter_traces(filters).compare_to(
+                start_snapshot.filter_traces(filters), 'lineno')
+            statistics = [stat for stat in statistics if stat.size_diff > 0]
+            statistics.sort(key=lambda stat: stat.size_diff, reverse=True)
+            self.report(request, peak, retained, statistics[:self.top])
+
+    def get_stats(self):
+        """Returns a dictionary that maps endpoints to their
+        :class:`EndpointMemoryStats`.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def report(self, request, peak, retained, statistics):
+        """Called for every tracked request that retained more than the
+        threshold.  `statistics` is a list of
+        :class:`tracemalloc.StatisticDiff` objects for the top allocation
+        sites, compared to the start of the request.  The default implementation logs a warning on the
+        application logger.
+        """
+        lines = ['Request to %s [%s] (endpoint %s) retained %d bytes, '
+                 'peak %d bytes.  Top allocation sites:' % (
+                     request.path, request.method, request.endpoint,
+                     retained, peak)]
+        for stat in statistics:
+            frame = stat.traceback[0]
+            lines.append('  %s:%d: %d bytes in %d blocks' % (
+                frame.filename, frame.lineno, stat.size_diff,
+                stat.count_diff))
+        self.app.logger.warning('\n'.join(lines))
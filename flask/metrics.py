@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.metrics
+    ~~~~~~~~~~~~~
+
+    Implements per endpoint request metrics that can be exposed in the
+    Prometheus text format.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import weakref
+from bisect import bisect_left
+from threading import Lock, local, current_thread
+
+from ._compat import iteritems
+
+
+#: The default upper bounds (in seconds) of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: The mimetype of the Prometheus text exposition format.
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4'
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n') \
+        .replace('"', '\\"')
+
+
+def _format_float(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _parse_length(value):
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return 0
+
+
+class _Shard(object):
+    """The metrics recorded by a single thread.  Only the owning thread
+    ever writes to a shard so recording does not need a lock.
+
+    Every series is a list with one counter per histogram bucket
+    (including the implicit ``+Inf`` bucket) followed by the sum of the
+    latencies, the number of request bytes and the number of response
+    bytes.
+    """
+
+    __slots__ = ('series', 'in_flight', '__weakref__')
+
+    def __init__(self):
+        self.series = {}
+        self.in_flight = 0
+
+
+class RequestMetrics(object):
+    """Collects latency histograms, request and response sizes and the
+    number of requests in flight for every endpoint and status code of an
+    application.  Recording happens in :meth:`~keyes.Keyes.wsgi_app` once
+    the metrics are attached to an application::
+
+        from keyes.metrics import RequestMetrics
+
+        metrics = RequestMetrics(app, url='/metrics')
+
+    Each thread aggregates into its own shard so the request path never
+    has to acquire a lock.  The shards are only merged when the metrics
+    are read through :meth:`collect` or :meth:`render_prometheus`.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param buckets: the upper bounds of the latency histogram buckets in
+                    seconds.  An implicit ``+Inf`` bucket is always added.
+    :param url: if given, a view exposing the metrics in the Prometheus
+                text format is registered at this URL rule.
+    :param endpoint: the endpoint for the view registered for `url`.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, buckets=DEFAULT_BUCKETS, url=None,
+                 endpoint='metrics'):
+        self.buckets = tuple(sorted(float(x) for x in buckets))
+        self.url = url
+        self.endpoint = endpoint
+        self._local = local()
+        self._lock = Lock()
+        self._shards = []
+        self._retired = _Shard()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the metrics to the given application and registers
+        the metrics view if a URL was provided.
+        """
+        app.metrics = self
+        if self.url is not None:
+            app.add_url_rule(self.url, self.endpoint, self.view)
+
+    def _get_shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        shard = self._local.shard = _Shard()
+        with self._lock:
+            self._retire_dead_shards()
+            self._shards.append((weakref.ref(current_thread()), shard))
+        return shard
+
+    def _retire_dead_shards(self):
+        # Threads come and go (some servers use one thread per request)
+        # so the shards of finished threads are folded into a single
+        # retired shard.  Must be called with the lock held.
+        alive = []
+        for thread_ref, shard in self._shards:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                alive.append((thread_ref, shard))
+            else:
+                self._merge_into(self._retired.series, shard.series)
+                self._retired.in_flight += shard.in_flight
+        self._shards[:] = alive
+
+    @staticmethod
+    def _merge_into(target, series):
+        # ``list()`` copies in one step while holding the GIL which makes
+        # reading the shard of another thread safe.
+        for key, values in list(series.items()):
+            values = list(values)
+            existing = target.get(key)
+            if existing is None:
+                target[key] = values
+            else:
+                for idx, value in enumerate(values):
+                    existing[idx] += value
+
+    def request_started(self):
+        """Called when a request comes in.  Returns the shard the request
+        is recorded into which has to be passed to :meth:`request_finished`.
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._get_shard()
+        shard.in_flight += 1
+        return shard
+
+    def request_finished(self, shard, request, response, duration):
+        """Records a finished request on the shard returned by
+        :meth:`request_started`.  If `response` is ``None`` the request is
+        recorded with status ``500``.  The request size is taken from the
+        ``Content-Length`` header, the size of a buffered response from
+        its body and the size of a streamed response from its
+        ``Content-Length`` header.
+        """
+        shard.in_flight -= 1
+        if response is not None:
+            key = (request.endpoint, response.status_code)
+        else:
+            key = (request.endpoint, 500)
+        values = shard.series.get(key)
+        if values is None:
+            values = shard.series[key] = [0] * (len(self.buckets) + 4)
+        values[bisect_left(self.buckets, duration)] += 1
+        values[-3] += duration
+        request_bytes = request.environ.get('CONTENT_LENGTH')
+        if request_bytes:
+            values[-2] += _parse_length(request_bytes)
+        if response is not None:
+            body = response.response
+            if isinstance(body, list):
+                for chunk in body:
+                    values[-1] += len(chunk)
+            else:
+                response_bytes = response.headers.get('Content-Length')
+                if response_bytes:
+                    values[-1] += _parse_length(response_bytes)
+
+    def collect(self):
+        """Merges the shards of all threads and returns a tuple in the form
+        ``(series, in_flight)``.  `series` maps ``(endpoint, status)`` to a
+        dictionary with the cumulative ``buckets`` as list of
+        ``(upper_bound, count)`` tuples as well as ``count``, ``sum``,
+        ``request_bytes`` and ``response_bytes``.
+        """
+        merged = {}
+        with self._lock:
+            self._retire_dead_shards()
+            self._merge_into(merged, self._retired.series)
+            in_flight = self._retired.in_flight
+            for thread_ref, shard in self._shards:
+                self._merge_into(merged, shard.series)
+                in_flight += shard.in_flight
+
+        bounds = self.buckets + (float('inf'),)
+        rv = {}
+        for key, values in iteritems(merged):
+            cumulative = []
+            total = 0
+            for bound, count in zip(bounds, values):
+                total += count
+                cumulative.append((bound, total))
+            rv[key] = {
+                'buckets': cumulative,
+                'count': total,
+                'sum': values[-3],
+                'request_bytes': values[-2],
+                'response_bytes': values[-1],
+            }
+        return rv, in_flight
+
+    def render_prometheus(self):
+        """Returns the collected metrics in the Prometheus text format."""
+        series, in_flight = self.collect()
+        keys = sorted(series, key=lambda x: (x[0] or '', x[1]))
+        lines = [
+            '# HELP keyes_request_duration_seconds Request latency.',
+            '# TYPE keyes_request_duration_seconds histogram',
+        ]
+        for key in keys:
+            data = series[key]
+            labels = 'endpoint="%s",status="%d"' % (
+                _escape_label(key[0] or ''), key[1])
+            for bound, count in data['buckets']:
+                lines.append('keyes_request_duration_seconds_bucket'
+                             '{%s,le="%s"} %d' % (labels,
+                                                  _format_float(bound),
+                                                  count))
+            lines.append('keyes_request_duration_seconds_sum{%s} %s'
+                         % (labels, _format_float(data['sum'])))
+            lines.append('keyes_request_duration_seconds_count{%s} %d'
+                         % (labels, data['count']))
+        for name, field, help in (
+            ('keyes_request_size_bytes_total', 'request_bytes',
+             'Request body bytes received.'),
+            ('keyes_response_size_bytes_total', 'response_bytes',
+             'Response body bytes sent.'),
+        ):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s counter' % name)
+            for key in keys:
+                lines.append('%s{endpoint="%s",status="%d"} %d' % (
+                    name, _escape_label(key[0] or ''), key[1],
+                    series[key][field]))
+        lines.append('# HELP keyes_requests_in_flight Requests currently '
+                     'being handled.')
+        lines.append('# TYPE keyes_requests_in_flight gauge')
+        lines.append('keyes_requests_in_flight %d' % in_flight)
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        """A view function that returns the metrics in the Prometheus
+        text format.
+        """
+        from .globals import current_app
+        return current_app.response_class(self.render_prometheus(),
+                                          mimetype=PROMETHEUS_MIMETYPE)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.prefork
+    ~~~~~~~~~~~~~
+
+    Implements a preforking server that runs an application in several
+    worker processes sharing one listening socket.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import gc
+import sys
+import time
+import errno
+import random
+import signal
+import socket
+
+from werkzeug.serving import BaseWSGIServer, select_ip_version
+
+
+class WorkerServer(BaseWSGIServer):
+    """The WSGI server of a worker process.  It serves one request at a
+    time on the socket inherited from the master.
+
+    .. versionadded:: 1.0
+    """
+
+    multiprocess = True
+
+    #: the number of seconds a worker waits for a connection before it
+    #: checks whether it should stop.
+    timeout = 1
+
+    def __init__(self, *args, **kwargs):
+        BaseWSGIServer.__init__(self, *args, **kwargs)
+        #: the number of requests handled by this worker.
+        self.handled = 0
+
+    def finish_request(self, request, client_address):
+        try:
+            BaseWSGIServer.finish_request(self, request, client_address)
+        finally:
+            self.handled += 1
+
+
+class PreforkServer(object):
+    """Serves an application with `workers` processes that are forked from
+    the master process::
+
+        from keyes.prefork import PreforkServer
+
+        PreforkServer(app, port=8000, workers=4, max_requests=1000).serve()
+
+    The application is loaded and warmed up once in the master, see
+    :meth:`warmup`, and the objects created until then are moved out of
+    the reach of the garbage collector if the interpreter supports it, so
+    the workers share this memory with the master instead of copying it.
+    All workers accept connections from the same listening socket and
+    handle one request at a time.
+
+    A worker that handled `max_requests` requests (plus a random number of
+    up to `max_requests_jitter` so that the workers do not all restart at
+    once) exits after its current request and the master replaces it.
+    Workers that die for other reasons are replaced as well.
+
+    The master reacts to these signals:
+
+    ``SIGHUP``
+        replaces all workers gracefully: new workers are started right
+        away and the old ones exit after their current request.  As the
+        application is loaded in the master code changes require a
+        restart, but state that is set up per worker is recreated.
+    ``SIGTERM``, ``SIGINT``
+        stops gracefully.  Workers finish their current request and are
+        killed if they take longer than `graceful_timeout` seconds.
+
+    This server requires :func:`os.fork` and is therefore not available on
+    Windows.
+
+    .. versionadded:: 1.0
+    """
+
+    #: the class of the WSGI servers of the workers.
+    server_class = WorkerServer
+
+    def __init__(self, app, host='127.0.0.1', port=5000, workers=2,
+                 max_requests=0, max_requests_jitter=0, graceful_timeout=30,
+                 backlog=128, warmup=True, warmup_requests=None):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('The prefork server requires os.fork')
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.warmup_app = warmup
+        self.warmup_requests = warmup_requests
+        #: the listening socket, created by :meth:`bind`.
+        self.socket = None
+        self._pids = set()
+        self._retiring = set()
+        self._signals = []
+        self._running = False
+        self._alive = True
+
+    def log(self, message, *args):
+        """Writes a message of the master or of a worker to stderr."""
+        sys.stderr.write('[%d] %s\n' % (os.getpid(), message % args))
+
+    def bind(self):
+        """Creates the listening socket.  This happens automatically in
+        :meth:`serve` but can be done earlier, for instance to find out
+        the port that was picked if `port` is ``0``.
+        """
+        if self.socket is not None:
+            return self.socket
+        family = select_ip_version(self.host, self.port)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        # the workers race for new connections, those that lose it must
+        # not block in accept.
+        sock.setblocking(False)
+        self.socket = sock
+        self.port = sock.getsockname()[1]
+        return sock
+
+    def warmup(self):
+        """Warms the application up with :meth:`~keyes.Keyes.warmup`
+        before the workers are forked so that they do not repeat this work
+        on their first request.  The `warmup_requests` are passed on.
+        """
+        self.app.warmup(requests=self.warmup_requests)
+
+    def serve(self):
+        """Binds the socket, starts the workers and supervises them until
+        the server is stopped.
+        """
+        self.bind()
+        if self.warmup_app:
+            self.warmup()
+        if hasattr(gc, 'freeze'):
+            gc.collect()
+            gc.freeze()
+
+        self._running = True
+        for signum in signal.SIGHUP, signal.SIGTERM, signal.SIGINT:
+            signal.signal(signum, self._handle_signal)
+        self.log('Serving on http://%s:%d/ with %d workers', self.host,
+                 self.port, self.workers)
+        try:
+            while self._running:
+                self._reap_workers()
+                self._process_signals()
+                if self._running:
+                    while len(self._pids) < self.workers:
+                        self._spawn_worker()
+                    time.sleep(0.2)
+        finally:
+            self._stop_workers()
+            self.socket.close()
+            self.log('Stopped')
+
+    def _handle_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def _process_signals(self):
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum == signal.SIGHUP:
+                self.log('Replacing the workers')
+                self._retiring.update(self._pids)
+                self._kill_workers(self._pids, signal.SIGTERM)
+                self._pids = set()
+            else:
+                self._running = False
+
+    def _spawn_worker(self):
+        pid = os.fork()
+        if pid != 0:
+            self._pids.add(pid)
+            return pid
+        code = 0
+        try:
+            self._run_worker()
+        except SystemExit as e:
+            code = e.code or 0
+        except:
+            code = 1
+            self.log('Worker failed')
+            sys.excepthook(*sys.exc_info())
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _run_worker(self):
+        signal.signal(signal.SIGTERM, self._stop_worker)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        random.seed()
+        master = os.getppid()
+        server = self.server_class(self.host, self.port, self.app,
+                                   fd=self.socket.fileno())
+        limit = None
+        if self.max_requests:
+            limit = self.max_requests + \
+                random.randint(0, self.max_requests_jitter)
+        try:
+            while self._alive and os.getppid() == master and \
+                  (limit is None or server.handled < limit):
+                server.handle_request()
+        finally:
+            server.server_close()
+
+    def _stop_worker(self, signum, frame):
+        self._alive = False
+
+    def _reap_workers(self):
+        while 1:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    return
+                raise
+            if not pid:
+                return
+            self._pids.discard(pid)
+            self._retiring.discard(pid)
+
+    def _kill_workers(self, pids, signum):
+        for pid in list(pids):
+            try:
+                os.kill(pid, signum)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def _stop_workers(self):
+        self._kill_workers(self._pids | self._retiring, signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout
+        while (self._pids or self._retiring) and time.time() < deadline:
+            self._reap_workers()
+            time.sleep(0.05)
+        if self._pids or self._retiring:
+            self._kill_workers(self._pids | self._retiring, signal.SIGKILL)
+            for pid in self._pids | self._retiring:
+                try:
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
+            self._pids.clear()
+            self._retiring.clear()
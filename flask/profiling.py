@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.profiling
+    ~~~~~~~~~~~~~~~
+
+    Implements a sampling request profiler that is safe to keep enabled
+    in production.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import re
+import sys
+import random
+import errno
+from threading import Lock, Thread, current_thread
+
+from ._compat import iteritems
+
+
+_unsafe_chars_re = re.compile(r'[^A-Za-z0-9_.-]')
+
+#: the file extensions used for the two profile formats.
+PSTATS_EXTENSION = '.pstats'
+COLLAPSED_EXTENSION = '.collapsed'
+
+
+def _endpoint_filename(endpoint):
+    if endpoint is None:
+        return '__unmatched__'
+    return _unsafe_chars_re.sub('_', endpoint)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return '%s:%s' % (frame.f_globals.get('__name__', code.co_filename),
+                      code.co_name)
+
+
+class RequestSampler(object):
+    """Decides which requests are sampled.  A request is sampled if its
+    endpoint is in `endpoints`, if it carries the `header` or otherwise
+    with a probability of `sample_rate`.
+
+    :param sample_rate: the fraction of requests to sample, between ``0``
+                        and ``1``.
+    :param endpoints: an optional iterable of endpoints that are always
+                      sampled.
+    :param header: an optional request header.  Requests that send this
+                   header are always sampled.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, sample_rate=0.01, endpoints=None, header=None):
+        self.sample_rate = sample_rate
+        self.endpoints = frozenset(endpoints or ())
+        self.header = header
+        if header is not None:
+            self._environ_key = 'HTTP_' + header.upper().replace('-', '_')
+        else:
+            self._environ_key = None
+
+    def should_sample(self, request):
+        """Returns ``True`` if the given request should be sampled."""
+        if self.endpoints and request.endpoint in self.endpoints:
+            return True
+        if self._environ_key is not None and \
+           self._environ_key in request.environ:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+
+class _StackSampler(object):
+    """Samples the stacks of the threads that are currently handling a
+    profiled request from a background thread.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = Lock()
+        self._active = {}
+        self._thread = None
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = Thread(target=self._run, name='keyes-profiler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def start(self, thread_id, counts):
+        with self._lock:
+            self._active[thread_id] = counts
+            self._ensure_running()
+
+    def stop(self, thread_id):
+        with self._lock:
+            self._active.pop(thread_id, None)
+
+    def _run(self):
+        from time import sleep
+        while 1:
+            sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for thread_id, counts in active:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    key = ';'.join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+
+
+class RequestProfiler(object):
+    """Profiles a sample of the requests handled by an application and
+    aggregates the profiles per endpoint.  Once attached to an application
+    :meth:`~keyes.Keyes.wsgi_app` runs the sampled requests under the
+    profiler::
+
+        from keyes.profiling import RequestProfiler
+
+        RequestProfiler(app, sample_rate=0.001, header='X-Profile')
+
+    Two modes are available.  ``'cprofile'`` runs the request under
+    :mod:`cProfile` and writes :mod:`pstats` files.  ``'stack'`` samples
+    the stack of the request's thread every `interval` seconds from a
+    background thread which has a much lower overhead and writes files in
+    the collapsed stack format understood by flame graph tools.
+
+    The profiles are written into `output_dir` (which defaults to the
+    ``profiles`` folder in the :attr:`~keyes.Keyes.instance_path`) with one
+    file per endpoint and process after every `flush_every` profiled
+    requests and whenever :meth:`flush` is called.  The :command:`keyes
+    profile` command merges and reports them.
+
+    At most one request is profiled at any time per process.  Requests
+    that are picked while another one is profiled are not profiled.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param sample_rate: the fraction of requests to profile.
+    :param endpoints: endpoints that are always profiled.
+    :param header: a request header that forces profiling if sent.
+    :param mode: either ``'cprofile'`` or ``'stack'``.
+    :param output_dir: the folder the profiles are written to.
+    :param flush_every: after how many profiled requests the profiles are
+                        written.
+    :param interval: the sampling interval in seconds for the ``'stack'``
+                     mode.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, sample_rate=0.01, endpoints=None,
+                 header=None, mode='cprofile', output_dir=None,
+                 flush_every=100, interval=0.005):
+        if mode not in ('cprofile', 'stack'):
+            raise ValueError('Unknown profiler mode %r' % mode)
+        self.sampler = RequestSampler(sample_rate, endpoints, header)
+        self.mode = mode
+        self.output_dir = output_dir
+        self.flush_every = flush_every
+        self._busy = Lock()
+        self._data_lock = Lock()
+        self._profiles = {}
+        self._pending = 0
+        self._stack_sampler = None
+        if mode == 'stack':
+            self._stack_sampler = _StackSampler(interval)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the profiler to the given application."""
+        if self.output_dir is None:
+            self.output_dir = os.path.join(app.instance_path, 'profiles')
+        app.profiler = self
+
+    def should_profile(self, request):
+        """Returns ``True`` if the given request should be profiled."""
+        return self.sampler.should_sample(request)
+
+    def profile(self, request, func):
+        """Calls `func` under the profiler and adds the result to the
+        profile of the request's endpoint.
+        """
+        if not self._busy.acquire(False):
+            return func()
+        try:
+            if self.mode == 'cprofile':
+                rv = self._profile_cprofile(request.endpoint, func)
+            else:
+                rv = self._profile_stack(request.endpoint, func)
+        finally:
+            self._pending += 1
+            self._busy.release()
+        if self._pending >= self.flush_every:
+            self.flush()
+        return rv
+
+    def _profile_cprofile(self, endpoint, func):
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func()
+        finally:
+            profile.disable()
+            with self._data_lock:
+                stats = self._profiles.get(endpoint)
+                if stats is None:
+                    self._profiles[endpoint] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+
+    def _profile_stack(self, endpoint, func):
+        with self._data_lock:
+            counts = self._profiles.setdefault(endpoint, {})
+        thread_id = current_thread().ident
+        self._stack_sampler.start(thread_id, counts)
+        try:
+            return func()
+        finally:
+            self._stack_sampler.stop(thread_id)
+
+    def flush(self):
+        """Writes the aggregated profiles into the output folder."""
+        with self._data_lock:
+            profiles = list(self._profiles.items())
+            self._pending = 0
+        if not profiles:
+            return
+        try:
+            os.makedirs(self.output_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        for endpoint, data in profiles:
+            base = os.path.join(self.output_dir, '%s.%d' % (
+                _endpoint_filename(endpoint), os.getpid()))
+            if self.mode == 'cprofile':
+                with self._data_lock:
+                    data.dump_stats(base + PSTATS_EXTENSION)
+            else:
+                write_collapsed(base + COLLAPSED_EXTENSION, data)
+
+
+def write_collapsed(filename, counts):
+    """Writes a dictionary of collapsed stacks to their counts into a file.
+
+    .. versionadded:: 1.0
+    """
+    with open(filename, 'w') as f:
+        for stack, count in sorted(list(counts.items())):
+            f.write('%s %d\n' % (stack, count))
+
+
+def read_collapsed(filename, into=None):
+    """Reads a file with collapsed stacks and adds the counts to `into`.
+
+    .. versionadded:: 1.0
+    """
+    if into is None:
+        into = {}
+    with open(filename) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                into[stack] = into.get(stack, 0) + int(count)
+    return into
+
+
+def find_profiles(directory, endpoint=None):
+    """Finds the profile files in a folder and groups them.  Returns a
+    dictionary that maps ``(endpoint_filename, extension)`` to a list of
+    files.  If `endpoint` is given only the files of that endpoint are
+    returned.
+
+    .. versionadded:: 1.0
+    """
+    rv = {}
+    if not os.path.isdir(directory):
+        return rv
+    wanted = endpoint is not None and _endpoint_filename(endpoint) or None
+    for filename in sorted(os.listdir(directory)):
+        base, ext = os.path.splitext(filename)
+        if ext not in (PSTATS_EXTENSION, COLLAPSED_EXTENSION):
+            continue
+        name = base.rsplit('.', 1)[0]
+        if wanted is not None and name != wanted:
+            continue
+        rv.setdefault((name, ext), []).append(
+            os.path.join(directory, filename))
+    return rv
+
+
+def merge_profiles(directory, endpoint=None):
+    """Merges the profiles written by all processes.  Returns a dictionary
+    that maps ``(endpoint_filename, extension)`` to either a
+    :class:`pstats.Stats` object or a dictionary of collapsed stacks to
+    their counts.
+
+    .. versionadded:: 1.0
+    """
+    import pstats
+    rv = {}
+    for key, files in iteritems(find_profiles(directory, endpoint)):
+        if key[1] == PSTATS_EXTENSION:
+            rv[key] = pstats.Stats(*files)
+        else:
+            counts = rv[key] = {}
+            for filename in files:
+                read_collapsed(filename, counts)
+    return rv
+
+
+def report_profiles(directory, stream, endpoint=None, sort='cumulative',
+                    limit=20):
+    """Writes a report of the merged profiles into `stream` and returns
+    the merged profiles.
+
+    .. versionadded:: 1.0
+    """
+    merged = merge_profiles(directory, endpoint)
+    for key in sorted(merged):
+        data = merged[key]
+        stream.write('=== %s (%s) ===\n' % (key[0], key[1][1:]))
+        if isinstance(data, dict):
+            total = sum(data.values()) or 1
+            top = sorted(data.items(), key=lambda x: -x[1])[:limit]
+            for stack, count in top:
+                leaf = stack.rsplit(';', 1)[-1]
+                stream.write('%6d %5.1f%%  %s\n' % (
+                    count, count * 100.0 / total, leaf))
+        else:
+            data.stream = stream
+            data.sort_stats(sort).print_stats(limit)
+    return merged
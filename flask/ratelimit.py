@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.ratelimit
+    ~~~~~~~~~~~~~~~
+
+    Implements token bucket rate limiting for applications, blueprints
+    and views.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import math
+import time
+from threading import Lock, local
+
+from werkzeug.exceptions import TooManyRequests
+
+from .globals import request, current_app
+from ._compat import iteritems
+
+
+def remote_addr_key(request):
+    """Rate limits by the address of the client.
+
+    .. versionadded:: 1.0
+    """
+    return request.remote_addr
+
+
+def session_key(request):
+    """Rate limits by the session cookie of the client.  Clients without
+    a session cookie are limited by their address.
+
+    .. versionadded:: 1.0
+    """
+    return request.cookies.get(current_app.session_cookie_name) or \
+        request.remote_addr
+
+
+def header_key(name):
+    """Returns a key function that rate limits by the value of a request
+    header, for instance an API key.  Clients that do not send the header
+    are limited by their address.
+
+    .. versionadded:: 1.0
+    """
+    def key_func(request):
+        return request.headers.get(name) or request.remote_addr
+    return key_func
+
+
+class RateLimitExceeded(TooManyRequests):
+    """Raised if a client exceeded a rate limit.  This is a ``429 Too Many
+    Requests`` error with a ``Retry-After`` header.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, retry_after, description=None, response=None):
+        TooManyRequests.__init__(self, description, response)
+        #: the number of seconds until the request would be allowed.
+        self.retry_after = retry_after
+
+    def get_headers(self, environ=None):
+        headers = TooManyRequests.get_headers(self, environ)
+        retry_after = int(math.ceil(self.retry_after))
+        headers.append(('Retry-After', str(retry_after)))
+        return headers
+
+
+# the refill intervals of limits such as 10 per second cannot be stored
+# exactly, so a few accumulated intervals can exceed the burst by a
+# rounding error.  Timestamps around now are only precise to about a
+# tenth of a microsecond anyway.
+_epsilon = 1e-6
+
+
+class Limit(object):
+    """A limit of `count` requests per `period` seconds for every key
+    returned by `key_func`.  Up to `burst` requests (defaults to `count`)
+    can be made at once after a client was idle.
+
+    .. versionadded:: 1.0
+    """
+
+    __slots__ = ('count', 'period', 'burst', 'key_func', 'interval',
+                 'tolerance')
+
+    def __init__(self, count, period, key_func=None, burst=None):
+        if count <= 0 or period <= 0:
+            raise ValueError('count and period have to be positive')
+        self.count = count
+        self.period = period
+        self.burst = burst or count
+        self.key_func = key_func
+        #: the time it takes to refill one token.
+        self.interval = float(period) / count
+        #: how far the bucket may be in debt, this is the burst in seconds.
+        self.tolerance = self.interval * self.burst
+
+    def __repr__(self):
+        return '<%s %d/%ss burst=%d>' % (self.__class__.__name__,
+                                          self.count, self.period,
+                                          self.burst)
+
+
+class MemoryStorage(object):
+    """Stores the buckets in a dictionary of the current process.
+
+    A bucket is stored as a single number: the time at which it is full
+    again.  Taking a token moves that time forward by the refill interval
+    of one token and the request is rejected if it moves further than the
+    burst into the future.  Buckets that are full again carry no state and
+    are evicted every `eviction_interval` seconds.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, eviction_interval=60):
+        self.eviction_interval = eviction_interval
+        self._lock = Lock()
+        self._buckets = {}
+        self._next_eviction = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def consume(self, key, interval, tolerance, now):
+        """Takes a token from the bucket stored under `key`.  Returns ``0``
+        if the token was taken or the number of seconds until it can be.
+        """
+        with self._lock:
+            if now >= self._next_eviction:
+                self.evict(now)
+            full_at = max(self._buckets.get(key, now), now) + interval
+            wait = full_at - now - tolerance
+            if wait > _epsilon:
+                return wait
+            self._buckets[key] = full_at
+            return 0
+
+    def evict(self, now):
+        """Removes the buckets that are full again."""
+        self._buckets = dict((key, full_at) for key, full_at
+                             in iteritems(self._buckets) if full_at > now)
+        self._next_eviction = now + self.eviction_interval
+
+
+class SQLiteStorage(object):
+    """Stores the buckets in an SQLite database so that the limits hold
+    across all worker processes on one host.  The database is best placed
+    on a memory backed file system such as ``/dev/shm``.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, filename, eviction_interval=60, timeout=5):
+        self.filename = filename
+        self.eviction_interval = eviction_interval
+        self.timeout = timeout
+        self._local = local()
+        self._next_eviction = 0
+
+    def _get_connection(self):
+        con = getattr(self._local, 'con', None)
+        if con is None or self._local.pid != os.getpid():
+            import sqlite3
+            con = sqlite3.connect(self.filename, timeout=self.timeout,
+                                  isolation_level=None)
+            con.execute('pragma journal_mode = wal')
+            con.execute('create table if not exists keyes_rate_limits '
+                        '(key text primary key, full_at real not null)')
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def consume(self, key, interval, tolerance, now):
+        """Takes a token from the bucket stored under `key`, see
+        :meth:`MemoryStorage.consume`.
+        """
+        con = self._get_connection()
+        con.execute('begin immediate')
+        try:
+            if now >= self._next_eviction:
+                self.evict(now, con)
+            row = con.execute('select full_at from keyes_rate_limits '
+                              'where key = ?', (key,)).fetchone()
+            full_at = max(row and row[0] or now, now) + interval
+            wait = full_at - now - tolerance
+            if wait <= _epsilon:
+                con.execute('insert or replace into keyes_rate_limits '
+                            'values (?, ?)', (key, full_at))
+                wait = 0
+        except:
+            con.execute('rollback')
+            raise
+        con.execute('commit')
+        return wait
+
+    def evict(self, now, con=None):
+        """Removes the buckets that are full again."""
+        if con is None:
+            con = self._get_connection()
+        con.execute('delete from keyes_rate_limits where full_at <= ?',
+                    (now,))
+        self._next_eviction = now + self.eviction_interval
+
+
+class RateLimiter(object):
+    """Rate limits the requests to an application with token buckets::
+
+        from keyes.ratelimit import RateLimiter, header_key
+
+        limiter = RateLimiter(app, default=(100, 60))
+        limiter.limit_blueprint(api, 1000, 3600,
+                                key_func=header_key('X-Api-Key'))
+
+        @app.route('/login', methods=['POST'])
+        @limiter.limit(5, 60)
+        def login():
+            ...
+
+    The application wide limit and the limits of views are checked in a
+    :meth:`~keyes.Keyes.before_request` function, the limits of blueprints
+    in a :meth:`~keyes.Blueprint.before_request` function of the
+    blueprint, so :meth:`limit_blueprint` has to be called before the
+    blueprint is registered.  Limits add up: a request has to pass the
+    application, the blueprint and the view limit.  Each limit counts
+    separately per key, which is computed by the limit's key function or
+    `key_func`.  Requests that exceed a limit fail with
+    :exc:`RateLimitExceeded`.
+
+    By default the buckets are kept in memory by a :class:`MemoryStorage`
+    which limits each process on its own.  Pass a :class:`SQLiteStorage`
+    to share the limits between the processes of a prefork server.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param default: an optional ``(count, period)`` tuple or :class:`Limit`
+                    applied to all requests.
+    :param key_func: the default key function, :func:`remote_addr_key`
+                     unless given.
+    :param storage: the storage of the buckets.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, default=None, key_func=remote_addr_key,
+                 storage=None):
+        if default is not None and not isinstance(default, Limit):
+            default = Limit(*default)
+        self.default = default
+        self.key_func = key_func
+        if storage is None:
+            storage = MemoryStorage()
+        self.storage = storage
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the rate limiter to the given application."""
+        app.before_request(self._check_request)
+
+    def limit(self, count, period, key_func=None, burst=None):
+        """A decorator that limits the requests to a view function."""
+        def decorator(f):
+            f.rate_limit = Limit(count, period, key_func, burst)
+            return f
+        return decorator
+
+    def limit_blueprint(self, blueprint, count, period, key_func=None,
+                        burst=None):
+        """Limits all requests to the views of a blueprint."""
+        limit = Limit(count, period, key_func, burst)
+        blueprint.before_request(
+            lambda: self.check(limit, 'blueprint:' + request.blueprint))
+
+    def check(self, limit, scope):
+        """Takes a token from the bucket of the current client for `limit`
+        and raises :exc:`RateLimitExceeded` if the bucket is empty.  The
+        `scope` separates the buckets of different limits.
+        """
+        key = (limit.key_func or self.key_func)(request)
+        wait = self.storage.consume('%s|%s' % (scope, key), limit.interval,
+                                    limit.tolerance, time.time())
+        if wait:
+            raise RateLimitExceeded(wait)
+
+    def _check_request(self):
+        if self.default is not None:
+            self.check(self.default, 'app')
+        view = current_app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'rate_limit', None)
+        if limit is not None:
+            self.check(limit, 'endpoint:' + request.endpoint)
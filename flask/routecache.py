@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.routecache
+    ~~~~~~~~~~~~~~~~
+
+    Stores the compiled URL rules of an application in a file so that
+    processes starting the same application do not have to compile them
+    again.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import re
+import sys
+import copy
+import pickle
+
+from werkzeug.routing import Rule
+
+
+class LazyPattern(object):
+    """A regular expression that is only compiled when it is used for the
+    first time.  Attribute access is forwarded to the compiled pattern.
+    """
+    __slots__ = ('pattern', 'flags', '_compiled')
+
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled = None
+
+    @property
+    def compiled(self):
+        rv = self._compiled
+        if rv is None:
+            rv = self._compiled = re.compile(self.pattern, self.flags)
+        return rv
+
+    def __getattr__(self, name):
+        return getattr(self.compiled, name)
+
+    def __reduce__(self):
+        return LazyPattern, (self.pattern, self.flags)
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.pattern)
+
+
+class CachedRule(Rule):
+    """A :class:`~werkzeug.routing.Rule` that can be stored in a
+    :class:`RouteCache`.  The map is not stored with the rule and the
+    regular expression is stored as its source only, which is compiled
+    when the rule is matched for the first time.  A rule loaded from the
+    cache is bound to a map without being compiled again.
+    """
+
+    _restored = False
+
+    def bind(self, map, rebind=False):
+        if not self._restored:
+            return Rule.bind(self, map, rebind)
+        self._restored = False
+        self.map = map
+        for converter in self._converters.values():
+            converter.map = map
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['map'] = None
+        converters = {}
+        for name, converter in (state.get('_converters') or {}).items():
+            converter = copy.copy(converter)
+            converter.map = None
+            converters[name] = converter
+        state['_converters'] = converters
+        regex = state.get('_regex')
+        if regex is not None:
+            state['_regex'] = LazyPattern(regex.pattern, regex.flags)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._restored = True
+
+
+def _get_rule_key(rule, map):
+    """Returns a string that identifies the definition of `rule`, with the
+    defaults of `map` applied like :meth:`~werkzeug.routing.Rule.bind`
+    does.
+    """
+    strict_slashes = rule.strict_slashes
+    if strict_slashes is None:
+        strict_slashes = map.strict_slashes
+    subdomain = rule.subdomain
+    if subdomain is None:
+        subdomain = map.default_subdomain
+    return repr((rule.rule, rule.endpoint, sorted(rule.methods or ()),
+                 sorted((rule.defaults or {}).items()), subdomain,
+                 getattr(rule, 'host', None), rule.build_only,
+                 rule.redirect_to, rule.alias, strict_slashes))
+
+
+class RouteCache(object):
+    """Stores the compiled URL rules of an application in a file and
+    reuses them the next time the application is set up::
+
+        from keyes.routecache import RouteCache
+
+        app = Keyes(__name__)
+        RouteCache(app)
+        app.register_blueprint(api)
+
+    Most of the time spent setting up an application with thousands of
+    URL rules goes into compiling their regular expressions.  When the
+    cache is attached :meth:`~keyes.Keyes.add_url_rule` looks up every new
+    rule in the file and uses the stored rule instead, which is added to
+    the URL map without being compiled.  Its regular expression is only
+    compiled when a request is matched against it.  Rules that are not
+    found are compiled as usual.  Before the first request is handled the
+    file is written again if a rule was missing, so the next process that
+    starts the application finds all of them.
+
+    The cache has to be attached before the URL rules are registered.  It
+    changes :attr:`~keyes.Keyes.url_rule_class` from the default
+    :class:`~werkzeug.routing.Rule` to :class:`CachedRule`.  Custom rule
+    classes have to subclass :class:`CachedRule` to be cached.  The file
+    is ignored if it was written by a different version of Python,
+    Werkzeug or Keyes, but not if the regular expression of a custom
+    converter changed, so remove the file when deploying a new version of
+    the application.
+
+    The file is loaded with :mod:`pickle`, so it must only be writable by
+    the user running the application.
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param filename: the file of the cache.  Defaults to
+                     ``url_map.cache`` in the instance folder.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, app=None, filename=None):
+        self.filename = filename
+        self.app = None
+        #: the number of rules that were found in the cache.
+        self.hits = 0
+        #: the number of rules that had to be compiled.
+        self.misses = 0
+        self._rules = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the cache to the given application and loads the
+        file.
+        """
+        self.app = app
+        if self.filename is None:
+            self.filename = os.path.join(app.instance_path, 'url_map.cache')
+        if app.url_rule_class is Rule:
+            app.url_rule_class = CachedRule
+        self.load()
+        app.route_cache = self
+        app.before_first_request(self._save_if_changed)
+
+    def _get_header(self):
+        import werkzeug
+        from . import __version__
+        return {
+            'python': sys.version,
+            'werkzeug': werkzeug.__version__,
+            'keyes': __version__,
+            'converters': sorted('%s=%s.%s' % (name, cls.__module__,
+                                               cls.__name__)
+                                 for name, cls in
+                                 self.app.url_map.converters.items()),
+        }
+
+    def load(self):
+        """Loads the rules from the file.  Returns ``True`` if the file
+        could be used.
+        """
+        self._rules = {}
+        try:
+            with open(self.filename, 'rb') as f:
+                header, rules = pickle.load(f)
+        except Exception:
+            return False
+        if header != self._get_header():
+            return False
+        for key, rule in rules:
+            self._rules.setdefault(key, []).append(rule)
+        return True
+
+    def get_rule(self, rule):
+        """Returns the stored rule with the same definition as `rule` or
+        `rule` itself if there is none.  Every stored rule is only
+        returned once.  This is called by :meth:`~keyes.Keyes.add_url_rule`.
+        """
+        if isinstance(rule, CachedRule):
+            rules = self._rules.get(_get_rule_key(rule, self.app.url_map))
+            while rules:
+                cached = rules.pop(0)
+                if type(cached) is type(rule):
+                    self.hits += 1
+                    return cached
+        self.misses += 1
+        return rule
+
+    def _save_if_changed(self):
+        if self.misses:
+            self.save()
+
+    def save(self):
+        """Writes the rules of the application into the file.  Errors are
+        logged but not raised, for instance if the folder is not writable.
+        """
+        url_map = self.app.url_map
+        rules = [(_get_rule_key(rule, url_map), rule)
+                 for rule in url_map.iter_rules()
+                 if isinstance(rule, CachedRule)]
+        tmp = '%s.%d' % (self.filename, os.getpid())
+        try:
+            folder = os.path.dirname(self.filename)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(tmp, 'wb') as f:
+                pickle.dump((self._get_header(), rules), f,
+                            pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, self.filename)
+        except Exception:
+            self.app.logger.exception('Could not write the route cache')
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        self.misses = 0
+        return True
@@ -48,6 +48,12 @@ class SessionMixin(object):
     #: The default mixin implementation just hardcodes ``True`` in.
     modified = True
 
+    #: some backends track if the session was read during the request.
+    #: The default mixin implementation just hardcodes ``True`` in.
+    #:
+    #: .. versionadded:: 1.0
+    accessed = True
+
 
 def _tag(value):
     if isinstance(value, tuple):
@@ -107,13 +113,36 @@ session_json_serializer = TaggedJSONSerializer()
 
 
 class SecureCookieSession(CallbackDict, SessionMixin):
-    """Base class for sessions based on signed cookies."""
+    """Base class for sessions based on signed cookies.
+
+    .. versionchanged:: 1.0
+       Reading keys sets :attr:`accessed`.
+    """
 
     def __init__(self, initial=None):
         def on_update(self):
             self.modified = True
+            self.accessed = True
         CallbackDict.__init__(self, initial, on_update)
         self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super(SecureCookieSession, self).__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super(SecureCookieSession, self).get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super(SecureCookieSession, self).setdefault(key, default)
+
+    # the session interface checks the permanent flag when saving which
+    # should not count as an access.
+    permanent = property(lambda self: dict.get(self, '_permanent', False),
+                         SessionMixin.permanent.fset)
 
 
 class NullSession(SecureCookieSession):
@@ -199,11 +228,12 @@ class SessionInterface(object):
         """Helpful helper method that returns the cookie domain that should
         be used for the session cookie if session cookies are used.
         """
-        if app.config['SESSION_COOKIE_DOMAIN'] is not None:
-            return app.config['SESSION_COOKIE_DOMAIN']
-        if app.config['SERVER_NAME'] is not None:
+        config = app._config_view
+        if config['SESSION_COOKIE_DOMAIN'] is not None:
+            return config['SESSION_COOKIE_DOMAIN']
+        if config['SERVER_NAME'] is not None:
             # chop off the port which is usually not supported by browsers
-            rv = '.' + app.config['SERVER_NAME'].rsplit(':', 1)[0]
+            rv = '.' + config['SERVER_NAME'].rsplit(':', 1)[0]
 
             # Google chrome does not like cookies set to .localhost, so
             # we just go with no domain then.  Keyes documents anyways that
@@ -227,21 +257,22 @@ class SessionInterface(object):
         config var if it's set, and falls back to ``APPLICATION_ROOT`` or
         uses ``/`` if it's ``None``.
         """
-        return app.config['SESSION_COOKIE_PATH'] or \
-               app.config['APPLICATION_ROOT'] or '/'
+        config = app._config_view
+        return config['SESSION_COOKIE_PATH'] or \
+               config['APPLICATION_ROOT'] or '/'
 
     def get_cookie_httponly(self, app):
         """Returns True if the session cookie should be httponly.  This
         currently just returns the value of the ``SESSION_COOKIE_HTTPONLY``
         config var.
         """
-        return app.config['SESSION_COOKIE_HTTPONLY']
+        return app._config_view['SESSION_COOKIE_HTTPONLY']
 
     def get_cookie_secure(self, app):
         """Returns True if the cookie should be secure.  This currently
         just returns the value of the ``SESSION_COOKIE_SECURE`` setting.
         """
-        return app.config['SESSION_COOKIE_SECURE']
+        return app._config_view['SESSION_COOKIE_SECURE']
 
     def get_expiration_time(self, app, session):
         """A helper method that returns an expiration date for the session
@@ -267,7 +298,7 @@ class SessionInterface(object):
         """
         if session.modified:
             return True
-        save_each = app.config['SESSION_REFRESH_EACH_REQUEST']
+        save_each = app._config_view['SESSION_REFRESH_EACH_REQUEST']
         return save_each and session.permanent
 
     def open_session(self, app, request):
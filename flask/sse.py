@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.sse
+    ~~~~~~~~~
+
+    Implements server-sent event streams with a publisher that feeds
+    bounded per client queues.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+from collections import deque
+from threading import Lock
+
+try:
+    from queue import Queue, Full, Empty
+except ImportError:
+    from Queue import Queue, Full, Empty
+
+from . import json
+from .globals import _request_ctx_stack
+from .helpers import stream_with_context
+from .wrappers import Response
+from ._compat import text_type, string_types
+
+
+_closed = object()
+
+
+def _check_field(name, value):
+    if value is not None:
+        value = text_type(value)
+        if u'\n' in value or u'\r' in value:
+            raise ValueError('The %s of an event must not contain line '
+                             'breaks' % name)
+
+
+class Event(object):
+    """A server-sent event.  `data` is sent as is if it is a string and as
+    JSON otherwise.  The encoded form is computed once and shared by all
+    clients the event is sent to.  A :exc:`ValueError` is raised if `event`
+    or `id` contain a line break, which would start a new field.
+
+    .. versionadded:: 1.0
+    """
+
+    __slots__ = ('data', 'event', 'id', 'retry', '_encoded')
+
+    def __init__(self, data, event=None, id=None, retry=None):
+        _check_field('event', event)
+        _check_field('id', id)
+        self.data = data
+        self.event = event
+        self.id = id
+        self.retry = retry
+        self._encoded = None
+
+    def encode(self):
+        """Returns the event in the ``text/event-stream`` format."""
+        if self._encoded is not None:
+            return self._encoded
+        data = self.data
+        if not isinstance(data, string_types):
+            data = json.dumps(data)
+        lines = []
+        if self.id is not None:
+            lines.append(u'id: %s' % self.id)
+        if self.event is not None:
+            lines.append(u'event: %s' % self.event)
+        if self.retry is not None:
+            lines.append(u'retry: %d' % self.retry)
+        for line in text_type(data).splitlines() or [u'']:
+            lines.append(u'data: %s' % line)
+        self._encoded = (u'\n'.join(lines) + u'\n\n').encode('utf-8')
+        return self._encoded
+
+    def __repr__(self):
+        return '<%s id=%r event=%r>' % (self.__class__.__name__, self.id,
+                                        self.event)
+
+
+class Subscription(object):
+    """The queue of events of one client of an :class:`EventPublisher`.
+
+    .. versionadded:: 1.0
+    """
+
+    def __init__(self, publisher, maxsize):
+        self.publisher = publisher
+        self.queue = Queue(maxsize)
+        #: ``True`` once the publisher stopped sending events to this
+        #: subscription, either because it was closed or because the
+        #: client did not keep up.
+        self.closed = False
+
+    def put(self, event):
+        """Queues an event.  Returns ``False`` if the queue was full."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except Full:
+            return False
+
+    def get(self, timeout=None):
+        """Returns the next event or ``None`` if no event arrived within
+        `timeout` seconds.  Returns :data:`_closed` once the subscription
+        is closed and all its events were consumed.
+        """
+        if self.closed and self.queue.empty():
+            return _closed
+        try:
+            return self.queue.get(True, timeout)
+        except Empty:
+            if self.closed:
+                return _closed
+
+    def close(self):
+        """Ends the stream once the queued events were consumed."""
+        self.closed = True
+        self.put(_closed)
+
+
+class EventPublisher(object):
+    """Publishes events to all clients of the :class:`EventStream`
+    responses created for it.
+
+    Every client has its own queue of up to `queue_size` events.  A client
+    that falls this far behind is disconnected instead of buffering
+    without bounds or slowing down the publisher.  Browsers reconnect
+    automatically and send the ``Last-Event-ID`` header.  The last
+    `history` events are kept so that such a client (or one that lost its
+    connection) resumes where it stopped.
+
+    .. versionadded:: 1.0
+    """
+
+    subscription_class = Subscription
+
+    def __init__(self, history=100, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = Lock()
+        self._history = deque(maxlen=history or None)
+        self._subscriptions = set()
+        self._last_id = 0
+
+    def __len__(self):
+        """The number of subscribed clients."""
+        return len(self._subscriptions)
+
+    def publish(self, data, event=None, id=None, retry=None):
+        """Sends an event to all clients.  If no `id` is given the events
+        are numbered.  Returns the :class:`Event`.
+        """
+        with self._lock:
+            if id is None:
+                self._last_id += 1
+                id = self._last_id
+            ev = Event(data, event, id, retry)
+            ev.encode()
+            self._history.append(ev)
+            for subscription in list(self._subscriptions):
+                if not subscription.put(ev):
+                    self._subscriptions.discard(subscription)
+                    subscription.closed = True
+        return ev
+
+    def subscribe(self, last_event_id=None):
+        """Returns a new :class:`Subscription`.  If `last_event_id` is
+        given the events published after it are queued first.  If the
+        event is no longer in the history all kept events are queued.
+        """
+        subscription = self.subscription_class(self, self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                missed = list(self._history)
+                for idx, ev in enumerate(missed):
+                    if text_type(ev.id) == last_event_id:
+                        missed = missed[idx + 1:]
+                        break
+                for ev in missed[-self.queue_size:]:
+                    subscription.put(ev)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stops sending events to a subscription."""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+        subscription.closed = True
+
+    def close(self):
+        """Disconnects all clients."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            self._subscriptions.clear()
+        for subscription in subscriptions:
+            subscription.close()
+
+
+class EventStream(Response):
+    """A ``text/event-stream`` response that sends the events of an
+    :class:`EventPublisher` to one client::
+
+        from keyes.sse import EventPublisher, EventStream
+
+        notifications = EventPublisher()
+
+        @app.route('/notifications')
+        def stream_notifications():
+            return EventStream(notifications)
+
+        # anywhere else
+        notifications.publish({'text': 'Hello'}, event='message')
+
+    The stream resumes after the ``Last-Event-ID`` sent by the client.  If
+    no event is sent for `heartbeat` seconds a comment line is sent which
+    keeps proxies from closing the connection and lets the server notice
+    disconnected clients.  Once the server closes the response, for
+    instance because the client disconnected, the subscription is removed
+    and the request context, which is kept around while streaming, is
+    torn down.
+
+    Instead of a publisher any iterable of :class:`Event` objects or data
+    can be given.  Heartbeats are not sent in that case.
+
+    :param source: an :class:`EventPublisher` or an iterable of events.
+    :param heartbeat: the number of idle seconds after which a heartbeat
+                      is sent.
+    :param retry: if given, the reconnection delay in milliseconds the
+                  client is told to use.
+
+    .. versionadded:: 1.0
+    """
+
+    default_mimetype = 'text/event-stream'
+
+    def __init__(self, source, heartbeat=15, retry=None, **kwargs):
+        if isinstance(source, EventPublisher):
+            last_event_id = None
+            ctx = _request_ctx_stack.top
+            if ctx is not None:
+                last_event_id = ctx.request.headers.get('Last-Event-ID')
+            subscription = source.subscribe(last_event_id)
+            events = self._iter_subscription(subscription, heartbeat)
+        else:
+            events = self._iter_events(source)
+        body = self._generate(events, retry)
+        if _request_ctx_stack.top is not None:
+            body = stream_with_context(body)
+        Response.__init__(self, body, **kwargs)
+        self.headers['Cache-Control'] = 'no-cache'
+        self.headers['X-Accel-Buffering'] = 'no'
+
+    @staticmethod
+    def _generate(events, retry):
+        try:
+            if retry is not None:
+                yield ('retry: %d\n\n' % retry).encode('ascii')
+            for chunk in events:
+                yield chunk
+        finally:
+            # closing the response closes the subscription right away.
+            if hasattr(events, 'close'):
+                events.close()
+
+    @staticmethod
+    def _iter_events(source):
+        for ev in source:
+            if not isinstance(ev, Event):
+                ev = Event(ev)
+            yield ev.encode()
+
+    @staticmethod
+    def _iter_subscription(subscription, heartbeat):
+        try:
+            while 1:
+                ev = subscription.get(heartbeat)
+                if ev is None:
+                    yield b': heartbeat\n\n'
+                elif ev is _closed:
+                    return
+                else:
+                    yield ev.encode()
+        finally:
+            subscription.publisher.unsubscribe(subscription)
@@ -13,6 +13,7 @@ from jinja2 import BaseLoader, Environment as BaseEnvironment, \
 
 from .globals import _request_ctx_stack, _app_ctx_stack
 from .signals import template_rendered, before_render_template
+from .tracing import PhaseTimer
 
 
 def _default_template_ctx_processor():
@@ -52,7 +53,7 @@ class DispatchingJinjaLoader(BaseLoader):
         self.app = app
 
     def get_source(self, environment, template):
-        explain = self.app.config['EXPLAIN_TEMPLATE_LOADING']
+        explain = self.app._config_view['EXPLAIN_TEMPLATE_LOADING']
         attempts = []
         tmplrv = None
 
@@ -104,7 +105,8 @@ def _render(template, context, app):
     """Renders the template and fires the signal"""
 
     before_render_template.send(app, template=template, context=context)
-    rv = template.render(context)
+    with PhaseTimer('render'):
+        rv = template.render(context)
     template_rendered.send(app, template=template, context=context)
     return rv
 
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+    keyes.tracing
+    ~~~~~~~~~~~~~
+
+    Implements an opt-in tracer that breaks the time spent on a request
+    down into the phases of the request lifecycle.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+from ._compat import timer
+
+
+def _qualname(func):
+    """Returns the qualified name of a hook function for reporting."""
+    name = getattr(func, '__qualname__', None) or \
+        getattr(func, '__name__', None) or repr(func)
+    module = getattr(func, '__module__', None)
+    if module:
+        return '%s.%s' % (module, name)
+    return name
+
+
+class PhaseTimings(object):
+    """Holds the durations of the phases of a single request.  An instance
+    of this class is available as :attr:`~keyes.Request.phase_timings` if
+    a :class:`RequestTracer` is attached to the application.
+
+    The phases are recorded in the order they happen.  A phase that
+    happens multiple times (for instance ``render`` if more than one
+    template is rendered) accumulates its durations.  The known phases
+    are ``routing``, ``session_open``, ``before_request``, ``view``,
+    ``render``, ``serialize``, ``after_request``, ``session_save`` and
+    ``teardown``.  Note that ``render`` and ``serialize`` usually happen
+    while the view is running and are also included in ``view``.
+
+    .. versionadded:: 1.0
+    """
+
+    __slots__ = ('tracer', 'started', 'total', 'slow_hooks', '_order',
+                 '_durations')
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        #: the clock value when the request context was created.
+        self.started = timer()
+        #: the total duration of the request up to the point the response
+        #: was produced.  ``None`` until then.
+        self.total = None
+        #: a list of ``(kind, name, duration)`` tuples for all hooks
+        #: that were slower than the threshold of the tracer.
+        self.slow_hooks = []
+        self._order = []
+        self._durations = {}
+
+    def add(self, phase, duration):
+        """Adds `duration` seconds to the given phase."""
+        if phase in self._durations:
+            self._durations[phase] += duration
+        else:
+            self._order.append(phase)
+            self._durations[phase] = duration
+
+    def get(self, phase, default=None):
+        """Returns the duration of a phase in seconds."""
+        return self._durations.get(phase, default)
+
+    def items(self):
+        """Returns a list of ``(phase, duration)`` tuples in the order the
+        phases happened.
+        """
+        return [(phase, self._durations[phase]) for phase in self._order]
+
+    def call_hook(self, kind, func, *args):
+        """Calls a hook function, adds its duration to the phase named
+        `kind` and reports it to the tracer if it was slow.
+        """
+        started = timer()
+        try:
+            return func(*args)
+        finally:
+            duration = timer() - started
+            self.add(kind, duration)
+            if duration >= self.tracer.slow_hook_threshold:
+                self.slow_hooks.append((kind, _qualname(func), duration))
+                self.tracer.report_slow_hook(kind, func, duration)
+
+    def finish(self):
+        """Marks the point the response is complete and sets :attr:`total`."""
+        self.total = timer() - self.started
+
+    def to_server_timing(self):
+        """Formats the phases as value for the ``Server-Timing`` header."""
+        rv = ['%s;dur=%.3f' % (phase, duration * 1000)
+              for phase, duration in self.items()]
+        if self.total is not None:
+            rv.append('total;dur=%.3f' % (self.total * 1000))
+        return ', '.join(rv)
+
+    def __repr__(self):
+        return '<%s %s>' % (
+            self.__class__.__name__,
+            ' '.join('%s=%.6f' % item for item in self.items())
+        )
+
+
+class PhaseTimer(object):
+    """Context manager that adds the time spent inside the block to a
+    phase of the current request if it is being traced.  Extensions can
+    use this to report their own phases::
+
+        with PhaseTimer('database'):
+            rv = run_query()
+
+    .. versionadded:: 1.0
+    """
+
+    __slots__ = ('phase', 'timings', 'started')
+
+    def __init__(self, phase, timings=None):
+        self.phase = phase
+        if timings is None:
+            from .globals import _request_ctx_stack
+            ctx = _request_ctx_stack.top
+            if ctx is not None:
+                timings = ctx.request.phase_timings
+        self.timings = timings
+
+    def __enter__(self):
+        if self.timings is not None:
+            self.started = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.timings is not None:
+            self.timings.add(self.phase, timer() - self.started)
+
+
+class RequestTracer(object):
+    """Records how long each phase of a request took.  Once attached to an
+    application every request gets a :class:`PhaseTimings` object as
+    :attr:`~keyes.Request.phase_timings` and the breakdown is sent to the
+    client in the ``Server-Timing`` header::
+
+        from keyes.tracing import RequestTracer
+
+        RequestTracer(app, slow_hook_threshold=0.05)
+
+    :param app: the application to attach to.  If not given,
+                :meth:`init_app` has to be called later.
+    :param slow_hook_threshold: hooks taking at least this many seconds are
+                                reported through :meth:`report_slow_hook`.
+    :param server_timing: if set to ``False`` no ``Server-Timing`` header
+                          is added to responses.
+
+    .. versionadded:: 1.0
+    """
+
+    #: the class used for the per request timings.
+    timings_class = PhaseTimings
+
+    def __init__(self, app=None, slow_hook_threshold=0.1,
+                 server_timing=True):
+        self.app = app
+        self.slow_hook_threshold = slow_hook_threshold
+        self.server_timing = server_timing
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the tracer to the given application."""
+        self.app = app
+        app.request_tracer = self
+
+    def start_request(self):
+        """Creates the timings for a new request."""
+        return self.timings_class(self)
+
+    def finish_response(self, timings, response):
+        """Called once the response for a request was produced.  Adds the
+        ``Server-Timing`` header unless disabled.
+        """
+        timings.finish()
+        if self.server_timing:
+            response.headers['Server-Timing'] = timings.to_server_timing()
+
+    def report_slow_hook(self, kind, func, duration):
+        """Called for every hook that took longer than the threshold.  The
+        default implementation logs a warning on the application logger.
+        """
+        self.app.logger.warning('Slow %s hook %s took %.2fms' % (
+            kind, _qualname(func), duration * 1000))
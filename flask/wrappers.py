@@ -10,10 +10,11 @@
 """
 
 from werkzeug.wrappers import Request as RequestBase, Response as ResponseBase
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, GatewayTimeout
 
 from . import json
 from .globals import _request_ctx_stack
+from ._compat import timer
 
 _missing = object()
 
@@ -25,6 +26,18 @@ def _get_data(req, cache):
     return req.data
 
 
+class DeadlineExceeded(GatewayTimeout):
+    """Raised by :meth:`Request.check_deadline` if the deadline of the
+    request passed.  This is a ``504 Gateway Timeout`` error so it is
+    handled like any other HTTP exception and can be customized with
+    ``errorhandler(DeadlineExceeded)`` or ``errorhandler(504)``.
+
+    .. versionadded:: 1.0
+    """
+    description = ('The request could not be handled within its '
+                   'deadline.')
+
+
 class Request(RequestBase):
     """The request object used by default in Keyes.  Remembers the
     matched endpoint and view arguments.
@@ -55,6 +68,24 @@ class Request(RequestBase):
     #: something similar.
     routing_exception = None
 
+    #: If a :class:`~keyes.tracing.RequestTracer` is attached to the
+    #: application this is the :class:`~keyes.tracing.PhaseTimings`
+    #: object with the durations of the request phases.
+    #:
+    #: .. versionadded:: 1.0
+    phase_timings = None
+
+    #: The :func:`~keyes._compat.timer` value by which the request should
+    #: be handled or ``None`` if there is no deadline.  It is set when the
+    #: request context is pushed from the ``timeout`` option of the
+    #: matched URL rule or the ``REQUEST_TIMEOUT`` config key.  Keyes
+    #: checks it before every :meth:`~keyes.Keyes.before_request` function
+    #: and before the view is called.  Use :attr:`time_remaining` to size
+    #: the timeouts of calls to other services.
+    #:
+    #: .. versionadded:: 1.0
+    deadline = None
+
     # Switched by the request context until 1.0 to opt in deprecated
     # module functionality.
     _is_old_module = False
@@ -64,7 +95,25 @@ class Request(RequestBase):
         """Read-only view of the ``MAX_CONTENT_LENGTH`` config key."""
         ctx = _request_ctx_stack.top
         if ctx is not None:
-            return ctx.app.config['MAX_CONTENT_LENGTH']
+            return ctx.app._config_view['MAX_CONTENT_LENGTH']
+
+    @property
+    def time_remaining(self):
+        """The number of seconds left until the :attr:`deadline` or ``None``
+        if the request has no deadline.
+
+        .. versionadded:: 1.0
+        """
+        if self.deadline is not None:
+            return max(self.deadline - timer(), 0)
+
+    def check_deadline(self):
+        """Raises :exc:`DeadlineExceeded` if the :attr:`deadline` passed.
+
+        .. versionadded:: 1.0
+        """
+        if self.deadline is not None and timer() >= self.deadline:
+            raise DeadlineExceeded()
 
     @property
     def endpoint(self):
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    bench-import
+    ~~~~~~~~~~~~
+
+    Measures how long importing keyes takes in fresh interpreters and
+    which modules the import pulls in.  Exits with an error if the median
+    import time exceeds the given limit, so this can guard against import
+    time regressions on CI::
+
+        python scripts/bench-import.py --runs 20 --max-ms 50
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+import sys
+import json
+import argparse
+from subprocess import Popen, PIPE
+
+
+STATEMENTS = ['import keyes', 'from keyes import Keyes']
+
+# modules that should only be imported once they are used.
+HEAVY_MODULES = ['click', 'jinja2', 'itsdangerous', 'werkzeug.routing']
+
+_measure_source = '''\
+import sys, json, time
+started = time.time()
+exec(%r)
+duration = time.time() - started
+print(json.dumps([duration, [m for m in %r if m in sys.modules]]))
+'''
+
+
+def measure(statement):
+    source = _measure_source % (statement, HEAVY_MODULES)
+    proc = Popen([sys.executable, '-c', source], stdout=PIPE)
+    stdout = proc.communicate()[0]
+    if proc.returncode != 0:
+        raise RuntimeError('%r failed' % statement)
+    return json.loads(stdout.decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--runs', type=int, default=10,
+                        help='the number of interpreters to start per '
+                        'statement')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='fail if the median time of "import keyes" '
+                        'exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    failed = False
+    for statement in STATEMENTS:
+        results = [measure(statement) for x in range(args.runs)]
+        timings = sorted(duration * 1000 for duration, modules in results)
+        median = timings[len(timings) // 2]
+        print('%-25s median %7.2fms  min %7.2fms  heavy modules: %s' % (
+            statement, median, timings[0],
+            ', '.join(results[0][1]) or '-'))
+        if statement == 'import keyes' and args.max_ms is not None and \
+           median > args.max_ms:
+            print('  exceeds the limit of %.2fms' % args.max_ms)
+            failed = True
+    sys.exit(failed and 1 or 0)
+
+
+if __name__ == '__main__':
+    main()
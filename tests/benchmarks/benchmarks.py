@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.benchmarks.benchmarks
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    The framework micro-benchmarks.  Every ``bench_*`` function sets up
+    what it needs and returns the function that is timed by ``run.py``.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import atexit
+import shutil
+import tempfile
+
+from werkzeug.test import EnvironBuilder
+
+import keyes
+from keyes.metrics import RequestMetrics
+from keyes.routecache import RouteCache
+
+
+here = os.path.dirname(os.path.abspath(__file__))
+static_file = os.path.join(here, os.pardir, 'static', 'index.html')
+
+#: The time in microseconds recording a request in the request metrics may
+#: take, checked against :func:`bench_metrics`.
+METRICS_BUDGET = 5.0
+
+
+def make_app():
+    app = keyes.Keyes(__name__)
+    app.secret_key = 'benchmark'
+    return app
+
+
+def make_environ(path='/', **kwargs):
+    builder = EnvironBuilder(path=path, **kwargs)
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def start_response(status, headers, exc_info=None):
+    return lambda data: None
+
+
+def make_request(app, path='/', **kwargs):
+    """Returns a function that sends a request to the WSGI application,
+    with the environment built only once.
+    """
+    environ = make_environ(path, **kwargs)
+
+    def request():
+        app_iter = app(dict(environ), start_response)
+        try:
+            for chunk in app_iter:
+                pass
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+    return request
+
+
+def bench_hello_world():
+    app = make_app()
+
+    @app.route('/')
+    def index():
+        return 'Hello World!'
+
+    return make_request(app)
+
+
+def bench_jsonify():
+    app = make_app()
+    data = dict(('key%d' % idx, [idx, str(idx), {'n': idx}])
+                for idx in range(20))
+
+    @app.route('/')
+    def index():
+        return keyes.jsonify(data)
+
+    return make_request(app)
+
+
+def bench_render_template():
+    app = make_app()
+    items = [{'name': 'item %d' % idx, 'url': '/items/%d' % idx}
+             for idx in range(50)]
+
+    @app.route('/')
+    def index():
+        return keyes.render_template('items.html', title='Items',
+                                     items=items)
+
+    return make_request(app)
+
+
+def bench_url_for():
+    app = make_app()
+
+    @app.route('/items/<int:id>/<name>')
+    def item(id, name):
+        pass
+
+    ctx = app.test_request_context()
+    ctx.push()
+    try:
+        keyes.url_for('item', id=1, name='first')
+    finally:
+        ctx.pop()
+
+    def run():
+        ctx.push()
+        try:
+            for idx in range(100):
+                keyes.url_for('item', id=idx, name='item', page=2)
+        finally:
+            ctx.pop()
+    return run
+
+
+def bench_session():
+    app = make_app()
+
+    @app.route('/')
+    def index():
+        keyes.session['counter'] = keyes.session.get('counter', 0) + 1
+        return 'ok'
+
+    rv = app.test_client().get('/')
+    cookie = rv.headers['Set-Cookie'].split(';', 1)[0]
+    return make_request(app, headers={'Cookie': cookie})
+
+
+def bench_send_file():
+    app = make_app()
+
+    @app.route('/')
+    def index():
+        return keyes.send_file(static_file, cache_timeout=0)
+
+    return make_request(app)
+
+
+def bench_error_handler():
+    app = make_app()
+
+    class Conflict(Exception):
+        pass
+
+    @app.errorhandler(Conflict)
+    def handle_conflict(e):
+        return 'conflict', 409
+
+    @app.route('/')
+    def index():
+        raise Conflict()
+
+    return make_request(app)
+
+
+def bench_not_found():
+    app = make_app()
+
+    @app.errorhandler(404)
+    def not_found(e):
+        return 'not found', 404
+
+    return make_request(app, '/missing')
+
+
+def make_blueprint_app(blueprints=10, routes=100, route_cache=None):
+    app = make_app()
+    if route_cache is not None:
+        RouteCache(app, filename=route_cache)
+    for bp_idx in range(blueprints):
+        bp = keyes.Blueprint('bp%d' % bp_idx, __name__,
+                             url_prefix='/bp%d' % bp_idx)
+        for idx in range(routes):
+            bp.add_url_rule('/route%d/<int:id>' % idx, 'route%d' % idx,
+                            lambda id: 'ok')
+        app.register_blueprint(bp)
+    return app
+
+
+def bench_blueprint_dispatch():
+    app = make_blueprint_app()
+    return make_request(app, '/bp9/route99/1')
+
+
+def bench_blueprint_registration():
+    return make_blueprint_app
+
+
+def bench_blueprint_registration_cached():
+    folder = tempfile.mkdtemp()
+    # the timed function uses the file after this returns.
+    atexit.register(shutil.rmtree, folder, True)
+    filename = os.path.join(folder, 'url_map.cache')
+    make_blueprint_app(route_cache=filename).route_cache.save()
+    return lambda: make_blueprint_app(route_cache=filename)
+
+
+def bench_context_push_pop():
+    app = make_app()
+    environ = make_environ()
+
+    def run():
+        ctx = app.request_context(dict(environ))
+        ctx.push()
+        ctx.pop()
+    return run
+
+
+def bench_metrics():
+    """Records 100 requests in the request metrics."""
+    app = make_app()
+    metrics = RequestMetrics(app)
+
+    @app.route('/', methods=['POST'])
+    def index():
+        return 'Hello World!'
+
+    ctx = app.test_request_context('/', method='POST', data='data')
+    ctx.push()
+    try:
+        request = keyes.request._get_current_object()
+        response = app.make_response(index())
+    finally:
+        ctx.pop()
+
+    def run():
+        for idx in range(100):
+            metrics.request_finished(metrics.request_started(), request,
+                                     response, 0.003)
+    return run
+
+
+def get_benchmarks():
+    """Returns a sorted list of ``(name, setup)`` tuples."""
+    return sorted((name[6:], func) for name, func in globals().items()
+                  if name.startswith('bench_'))
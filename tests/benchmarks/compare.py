@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    compare
+    ~~~~~~~
+
+    Compares two result files of ``run.py`` and exits with an error if a
+    benchmark got slower than the threshold::
+
+        python tests/benchmarks/compare.py old.json new.json --threshold 10
+
+    The fastest times are compared as they are the least affected by
+    noise.  Baselines depend on the machine they were recorded on, so
+    compare against a baseline recorded on the same machine.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+import sys
+import json
+import argparse
+
+
+def compare(old, new, threshold):
+    """Returns a list of ``(name, old, new, change)`` tuples and the names
+    of the benchmarks that regressed.  `change` is in percent.
+    """
+    rows = []
+    regressions = []
+    for name in sorted(set(old) | set(new)):
+        before = old.get(name, {}).get('min')
+        after = new.get(name, {}).get('min')
+        change = None
+        if before and after:
+            change = (after - before) / before * 100
+            if change > threshold:
+                regressions.append(name)
+        rows.append((name, before, after, change))
+    return rows, regressions
+
+
+def format_time(value):
+    if value is None:
+        return '-'
+    return '%.2fus' % value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares two benchmark '
+                                     'result files.')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='the slowdown in percent that counts as a '
+                        'regression')
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)['benchmarks']
+    with open(args.new) as f:
+        new = json.load(f)['benchmarks']
+
+    rows, regressions = compare(old, new, args.threshold)
+    print('%-25s %14s %14s %9s' % ('benchmark', 'old', 'new', 'change'))
+    for name, before, after, change in rows:
+        print('%-25s %14s %14s %9s%s' % (
+            name, format_time(before), format_time(after),
+            change is None and '-' or '%+.1f%%' % change,
+            name in regressions and '  REGRESSION' or ''))
+    if regressions:
+        print('\n%d benchmark(s) regressed by more than %.1f%%.'
+              % (len(regressions), args.threshold))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    run
+    ~~~
+
+    Runs the framework micro-benchmarks and writes the results as JSON::
+
+        python tests/benchmarks/run.py -o results.json
+        python tests/benchmarks/compare.py \\
+            tests/benchmarks/baselines/baseline.json results.json
+
+    Every benchmark is called in a loop until a batch takes at least
+    ``--min-time`` seconds and the batch is repeated ``--repeat`` times.
+    The results are the fastest and the median time per call in
+    microseconds.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import keyes
+from keyes._compat import timer
+
+from benchmarks import get_benchmarks
+
+
+def time_batch(func, loops):
+    started = timer()
+    for x in range(loops):
+        func()
+    return timer() - started
+
+
+def measure(func, repeat, min_time):
+    """Returns the fastest and the median time per call in microseconds
+    and the number of calls per batch.
+    """
+    func()
+    loops = 1
+    while 1:
+        duration = time_batch(func, loops)
+        if duration >= min_time:
+            break
+        loops *= max(2, min(10, int(min_time / max(duration, 1e-9)) + 1))
+    timings = [duration / loops]
+    timings.extend(time_batch(func, loops) / loops
+                   for x in range(repeat - 1))
+    timings.sort()
+    return {
+        'min': timings[0] * 1e6,
+        'median': timings[len(timings) // 2] * 1e6,
+        'loops': loops,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the keyes '
+                                     'micro-benchmarks.')
+    parser.add_argument('names', nargs='*',
+                        help='only run benchmarks containing these names')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='the minimum duration of a batch in seconds')
+    parser.add_argument('-o', '--output', default=None,
+                        help='write the results as JSON into this file')
+    args = parser.parse_args()
+
+    results = {}
+    for name, setup in get_benchmarks():
+        if args.names and not any(part in name for part in args.names):
+            continue
+        results[name] = rv = measure(setup(), args.repeat, args.min_time)
+        print('%-25s %12.2fus  (median %.2fus, %d loops)' % (
+            name, rv['min'], rv['median'], rv['loops']))
+
+    data = {
+        'meta': {
+            'created': time.time(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'keyes': keyes.__version__,
+        },
+        'benchmarks': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
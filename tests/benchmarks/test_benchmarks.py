@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.benchmarks.test_benchmarks
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Runs every benchmark once so that they keep working.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import pytest
+
+from benchmarks import get_benchmarks, bench_metrics, METRICS_BUDGET
+from compare import compare
+from run import measure
+
+
+@pytest.mark.parametrize(('name', 'setup'), get_benchmarks())
+def test_benchmark(name, setup):
+    setup()()
+
+
+def test_metrics_budget():
+    per_request = measure(bench_metrics(), 5, 0.05)['min'] / 100
+    assert per_request < METRICS_BUDGET
+
+
+def test_compare():
+    old = {'a': {'min': 10.0}, 'b': {'min': 10.0}, 'c': {'min': 1.0}}
+    new = {'a': {'min': 10.5}, 'b': {'min': 12.0}, 'd': {'min': 1.0}}
+    rows, regressions = compare(old, new, 10)
+    assert regressions == ['b']
+    assert rows[0] == ('a', 10.0, 10.5, 5.0)
+    assert rows[2] == ('c', 1.0, None, None)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.accesslog
+    ~~~~~~~~~~~~~~~
+
+    Tests the structured access log.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import pytest
+
+import keyes
+from keyes.accesslog import AccessLog
+from keyes._compat import StringIO
+
+
+def read_entries(access_log):
+    access_log.close()
+    return [keyes.json.loads(line) for line in
+            access_log.stream.getvalue().splitlines()]
+
+
+def test_access_log_entries():
+    app = keyes.Keyes(__name__)
+    app.secret_key = 'secret'
+    bp = keyes.Blueprint('frontend', __name__)
+
+    @bp.route('/login', methods=['POST'])
+    def login():
+        keyes.session['user'] = 'john'
+        return 'logged in'
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    @app.route('/cached')
+    def cached():
+        rv = keyes.make_response('cached')
+        rv.set_etag('abc')
+        return rv.make_conditional(keyes.request)
+
+    app.register_blueprint(bp)
+    access_log = AccessLog(app, stream=StringIO())
+
+    c = app.test_client()
+    c.get('/')
+    c.post('/login', data='payload')
+    c.get('/cached', headers={'If-None-Match': '"abc"'})
+    c.get('/missing')
+
+    entries = read_entries(access_log)
+    assert [(e['endpoint'], e['blueprint'], e['status']) for e in entries] \
+        == [('index', None, 200), ('frontend.login', 'frontend', 200),
+            ('cached', None, 304), (None, None, 404)]
+    assert [e['session'] for e in entries] == [False, True, False, False]
+    assert [e['cache_hit'] for e in entries] == [False, False, True, False]
+    assert entries[0]['bytes_out'] == 5
+    assert entries[1]['bytes_in'] == 7
+    assert all(e['latency'] >= 0 for e in entries)
+    assert access_log.written == 4
+
+
+def test_access_log_sampling():
+    app = keyes.Keyes(__name__)
+    access_log = AccessLog(app, stream=StringIO(), sample_rate=0,
+                           endpoint_rates={'important': 1})
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    @app.route('/important')
+    def important():
+        return 'important'
+
+    c = app.test_client()
+    for x in range(5):
+        c.get('/')
+    c.get('/important')
+    assert [e['endpoint'] for e in read_entries(access_log)] == \
+        ['important']
+
+
+def test_access_log_requires_target():
+    pytest.raises(TypeError, AccessLog)
+
+
+def test_access_log_flushes_on_close(monkeypatch):
+    registered = []
+    monkeypatch.setattr('atexit.register', registered.append)
+    app = keyes.Keyes(__name__)
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    access_log = AccessLog(app, stream=StringIO(), flush_interval=60,
+                           batch_size=1000)
+    c = app.test_client()
+    for x in range(3):
+        c.get('/')
+    assert registered == [access_log.close]
+    assert access_log.stream.getvalue() == ''
+
+    registered[0]()
+    assert len(access_log.stream.getvalue().splitlines()) == 3
+    assert access_log.written == 3
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.admission
+    ~~~~~~~~~~~~~~~
+
+    Tests the admission controller.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import time
+from threading import Event, Thread
+
+import keyes
+from keyes.admission import AdmissionController
+from keyes.accesslog import AccessLog
+from keyes.metrics import RequestMetrics
+from keyes._compat import StringIO
+
+
+def make_app(**options):
+    app = keyes.Keyes(__name__)
+    entered = Event()
+    proceed = Event()
+    bp = keyes.Blueprint('admin', __name__)
+
+    @app.route('/block')
+    def block():
+        entered.set()
+        proceed.wait(5)
+        return 'blocked'
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    @bp.route('/admin')
+    def admin():
+        return 'admin'
+
+    app.register_blueprint(bp)
+    admission = AdmissionController(app, **options)
+    return app, admission, entered, proceed
+
+
+def start_blocking_request(app, entered):
+    results = []
+    t = Thread(target=lambda: results.append(app.test_client().get('/block')))
+    t.start()
+    assert entered.wait(5)
+    return t, results
+
+
+def test_global_limit_rejects_with_retry_after():
+    app, admission, entered, proceed = make_app(max_concurrency=1,
+                                                max_wait=0, retry_after=7)
+    t, results = start_blocking_request(app, entered)
+    try:
+        rv = app.test_client().get('/')
+        assert rv.status_code == 503
+        assert rv.headers['Retry-After'] == '7'
+        assert admission.in_flight == 1
+    finally:
+        proceed.set()
+        t.join()
+    assert results[0].data == b'blocked'
+    assert admission.in_flight == 0
+    assert app.test_client().get('/').data == b'index'
+    assert (admission.admitted, admission.rejected) == (2, 1)
+
+
+def test_endpoint_limit():
+    app, admission, entered, proceed = make_app(
+        endpoint_limits={'block': 1}, max_wait=0)
+    t, results = start_blocking_request(app, entered)
+    try:
+        c = app.test_client()
+        assert c.get('/block').status_code == 503
+        assert c.get('/').data == b'index'
+    finally:
+        proceed.set()
+        t.join()
+
+
+def test_waiting_request_is_admitted_when_slot_frees():
+    app, admission, entered, proceed = make_app(max_concurrency=1,
+                                                max_wait=5)
+    t, results = start_blocking_request(app, entered)
+    waiter = []
+    w = Thread(target=lambda: waiter.append(app.test_client().get('/')))
+    w.start()
+    for x in range(500):
+        if admission.waiting:
+            break
+        time.sleep(0.01)
+    assert admission.waiting == 1
+    proceed.set()
+    t.join()
+    w.join()
+    assert waiter[0].data == b'index'
+    assert admission.waiting == 0
+
+
+def test_priorities_and_queue_limit():
+    app, admission, entered, proceed = make_app(max_concurrency=1,
+                                                max_wait=0.05, max_queue=0,
+                                                priorities={'admin': 1})
+    with app.test_request_context('/admin'):
+        assert admission.get_priority(keyes.request) == 1
+    with app.test_request_context('/'):
+        assert admission.get_priority(keyes.request) == 0
+
+    t, results = start_blocking_request(app, entered)
+    try:
+        started = time.time()
+        assert app.test_client().get('/').status_code == 503
+        assert time.time() - started < 0.05
+    finally:
+        proceed.set()
+        t.join()
+
+
+def wait_for_waiters(admission, count):
+    for x in range(500):
+        if admission.waiting >= count:
+            break
+        time.sleep(0.01)
+    assert admission.waiting == count
+
+
+def test_waiter_held_back_by_endpoint_limit_does_not_block():
+    app = keyes.Keyes(__name__)
+    entered = Event()
+    proceed = Event()
+    bp = keyes.Blueprint('admin', __name__)
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    @bp.route('/export')
+    def export():
+        entered.set()
+        proceed.wait(5)
+        return 'exported'
+
+    app.register_blueprint(bp)
+    admission = AdmissionController(app, max_concurrency=10, max_wait=5,
+                                    endpoint_limits={'admin.export': 1},
+                                    priorities={'admin': 1})
+    results = []
+
+    def export_request():
+        results.append(app.test_client().get('/export'))
+
+    threads = [Thread(target=export_request) for x in range(2)]
+    threads[0].start()
+    assert entered.wait(5)
+    threads[1].start()
+    try:
+        wait_for_waiters(admission, 1)
+        started = time.time()
+        assert app.test_client().get('/').data == b'index'
+        assert time.time() - started < 1
+    finally:
+        proceed.set()
+        for t in threads:
+            t.join()
+    assert [rv.data for rv in results] == [b'exported'] * 2
+
+
+def test_rejected_requests_are_recorded():
+    app, admission, entered, proceed = make_app(max_concurrency=1,
+                                                max_wait=0)
+    metrics = RequestMetrics(app)
+    access_log = AccessLog(app, stream=StringIO())
+    t, results = start_blocking_request(app, entered)
+    try:
+        assert app.test_client().get('/').status_code == 503
+    finally:
+        proceed.set()
+        t.join()
+    series, in_flight = metrics.collect()
+    assert series[('index', 503)]['count'] == 1
+    assert series[('block', 200)]['count'] == 1
+    access_log.close()
+    entries = [keyes.json.loads(line) for line in
+               access_log.stream.getvalue().splitlines()]
+    assert sorted(e['status'] for e in entries) == [200, 503]
@@ -21,7 +21,7 @@ from threading import Thread
 from keyes._compat import text_type
 from werkzeug.exceptions import BadRequest, NotFound, Forbidden
 from werkzeug.http import parse_date
-from werkzeug.routing import BuildError
+from werkzeug.routing import BuildError, MapAdapter
 import werkzeug.serving
 
 
@@ -50,6 +50,100 @@ def test_options_on_multiple_rules():
     assert sorted(rv.allow) == ['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT']
 
 
+def test_options_use_precomputed_methods(monkeypatch):
+    app = keyes.Keyes(__name__)
+
+    @app.route('/', methods=['GET', 'POST'])
+    def index():
+        return 'Hello World'
+
+    @app.route('/', methods=['PUT'])
+    def index_put():
+        return 'Aha!'
+
+    for rule in app.url_map.iter_rules('index'):
+        assert rule.allowed_methods == frozenset(['GET', 'HEAD', 'OPTIONS',
+                                                  'POST', 'PUT'])
+
+    c = app.test_client()
+    rv = c.open('/', method='OPTIONS')
+    assert sorted(rv.allow) == ['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT']
+
+    def fail(*args, **kwargs):
+        raise AssertionError('URL was matched again')
+    monkeypatch.setattr(MapAdapter, 'allowed_methods', fail)
+    rv = c.open('/', method='OPTIONS')
+    assert sorted(rv.allow) == ['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT']
+
+
+def test_options_on_overlapping_rules():
+    app = keyes.Keyes(__name__)
+
+    @app.route('/<name>')
+    def user(name):
+        return name
+
+    @app.route('/special', methods=['POST'])
+    def special():
+        return 'special'
+
+    c = app.test_client()
+    for x in range(2):
+        rv = c.open('/special', method='OPTIONS')
+        assert sorted(rv.allow) == ['GET', 'HEAD', 'OPTIONS', 'POST']
+        rv = c.open('/other', method='OPTIONS')
+        assert sorted(rv.allow) == ['GET', 'HEAD', 'OPTIONS']
+
+    @app.route('/special', methods=['DELETE'])
+    def delete_special():
+        return 'deleted'
+
+    @app.route('/<name>', methods=['PUT'])
+    def put_user(name):
+        return name
+
+    rv = c.open('/special', method='OPTIONS')
+    assert sorted(rv.allow) == ['DELETE', 'GET', 'HEAD', 'OPTIONS', 'POST',
+                                'PUT']
+
+
+def test_options_precomputed_for_dynamic_rules(monkeypatch):
+    app = keyes.Keyes(__name__)
+
+    @app.route('/users/<int:id>', methods=['GET', 'POST'])
+    def user(id):
+        return str(id)
+
+    @app.route('/users/<int:id>', methods=['DELETE'])
+    def delete_user(id):
+        return str(id)
+
+    @app.route('/users/<int:id>/posts')
+    def posts(id):
+        return str(id)
+
+    c = app.test_client()
+    real_allowed_methods = MapAdapter.allowed_methods
+
+    def fail(*args, **kwargs):
+        raise AssertionError('URL was matched again')
+    monkeypatch.setattr(MapAdapter, 'allowed_methods', fail)
+    for path in '/users/1', '/users/2':
+        rv = c.open(path, method='OPTIONS')
+        assert sorted(rv.allow) == ['DELETE', 'GET', 'HEAD', 'OPTIONS',
+                                    'POST']
+    rv = c.open('/users/1/posts', method='OPTIONS')
+    assert sorted(rv.allow) == ['GET', 'HEAD', 'OPTIONS']
+
+    # rules added to the map directly are taken into account as well.
+    app.url_map.add(app.url_rule_class('/users/<name>', methods=['PUT'],
+                                       endpoint='user'))
+    monkeypatch.setattr(MapAdapter, 'allowed_methods', real_allowed_methods)
+    rv = c.open('/users/1', method='OPTIONS')
+    assert sorted(rv.allow) == ['DELETE', 'GET', 'HEAD', 'OPTIONS', 'POST',
+                                'PUT']
+
+
 def test_options_handling_disabled():
     app = keyes.Keyes(__name__)
 
@@ -1395,6 +1489,42 @@ def test_before_first_request_functions_concurrent():
     assert app.got_first_request
 
 
+def test_warmup(caplog, tmpdir):
+    tmpdir.join('index.html').write('{{ name|shout }}')
+    tmpdir.join('broken.html').write('{{ name|missing_filter }}')
+    tmpdir.join('image.png').write_binary(b'\x89PNG\xff\xfe')
+    got = []
+    app = keyes.Keyes(__name__, template_folder=str(tmpdir))
+
+    @app.template_filter()
+    def shout(value):
+        return value.upper()
+
+    @app.before_first_request
+    def foo():
+        got.append((keyes.request.path,
+                    keyes.url_for('index', _external=True)))
+
+    @app.route('/')
+    def index():
+        got.append(keyes.request.method)
+        return keyes.render_template('index.html', name='index')
+
+    @app.route('/fail', methods=['POST'])
+    def fail():
+        1 // 0
+
+    app.warmup(requests=['/', ('POST', '/fail'),
+                         {'path': '/', 'method': 'HEAD'}])
+    assert got == [('/', 'http://localhost/'), 'GET', 'HEAD']
+    assert app.got_first_request
+    assert len(app.jinja_env.cache) > 0
+    assert 'Warmup request to /fail failed' in caplog.text
+    assert 'Could not compile template broken.html' in caplog.text
+    assert 'index.html' not in caplog.text
+    assert 'image.png' not in caplog.text
+
+
 def test_routing_redirect_debugging():
     app = keyes.Keyes(__name__)
     app.debug = True
@@ -1628,3 +1758,173 @@ def test_run_server_port(monkeypatch):
     hostname, port = 'localhost', 8000
     app.run(hostname, port, debug=True)
     assert rv['result'] == 'running on %s:%s ...' % (hostname, port)
+
+
+def test_request_deadline():
+    app = keyes.Keyes(__name__)
+    app.config['REQUEST_TIMEOUT'] = 30
+
+    @app.route('/')
+    def index():
+        return '%.0f' % keyes.request.time_remaining
+
+    @app.route('/fast', timeout=0.01)
+    def fast():
+        return 'fast'
+
+    @app.route('/unlimited')
+    def unlimited():
+        return repr(keyes.request.deadline)
+
+    @app.before_request
+    def slow_hook():
+        if keyes.request.endpoint == 'fast':
+            time.sleep(0.02)
+
+    @app.errorhandler(keyes.DeadlineExceeded)
+    def deadline_exceeded(e):
+        return 'too slow', 504
+
+    c = app.test_client()
+    assert c.get('/').data == b'30'
+    rv = c.get('/fast')
+    assert rv.status_code == 504
+    assert rv.data == b'too slow'
+
+    app.config['REQUEST_TIMEOUT'] = None
+    assert c.get('/unlimited').data == b'None'
+
+
+def test_request_deadline_ignores_view_attributes():
+    app = keyes.Keyes(__name__)
+
+    class Proxy(object):
+        timeout = 0.001
+        __name__ = 'proxy'
+
+        def __call__(self):
+            time.sleep(0.01)
+            return repr(keyes.request.deadline)
+
+    app.add_url_rule('/', view_func=Proxy())
+    rv = app.test_client().get('/')
+    assert rv.status_code == 200
+    assert rv.data == b'None'
+
+
+def test_request_deadline_checked_between_hooks():
+    app = keyes.Keyes(__name__)
+    called = []
+
+    @app.before_request
+    def first():
+        called.append('first')
+        time.sleep(0.02)
+
+    @app.before_request
+    def second():
+        called.append('second')
+
+    @app.route('/', timeout=0.01)
+    def index():
+        called.append('view')
+        return 'index'
+
+    rv = app.test_client().get('/')
+    assert rv.status_code == 504
+    assert called == ['first']
+
+
+def test_fast_routing_errors():
+    app = keyes.Keyes(__name__)
+    app.config['FAST_ROUTING_ERRORS'] = True
+    app.secret_key = 'secret'
+    called = []
+
+    @app.before_request
+    def before_request():
+        called.append('before')
+
+    @app.route('/', methods=['GET'])
+    def index():
+        return 'index'
+
+    c = app.test_client()
+    rv = c.get('/missing')
+    assert rv.status_code == 404
+    assert b'Not Found' in rv.data
+    assert c.get('/missing').data == rv.data
+    rv = c.post('/')
+    assert rv.status_code == 405
+    assert sorted(rv.allow) == ['GET', 'HEAD', 'OPTIONS']
+    assert called == []
+
+    @app.errorhandler(404)
+    def not_found(e):
+        return 'custom', 404
+
+    assert c.get('/missing').data == b'custom'
+    assert called == ['before']
+
+
+def test_dispatch_internal():
+    app = keyes.Keyes(__name__)
+    app.secret_key = 'secret'
+    app.config['APPLICATION_ROOT'] = '/app'
+
+    @app.route('/fragment/<int:id>')
+    def fragment(id):
+        return '%s:%d:%s:%s' % (keyes.request.path, id,
+                                keyes.request.args.get('size'),
+                                keyes.session.get('user'))
+
+    @app.route('/page')
+    def page():
+        keyes.session['user'] = 'john'
+        rv = app.dispatch_internal('fragment', id=1, size='small')
+        return 'page(%s)' % rv.get_data(as_text=True)
+
+    @app.route('/submit', methods=['POST'])
+    def submit():
+        return keyes.request.method
+
+    @app.route('/fail')
+    def fail():
+        raise ZeroDivisionError()
+
+    with app.app_context():
+        rv = app.dispatch_internal('fragment', id=2)
+        assert rv.data == b'/fragment/2:2:None:None'
+        assert app.dispatch_internal('submit', _method='POST').data == \
+            b'POST'
+        pytest.raises(ZeroDivisionError, app.dispatch_internal, 'fail')
+        assert keyes._request_ctx_stack.top is None
+
+    rv = app.test_client().get('/page')
+    assert rv.data == b'page(/fragment/1:1:small:john)'
+
+
+def test_dispatch_internal_quoting():
+    app = keyes.Keyes(__name__)
+    app.config['SERVER_NAME'] = 'example.com'
+
+    @app.route('/users/<name>')
+    def user(name):
+        return keyes.jsonify(name=name, path=keyes.request.path,
+                             page=keyes.request.args.get('page'))
+
+    @app.route('/', subdomain='<tenant>')
+    def tenant(tenant):
+        return keyes.jsonify(tenant=tenant, host=keyes.request.host,
+                             url=keyes.request.url)
+
+    with app.app_context():
+        for name in u'a b', u'\xe9t\xe9', u'100%':
+            rv = app.dispatch_internal('user', name=name, page=u'\xe9 1')
+            assert keyes.json.loads(rv.data) == {
+                'name': name, 'path': u'/users/' + name, 'page': u'\xe9 1'}
+
+        rv = app.dispatch_internal('tenant', tenant='acme')
+        assert keyes.json.loads(rv.data) == {
+            'tenant': 'acme', 'host': 'acme.example.com',
+            'url': 'http://acme.example.com/'}
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.batch
+    ~~~~~~~~~~~
+
+    Tests the batch endpoint.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import base64
+
+import pytest
+
+import keyes
+from keyes.batch import BatchDispatcher
+
+
+def make_app(**options):
+    app = keyes.Keyes(__name__)
+    app.secret_key = 'secret'
+    app.testing = True
+
+    @app.route('/items/<int:id>')
+    def item(id):
+        return keyes.jsonify(id=id, q=keyes.request.args.get('q'))
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return keyes.request.get_json()['message']
+
+    @app.route('/login', methods=['POST'])
+    def login():
+        keyes.session['user'] = keyes.request.get_json()['user']
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return keyes.session.get('user', 'anonymous')
+
+    @app.route('/fail')
+    def fail():
+        1 // 0
+
+    @app.route('/binary')
+    def binary():
+        return app.response_class(b'\xff\xfe\x00',
+                                  mimetype='application/octet-stream')
+
+    batch = BatchDispatcher(app, **options)
+    return app, batch
+
+
+def post_batch(client, requests):
+    rv = client.post('/batch', data=keyes.json.dumps(requests),
+                     content_type='application/json')
+    assert rv.status_code == 200
+    return keyes.json.loads(rv.data), rv
+
+
+@pytest.mark.parametrize('max_workers', [None, 4])
+def test_batch_dispatch(max_workers):
+    app, batch = make_app(max_workers=max_workers)
+    c = app.test_client()
+    results, rv = post_batch(c, [
+        {'path': '/items/1?q=x'},
+        {'path': '/echo', 'method': 'post', 'json': {'message': 'hi'}},
+        {'path': '/fail'},
+        {'path': '/missing'},
+        {'method': 'GET'},
+        {'path': '/batch', 'method': 'POST'},
+    ])
+    batch.close()
+    assert [r['status'] for r in results] == [200, 200, 500, 404, 400, 400]
+    assert results[0]['body'] == {'id': 1, 'q': 'x'}
+    assert results[0]['headers']['Content-Type'] == 'application/json'
+    assert results[1]['body'] == 'hi'
+
+
+def test_batch_malformed_items():
+    app, batch = make_app()
+    c = app.test_client()
+    results, rv = post_batch(c, [
+        {'path': '/whoami', 'method': 5},
+        {'path': '/whoami', 'headers': ['X-Foo']},
+        {'path': '/whoami', 'headers': {'X-Foo': 1}},
+        {'path': '/echo', 'method': 'POST', 'body': {'message': 'hi'}},
+        {'path': 42},
+        'nonsense',
+        {'path': '/whoami'},
+    ])
+    assert [r['status'] for r in results] == [400] * 6 + [200]
+    assert results[0]['body'] == 'The method has to be a string.'
+    assert results[-1]['body'] == 'anonymous'
+
+
+def test_batch_binary_body():
+    app, batch = make_app()
+    c = app.test_client()
+    results, rv = post_batch(c, [{'path': '/binary'}, {'path': '/whoami'}])
+    assert results[0]['status'] == 200
+    assert results[0]['encoding'] == 'base64'
+    assert base64.b64decode(results[0]['body']) == b'\xff\xfe\x00'
+    assert results[1] == {'status': 200, 'body': 'anonymous',
+                          'headers': results[1]['headers']}
+
+
+@pytest.mark.parametrize('max_workers', [None, 2])
+def test_batch_result_errors_are_isolated(max_workers):
+    class BrokenBatch(BatchDispatcher):
+        def make_result(self, response):
+            if keyes.request.path == '/whoami':
+                raise RuntimeError('broken')
+            return BatchDispatcher.make_result(self, response)
+
+    app = keyes.Keyes(__name__)
+
+    @app.route('/whoami')
+    def whoami():
+        return 'anonymous'
+
+    @app.route('/ok')
+    def ok():
+        return 'ok'
+
+    batch = BrokenBatch(app, max_workers=max_workers)
+    try:
+        results, rv = post_batch(app.test_client(), [{'path': '/whoami'},
+                                                     {'path': '/ok'}])
+    finally:
+        batch.close()
+    assert [r['status'] for r in results] == [500, 200]
+
+
+@pytest.mark.parametrize('max_workers', [None, 2])
+def test_batch_isolates_g(max_workers):
+    app = keyes.Keyes(__name__)
+
+    @app.before_request
+    def mark():
+        if keyes.request.endpoint == 'batch':
+            keyes.g.outer = True
+
+    @app.route('/g')
+    def show_g():
+        seen = sorted(keyes.g.__dict__)
+        keyes.g.inner = True
+        return ','.join(seen)
+
+    batch = BatchDispatcher(app, max_workers=max_workers)
+    try:
+        results, rv = post_batch(app.test_client(), [{'path': '/g'}] * 3)
+    finally:
+        batch.close()
+    assert [r['body'] for r in results] == [''] * 3
+
+
+def test_batch_pops_preserved_context():
+    app, batch = make_app()
+    app.testing = False
+    app.config['PRESERVE_CONTEXT_ON_EXCEPTION'] = True
+    assert app.test_client().get('/fail').status_code == 500
+    # a worker thread can find a context preserved by an earlier request.
+    assert keyes._request_ctx_stack.top.preserved
+    environ = app.test_request_context('/items/2').request.environ
+    rv = batch.dispatch(app, environ, app.make_null_session())
+    assert rv['status'] == 200
+    assert keyes._request_ctx_stack.top is None
+    assert keyes._app_ctx_stack.top is None
+
+
+def test_batch_shares_session():
+    app, batch = make_app()
+    c = app.test_client()
+    results, rv = post_batch(c, [
+        {'path': '/login', 'method': 'POST', 'json': {'user': 'john'}},
+        {'path': '/whoami'},
+    ])
+    assert [r['body'] for r in results] == ['ok', 'john']
+    assert 'Set-Cookie' not in results[0]['headers']
+    assert 'session=' in rv.headers['Set-Cookie']
+    assert c.get('/whoami').data == b'john'
+
+
+def test_batch_limits():
+    app, batch = make_app(max_requests=1)
+    c = app.test_client()
+    rv = c.post('/batch', data='{}', content_type='application/json')
+    assert rv.status_code == 400
+    rv = c.post('/batch', data=keyes.json.dumps([{'path': '/'}] * 2),
+                content_type='application/json')
+    assert rv.status_code == 400
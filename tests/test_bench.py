@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.bench
+    ~~~~~~~~~~~
+
+    Tests the in-process benchmark.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+
+import pytest
+
+import keyes
+from keyes.bench import Benchmark, find_get_routes, format_results, \
+     parse_server_timing, percentile
+from keyes.tracing import RequestTracer
+
+
+def make_app():
+    app = keyes.Keyes(__name__)
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    @app.route('/items/<int:id>')
+    def item(id):
+        return str(id)
+
+    @app.route('/fail')
+    def fail():
+        1 // 0
+
+    @app.route('/submit', methods=['POST'])
+    def submit():
+        return 'submitted'
+
+    return app
+
+
+def test_find_get_routes():
+    assert find_get_routes(make_app()) == ['/', '/fail']
+
+
+def test_parse_server_timing():
+    assert parse_server_timing('view;dur=1.5, cache;desc="Hit", '
+                               'total;dur="2"') == [('view', 1.5),
+                                                    ('total', 2.0)]
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1) == 100
+    assert percentile([], 0.5) is None
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_benchmark(processes):
+    if processes and not hasattr(os, 'fork'):
+        pytest.skip('requires os.fork')
+    app = make_app()
+    RequestTracer(app)
+    results = Benchmark(app, ['/', '/fail', '/items/1?x=y', '/missing'],
+                        requests=11, concurrency=2, processes=processes,
+                        warmup=1).run()
+    assert results['requests'] == 44
+    assert results['mode'] == (processes and 'processes' or 'threads')
+    index = results['paths']['/']
+    assert index['endpoint'] == 'index'
+    assert index['requests'] == 11
+    assert index['errors'] == 0
+    assert 0 < index['p50'] <= index['p99'] <= index['max']
+    assert 'view' in index['phases']
+    assert results['paths']['/fail']['errors'] == 11
+    assert results['paths']['/items/1?x=y']['endpoint'] == 'item'
+    assert results['paths']['/missing']['endpoint'] is None
+    assert '/items/1?x=y' in format_results(results)
@@ -18,8 +18,9 @@ import pytest
 from click.testing import CliRunner
 from keyes import Keyes, current_app
 
-from keyes.cli import AppGroup, KeyesGroup, NoAppException, ScriptInfo, \
-    find_best_app, locate_app, script_info_option, with_appcontext
+from keyes.cli import AppGroup, CommandIndex, KeyesGroup, NoAppException, \
+    ScriptInfo, find_best_app, locate_app, script_info_option, \
+    with_appcontext
 
 
 def test_cli_name(test_apps):
@@ -135,3 +136,82 @@ def test_keyesgroup():
     result = runner.invoke(cli, ['test'])
     assert result.exit_code == 0
     assert result.output == 'keyesgroup\n'
+
+
+def test_warmup_command():
+    """Test the warmup command."""
+    requested = []
+
+    def create_app(info):
+        app = Keyes("keyesgroup")
+
+        @app.route('/')
+        def index():
+            requested.append('/')
+            return 'index'
+
+        return app
+
+    @click.group(cls=KeyesGroup, create_app=create_app)
+    def cli(**params):
+        pass
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ['warmup', '/'])
+    assert result.exit_code == 0
+    assert 'warmed it up' in result.output
+    assert requested == ['/']
+
+
+def test_command_index(tmpdir, monkeypatch):
+    """Test listing and resolving app commands from the command index."""
+    import os
+    import sys
+    source = tmpdir.join('indexapp.py')
+    source.write(
+        'import click\n'
+        'from keyes import Keyes\n'
+        'app = Keyes("indexapp")\n'
+        '@app.cli.command(short_help="Says hello.")\n'
+        'def hello():\n'
+        '    click.echo("hello")\n'
+    )
+    os.utime(str(source), (1000, 1000))
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.delitem(sys.modules, 'indexapp', raising=False)
+    cache = tmpdir.join('cache')
+    monkeypatch.setattr(CommandIndex, 'cache_folder', str(cache))
+    cli = KeyesGroup()
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ['--app', 'indexapp', '--help'])
+    assert 'Says hello.' in result.output
+    index, = cache.listdir()
+    assert index.basename.startswith('commands-')
+
+    del sys.modules['indexapp']
+    result = runner.invoke(cli, ['--app', 'indexapp', '--help'])
+    assert 'Says hello.' in result.output
+    assert 'indexapp' not in sys.modules
+
+    result = runner.invoke(cli, ['--app', 'indexapp', 'hello'])
+    assert result.exit_code == 0
+    assert result.output == 'hello\n'
+    assert 'indexapp' in sys.modules
+
+    # a changed module makes the index stale
+    del sys.modules['indexapp']
+    source.write(source.read().replace('Says hello.', 'Greets.'))
+    os.utime(str(source), (2000, 2000))
+    result = runner.invoke(cli, ['--app', 'indexapp', '--help'])
+    assert 'Greets.' in result.output
+    assert 'indexapp' in sys.modules
+
+    # the commands are still listed if the index cannot be written
+    del sys.modules['indexapp']
+    cache.remove()
+    cache.write('not a folder')
+    result = runner.invoke(cli, ['--app', 'indexapp', '--help'])
+    assert result.exit_code == 0
+    assert 'Greets.' in result.output
+    assert cache.read() == 'not a folder'
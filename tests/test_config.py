@@ -187,3 +187,154 @@ def test_get_namespace():
     assert 2 == len(bar_options)
     assert 'bar stuff 1' == bar_options['BAR_STUFF_1']
     assert 'bar stuff 2' == bar_options['BAR_STUFF_2']
+
+
+def test_config_snapshot():
+    app = keyes.Keyes(__name__)
+    app.config['FOO'] = 42
+    app.config['lower-case key'] = 'skipped'
+    app.config[u'UNICODE_KEY'] = 'unicode'
+    snapshot = app.config.freeze()
+    assert snapshot.FOO == 42
+    assert snapshot.UNICODE_KEY == 'unicode'
+    assert snapshot['FOO'] == 42
+    assert snapshot.get('MISSING', 23) == 23
+    assert 'FOO' in snapshot
+    assert 'lower-case key' not in snapshot
+    assert snapshot.to_dict()['SERVER_NAME'] is None
+    with pytest.raises(KeyError):
+        snapshot['MISSING']
+    with pytest.raises(AttributeError):
+        snapshot.FOO = 23
+    for change in (lambda: app.config.__setitem__('FOO', 23),
+                   lambda: app.config.update(FOO=23),
+                   lambda: app.config.pop('FOO'),
+                   lambda: app.config.setdefault('BAR', 23)):
+        with pytest.raises(RuntimeError):
+            change()
+    assert app.config.setdefault('FOO', 23) == 42
+    app.config.thaw()
+    app.config['FOO'] = 23
+    assert snapshot.FOO == 42
+
+
+def test_freeze_config_before_first_request():
+    app = keyes.Keyes(__name__)
+    app.config['FREEZE_CONFIG'] = True
+
+    @app.route('/')
+    def index():
+        return keyes.jsonify(debug=keyes.current_app.debug)
+
+    assert app.config_snapshot is None
+    assert app._config_view is app.config
+    assert app.test_client().get('/').status_code == 200
+    assert app.config_snapshot.FREEZE_CONFIG is True
+    assert app._config_view is app.config_snapshot
+    with pytest.raises(RuntimeError):
+        app.debug = True
+    app.unfreeze_config()
+    assert app.config_snapshot is None
+    app.debug = True
+    app.freeze_config()
+    assert app.config_snapshot.DEBUG is True
+    assert app.debug is True
+
+
+def test_frozen_config_hot_paths():
+    app = keyes.Keyes(__name__)
+    app.secret_key = 'secret'
+    app.config['FAST_ROUTING_ERRORS'] = True
+
+    @app.route('/')
+    def index():
+        keyes.session['user'] = 'john'
+        return keyes.jsonify(page=keyes.render_template('simple_template.html',
+                                                        whiskey=42))
+
+    app.freeze_config()
+    read = set()
+
+    class RecordingConfig(dict):
+        def __getitem__(self, key):
+            read.add(key)
+            return dict.__getitem__(self, key)
+
+    app.config = RecordingConfig(app.config)
+    c = app.test_client()
+    rv = c.get('/')
+    assert rv.status_code == 200
+    assert 'session=' in rv.headers['Set-Cookie']
+    assert c.get('/missing').status_code == 404
+    assert not read & set(['SESSION_COOKIE_DOMAIN', 'SESSION_COOKIE_PATH',
+                           'SESSION_COOKIE_HTTPONLY', 'SESSION_COOKIE_SECURE',
+                           'SESSION_REFRESH_EACH_REQUEST', 'SERVER_NAME',
+                           'APPLICATION_ROOT', 'JSONIFY_PRETTYPRINT_REGULAR',
+                           'EXPLAIN_TEMPLATE_LOADING', 'FAST_ROUTING_ERRORS',
+                           'JSONIFY_MIMETYPE', 'PREFERRED_URL_SCHEME'])
+
+
+def test_from_prefixed_env():
+    app = keyes.Keyes(__name__)
+    app.config['DATABASE'] = {'HOST': 'localhost', 'PORT': 5432}
+    app.config.from_prefixed_env(environ={
+        'KEYES_DEBUG': 'yes',
+        'KEYES_SECRET_KEY': '123',
+        'KEYES_SERVER_NAME': 'null',
+        'KEYES_MAX_CONTENT_LENGTH': '[1]',
+        'KEYES_JSON_SORT_KEYS': 'off',
+        'KEYES_SEND_FILE_MAX_AGE_DEFAULT': '60',
+        'KEYES_CACHE_TIMEOUT': '300',
+        'KEYES_CACHE_TYPE': 'redis',
+        'KEYES_DATABASE__PORT': '5433',
+        'KEYES_DATABASE__OPTIONS__SSL': 'true',
+        'OTHER_DEBUG': '0',
+    })
+    assert app.config['DEBUG'] is True
+    assert app.config['SECRET_KEY'] == '123'
+    assert app.config['SERVER_NAME'] == 'null'
+    assert app.config['MAX_CONTENT_LENGTH'] == [1]
+    assert app.config['JSON_SORT_KEYS'] is False
+    assert app.config['SEND_FILE_MAX_AGE_DEFAULT'] == timedelta(seconds=60)
+    assert app.config.get_namespace('CACHE_') == {'timeout': 300,
+                                                   'type': 'redis'}
+    assert app.config['DATABASE'] == {'HOST': 'localhost', 'PORT': 5433,
+                                      'OPTIONS': {'SSL': True}}
+
+    app.config['SESSION_COOKIE_NAME'] = 'session'
+    app.config.from_prefixed_env('MYAPP', environ={
+        'MYAPP_SESSION_COOKIE_NAME': '42'})
+    assert app.config['SESSION_COOKIE_NAME'] == '42'
+
+    app = keyes.Keyes(__name__)
+    app.config.from_prefixed_env(environ={
+        'KEYES_SECRET_KEY': 'abc123',
+        'KEYES_SERVER_NAME': 'example.com',
+        'KEYES_APPLICATION_ROOT': '/app',
+        'KEYES_MAX_CONTENT_LENGTH': '1024',
+    })
+    assert app.config['SECRET_KEY'] == 'abc123'
+    assert app.config['SERVER_NAME'] == 'example.com'
+    assert app.config['APPLICATION_ROOT'] == '/app'
+    assert app.config['MAX_CONTENT_LENGTH'] == 1024
+
+    with pytest.raises(ValueError) as excinfo:
+        app.config.from_prefixed_env(environ={'KEYES_TESTING': 'maybe'})
+    assert 'KEYES_TESTING' in str(excinfo.value)
+    with pytest.raises(ValueError):
+        app.config.from_prefixed_env(environ={'KEYES_DEBUG__X': '1'})
+
+
+def test_from_prefixed_env_numeric_secret_key():
+    app = keyes.Keyes(__name__)
+    app.config.from_prefixed_env(environ={'KEYES_SECRET_KEY': '1234567890'})
+    assert app.config['SECRET_KEY'] == '1234567890'
+
+    @app.route('/')
+    def index():
+        keyes.session['user'] = 'john'
+        return 'ok'
+
+    rv = app.test_client().get('/')
+    assert rv.status_code == 200
+    assert 'session=' in rv.headers['Set-Cookie']
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.configwatch
+    ~~~~~~~~~~~~~~~~~
+
+    Tests reloading the config when its files change.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+
+import keyes
+from keyes.configwatch import ConfigWatcher
+
+
+def write(path, source, mtime):
+    path.write(source)
+    os.utime(str(path), (mtime, mtime))
+
+
+def make_app(tmpdir):
+    app = keyes.Keyes(__name__)
+    settings = tmpdir.join('settings.py')
+    write(settings, 'CACHE_SIZE = 10\nNAME = "a"\n', 1000)
+    app.config.from_pyfile(str(settings))
+    app.config.from_json(str(tmpdir.join('missing.json')), silent=True)
+    app.config['SET_IN_CODE'] = True
+
+    @app.route('/')
+    def index():
+        return keyes.jsonify(size=keyes.current_app.config['CACHE_SIZE'])
+
+    return app, settings
+
+
+def test_reload_on_change(tmpdir):
+    app, settings = make_app(tmpdir)
+    watcher = ConfigWatcher(app, interval=0)
+    assert app.config_watcher is watcher
+    calls = []
+    watcher.connect(lambda app, changed: calls.append(('all', changed)))
+
+    @watcher.connect(keys=['NAME'])
+    def name_changed(app, changed):
+        calls.append(('name', changed))
+
+    c = app.test_client()
+    assert keyes.json.loads(c.get('/').data)['size'] == 10
+    old_config = app.config
+    write(settings, 'CACHE_SIZE = 20\nNAME = "a"\n', 2000)
+    assert keyes.json.loads(c.get('/').data)['size'] == 20
+    assert app.config is not old_config
+    assert old_config['CACHE_SIZE'] == 10
+    assert app.config['SET_IN_CODE'] is True
+    assert calls == [('all', set(['CACHE_SIZE']))]
+
+    tmpdir.join('missing.json').write('{"NAME": "b"}')
+    assert watcher.poll() == set(['NAME'])
+    assert [name for name, changed in calls] == ['all', 'all', 'name']
+    assert len(app.config.sources) == 2
+    assert watcher.poll() is None
+
+
+def test_reload_keeps_config_on_error(tmpdir):
+    app, settings = make_app(tmpdir)
+    watcher = ConfigWatcher(app, interval=0)
+    old_config = app.config
+    write(settings, 'CACHE_SIZE = (\n', 2000)
+    assert watcher.poll() is None
+    assert app.config is old_config
+
+
+def test_reload_refreezes_config(tmpdir):
+    app, settings = make_app(tmpdir)
+    watcher = ConfigWatcher(app, interval=3600)
+    app.freeze_config()
+    write(settings, 'CACHE_SIZE = 20\nNAME = "a"\n', 2000)
+    assert watcher.poll() is None
+    assert watcher.reload() == set(['CACHE_SIZE'])
+    assert app.config.frozen
+    assert app.config_snapshot.CACHE_SIZE == 20
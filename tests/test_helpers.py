@@ -14,7 +14,7 @@ import pytest
 import os
 import datetime
 import keyes
-from logging import StreamHandler
+from logging import StreamHandler, getLogger
 from werkzeug.exceptions import BadRequest
 from werkzeug.http import parse_cache_control_header, parse_options_header
 from werkzeug.http import http_date
@@ -600,6 +600,128 @@ class TestLogging(object):
             assert rv.status_code == 500
             assert rv.data == b'Hello Server Error'
 
+    def test_queued_logging_writes_to_wsgi_errors(self):
+        app = keyes.Keyes(__name__)
+        app.config['LOGGER_QUEUE_SIZE'] = 10
+        app.logger_name = 'keyes_tests/test_queued_logging'
+        errors = StringIO()
+
+        @app.route('/')
+        def index():
+            1 // 0
+
+        rv = app.test_client().get('/', errors_stream=errors)
+        assert rv.status_code == 500
+        handler, = app.logger.handlers
+        assert isinstance(handler, keyes.logging.QueueingHandler)
+        handler.close()
+
+        err = errors.getvalue()
+        assert 'Exception on / [GET]' in err
+        assert 'ZeroDivisionError' in err
+        assert handler.queued == handler.handled == 1
+        assert handler.dropped == 0
+
+    def test_queued_logging_closed_wsgi_errors(self, capsys):
+        app = keyes.Keyes(__name__)
+        app.config['LOGGER_QUEUE_SIZE'] = 10
+        app.logger_name = 'keyes_tests/test_queued_logging_closed'
+        errors = StringIO()
+
+        @app.route('/')
+        def index():
+            1 // 0
+
+        handler, = app.logger.handlers
+        prod_handler = handler.handlers[1]
+        prod_handler.acquire()
+        try:
+            rv = app.test_client().get('/', errors_stream=errors)
+            assert rv.status_code == 500
+            errors.close()
+        finally:
+            prod_handler.release()
+        handler.close()
+        assert handler.handled == 1
+        err = capsys.readouterr()[1]
+        assert 'Exception on / [GET]' in err
+        assert 'Logging error' not in err
+
+    def test_queued_logging_closes_listeners_at_exit(self):
+        from keyes.logging import create_logger, _running_handlers
+        app = keyes.Keyes(__name__)
+        app.config['LOGGER_QUEUE_SIZE'] = 10
+        app.logger_name = 'keyes_tests/test_queued_logging_exit'
+        handler, = app.logger.handlers
+        app.logger.error('started')
+        assert handler in _running_handlers
+        new_handler, = create_logger(app).handlers
+        assert handler not in _running_handlers
+        new_handler.close()
+        assert new_handler not in _running_handlers
+
+    def test_queued_logging_overflow(self):
+        from keyes.logging import QueueingHandler
+        out = StringIO()
+        target = StreamHandler(out)
+        handler = QueueingHandler([target], maxsize=1, overflow='drop')
+        handler._ensure_listener()
+        target.acquire()
+        try:
+            logger = getLogger('keyes_tests/test_overflow')
+            logger.propagate = False
+            logger.addHandler(handler)
+            for x in range(5):
+                logger.error('message %d', x)
+        finally:
+            target.release()
+        handler.close()
+        logger.removeHandler(handler)
+        assert handler.queued + handler.dropped == 5
+        assert handler.dropped >= 3
+        assert 'message 0' in out.getvalue()
+
+        pytest.raises(ValueError, QueueingHandler, [target],
+                      overflow='explode')
+
+    def test_queued_logging_keeps_records_for_parents(self):
+        from logging import Handler
+        from keyes.logging import QueueingHandler
+
+        class Recorder(Handler):
+            def __init__(self):
+                Handler.__init__(self)
+                self.records = []
+
+            def emit(self, record):
+                self.records.append((record.msg, record.args,
+                                     record.exc_info))
+
+        out = StringIO()
+        parent = getLogger('keyes_tests/parent')
+        parent.propagate = False
+        recorder = Recorder()
+        parent.addHandler(recorder)
+        logger = getLogger('keyes_tests/parent.child')
+        handler = QueueingHandler([StreamHandler(out)])
+        logger.addHandler(handler)
+        try:
+            try:
+                1 // 0
+            except ZeroDivisionError:
+                logger.exception('boom %s', 'x')
+        finally:
+            handler.close()
+            logger.removeHandler(handler)
+            parent.removeHandler(recorder)
+
+        (msg, args, exc_info), = recorder.records
+        assert msg == 'boom %s'
+        assert args == ('x',)
+        assert exc_info[0] is ZeroDivisionError
+        assert 'boom x' in out.getvalue()
+        assert 'ZeroDivisionError' in out.getvalue()
+
     def test_url_for_with_anchor(self):
         app = keyes.Keyes(__name__)
         @app.route('/')
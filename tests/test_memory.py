@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.memory
+    ~~~~~~~~~~~~
+
+    Tests the request memory tracker.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import linecache
+
+import pytest
+
+import keyes
+
+tracemalloc = pytest.importorskip('tracemalloc')
+
+from keyes.memory import MemoryTracker
+
+
+def test_memory_tracker_records_retained_allocations():
+    app = keyes.Keyes(__name__)
+    reported = []
+    leak = []
+
+    class Tracker(MemoryTracker):
+        def report(self, request, peak, retained, statistics):
+            reported.append((request.endpoint, retained, statistics))
+
+    tracker = Tracker(app, sample_rate=0, endpoints=['leaky'],
+                      threshold=512 * 1024)
+
+    @app.route('/leaky')
+    def leaky():
+        leak.append(b'x' * (1024 * 1024))
+        return 'leaked'
+
+    @app.route('/clean')
+    def clean():
+        b'y' * (1024 * 1024)
+        return 'clean'
+
+    c = app.test_client()
+    assert c.get('/leaky').data == b'leaked'
+    assert c.get('/clean').data == b'clean'
+    assert not tracemalloc.is_tracing()
+
+    stats = tracker.get_stats()
+    assert list(stats) == ['leaky']
+    assert stats['leaky'].count == 1
+    assert stats['leaky'].retained_max >= 1024 * 1024
+    assert stats['leaky'].peak_max >= stats['leaky'].retained_max
+
+    assert len(reported) == 1
+    endpoint, retained, statistics = reported[0]
+    assert endpoint == 'leaky'
+    assert statistics[0].traceback[0].filename == __file__.rstrip('c')
+
+
+def test_memory_tracker_peak_without_retention():
+    app = keyes.Keyes(__name__)
+    tracker = MemoryTracker(app, sample_rate=1)
+
+    @app.route('/')
+    def index():
+        b'y' * (1024 * 1024)
+        return 'ok'
+
+    app.test_client().get('/')
+    stats = tracker.get_stats()['index']
+    assert stats.peak_max >= 1024 * 1024
+    assert stats.retained_max < 1024 * 1024
+
+
+def test_memory_tracker_ignores_earlier_allocations():
+    app = keyes.Keyes(__name__)
+    reported = []
+
+    class Tracker(MemoryTracker):
+        def report(self, request, peak, retained, statistics):
+            reported.append(statistics)
+
+    Tracker(app, sample_rate=1, threshold=512 * 1024)
+    leak = []
+
+    @app.route('/')
+    def index():
+        leak.append(b'x' * (1024 * 1024))
+        return 'leaked'
+
+    tracemalloc.start()
+    try:
+        earlier = [b'e' * 1024 for x in range(2048)]
+        app.test_client().get('/')
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+    statistics, = reported
+    assert statistics[0].size_diff >= 1024 * 1024
+    lines = [linecache.getline(stat.traceback[0].filename,
+                               stat.traceback[0].lineno)
+             for stat in statistics]
+    assert 'leak.append' in lines[0]
+    assert not any('earlier' in line for line in lines)
+    assert earlier
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.metrics
+    ~~~~~~~~~~~~~
+
+    Tests the request metrics.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import pytest
+
+from threading import Thread
+
+import keyes
+from keyes.metrics import RequestMetrics
+
+
+def test_metrics_record_endpoint_and_status():
+    app = keyes.Keyes(__name__)
+    metrics = RequestMetrics(app, buckets=(0.5, 1.0))
+
+    @app.route('/')
+    def index():
+        return 'Hello World'
+
+    @app.route('/fail')
+    def fail():
+        keyes.abort(403)
+
+    c = app.test_client()
+    c.get('/')
+    c.get('/')
+    c.post('/fail', data='x' * 10)
+    c.get('/fail')
+    c.get('/missing')
+
+    series, in_flight = metrics.collect()
+    assert in_flight == 0
+    assert series[('index', 200)]['count'] == 2
+    assert series[('index', 200)]['response_bytes'] == 22
+    assert series[('index', 200)]['buckets'][-1] == (float('inf'), 2)
+    assert series[(None, 405)]['request_bytes'] == 10
+    assert series[('fail', 403)]['count'] == 1
+    assert series[(None, 404)]['count'] == 1
+
+
+def test_metrics_unhandled_exception():
+    app = keyes.Keyes(__name__)
+    metrics = RequestMetrics(app)
+
+    @app.route('/')
+    def index():
+        1 // 0
+
+    app.testing = True
+    with pytest.raises(ZeroDivisionError):
+        app.test_client().get('/')
+    series, in_flight = metrics.collect()
+    assert in_flight == 0
+    assert series[('index', 500)]['count'] == 1
+
+
+def test_metrics_response_sizes():
+    app = keyes.Keyes(__name__)
+    metrics = RequestMetrics(app)
+
+    @app.route('/stream')
+    def stream():
+        return app.response_class(iter([b'a', b'bc']))
+
+    @app.route('/sized')
+    def sized():
+        return app.response_class(iter([b'abc']),
+                                  headers={'Content-Length': '3'})
+
+    c = app.test_client()
+    c.get('/stream')
+    c.get('/sized')
+    c.post('/sized', headers={'Content-Length': 'nonsense'})
+    series, in_flight = metrics.collect()
+    assert series[('stream', 200)]['response_bytes'] == 0
+    assert series[('sized', 200)]['response_bytes'] == 3
+    assert series[(None, 405)]['request_bytes'] == 0
+
+
+def test_metrics_merge_threads():
+    app = keyes.Keyes(__name__)
+    metrics = RequestMetrics(app)
+
+    @app.route('/')
+    def index():
+        return 'Hello World'
+
+    def worker():
+        c = app.test_client()
+        for x in range(5):
+            c.get('/')
+
+    threads = [Thread(target=worker) for x in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    app.test_client().get('/')
+    series, in_flight = metrics.collect()
+    assert series[('index', 200)]['count'] == 21
+
+
+def test_metrics_prometheus_endpoint():
+    app = keyes.Keyes(__name__)
+    RequestMetrics(app, buckets=(0.1,), url='/metrics')
+
+    @app.route('/')
+    def index():
+        return 'Hello World'
+
+    c = app.test_client()
+    c.get('/')
+    rv = c.get('/metrics')
+    assert rv.mimetype == 'text/plain'
+    lines = rv.data.decode('utf-8').splitlines()
+    assert '# TYPE keyes_request_duration_seconds histogram' in lines
+    assert 'keyes_request_duration_seconds_count' \
+        '{endpoint="index",status="200"} 1' in lines
+    assert 'keyes_request_duration_seconds_bucket' \
+        '{endpoint="index",status="200",le="+Inf"} 1' in lines
+    assert 'keyes_response_size_bytes_total' \
+        '{endpoint="index",status="200"} 11' in lines
+    assert 'keyes_requests_in_flight 1' in lines
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.prefork
+    ~~~~~~~~~~~~~
+
+    Tests the preforking server.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import signal
+import time
+
+import pytest
+
+import keyes
+from keyes._compat import PY2
+
+if PY2:
+    from urllib2 import urlopen
+else:
+    from urllib.request import urlopen
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'),
+                                reason='requires os.fork')
+
+
+def start_server(**options):
+    from keyes.prefork import PreforkServer
+    app = keyes.Keyes(__name__)
+    warmed_up = []
+    app.before_first_request(lambda: warmed_up.append(os.getpid()))
+
+    @app.route('/')
+    def index():
+        return '%d %s' % (os.getpid(), warmed_up)
+
+    server = PreforkServer(app, port=0, **options)
+    server.bind()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            server.serve()
+        finally:
+            os._exit(0)
+    server.socket.close()
+    return pid, 'http://127.0.0.1:%d/' % server.port
+
+
+def fetch(url):
+    for x in range(50):
+        try:
+            return urlopen(url, timeout=5).read().decode('ascii').split(' ', 1)
+        except IOError:
+            time.sleep(0.1)
+    raise AssertionError('server did not answer')
+
+
+def test_prefork_server():
+    master, url = start_server(workers=1, max_requests=1)
+    try:
+        worker, warmed_up = fetch(url)
+        assert int(worker) != master
+        # before first request functions ran in the master.
+        assert warmed_up == '[%d]' % master
+        # the worker exited after one request and was replaced.
+        assert fetch(url)[0] != worker
+    finally:
+        os.kill(master, signal.SIGTERM)
+        assert os.waitpid(master, 0)[1] == 0
+
+
+def test_prefork_server_reload():
+    master, url = start_server(workers=1)
+    try:
+        worker = fetch(url)[0]
+        assert fetch(url)[0] == worker
+        os.kill(master, signal.SIGHUP)
+        for x in range(50):
+            if fetch(url)[0] != worker:
+                break
+            time.sleep(0.1)
+        else:
+            raise AssertionError('worker was not replaced')
+    finally:
+        os.kill(master, signal.SIGTERM)
+        os.waitpid(master, 0)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.profiling
+    ~~~~~~~~~~~~~~~
+
+    Tests the sampling request profiler.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import time
+
+import pytest
+from click.testing import CliRunner
+
+import keyes
+from keyes.cli import ScriptInfo, profile_command
+from keyes.profiling import RequestProfiler, merge_profiles
+
+
+def make_app(tmpdir, **options):
+    app = keyes.Keyes(__name__, instance_path=str(tmpdir))
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(0.05)
+        return 'slow'
+
+    profiler = RequestProfiler(app, **options)
+    return app, profiler
+
+
+def test_profiler_sampling(tmpdir):
+    app, profiler = make_app(tmpdir, sample_rate=0, endpoints=['slow'],
+                             header='X-Profile')
+    with app.test_request_context('/'):
+        assert not profiler.should_profile(keyes.request)
+    with app.test_request_context('/', headers={'X-Profile': '1'}):
+        assert profiler.should_profile(keyes.request)
+    with app.test_request_context('/slow'):
+        assert profiler.should_profile(keyes.request)
+
+    profiler.sampler.sample_rate = 1
+    with app.test_request_context('/'):
+        assert profiler.should_profile(keyes.request)
+
+
+def test_cprofile_mode_writes_per_endpoint(tmpdir):
+    app, profiler = make_app(tmpdir, sample_rate=1, flush_every=2)
+    assert profiler.output_dir == os.path.join(str(tmpdir), 'profiles')
+
+    c = app.test_client()
+    assert c.get('/').data == b'index'
+    assert c.get('/slow').data == b'slow'
+    files = os.listdir(profiler.output_dir)
+    assert sorted(f.split('.')[0] for f in files) == ['index', 'slow']
+    assert all(f.endswith('.pstats') for f in files)
+
+    merged = merge_profiles(profiler.output_dir, endpoint='slow')
+    assert list(merged) == [('slow', '.pstats')]
+    functions = [func[2] for func in merged[('slow', '.pstats')].stats]
+    assert 'slow' in functions
+
+
+def test_stack_mode_writes_collapsed_stacks(tmpdir):
+    app, profiler = make_app(tmpdir, sample_rate=1, mode='stack',
+                             interval=0.001)
+    app.test_client().get('/slow')
+    profiler.flush()
+
+    merged = merge_profiles(profiler.output_dir)
+    counts = merged[('slow', '.collapsed')]
+    assert counts
+    assert any(stack.split(';')[-1] == 'time:sleep' or
+               ':slow' in stack for stack in counts)
+
+
+def test_invalid_mode():
+    pytest.raises(ValueError, RequestProfiler, mode='magic')
+
+
+def test_profile_command(tmpdir):
+    app, profiler = make_app(tmpdir, sample_rate=1)
+    app.test_client().get('/slow')
+    profiler.flush()
+
+    output = tmpdir.join('merged')
+    obj = ScriptInfo(create_app=lambda info: app)
+    result = CliRunner().invoke(profile_command, ['-o', str(output)],
+                                obj=obj)
+    assert result.exit_code == 0, result.output
+    assert '=== slow (pstats) ===' in result.output
+    assert output.join('slow.pstats').check()
+
+    result = CliRunner().invoke(profile_command, ['-e', 'missing'], obj=obj)
+    assert result.exit_code != 0
+    assert 'No profiles found' in result.output
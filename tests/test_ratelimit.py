@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.ratelimit
+    ~~~~~~~~~~~~~~~
+
+    Tests the token bucket rate limiter.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import pytest
+
+import keyes
+from keyes.ratelimit import RateLimiter, Limit, MemoryStorage, \
+     SQLiteStorage, header_key
+
+
+def make_app(**options):
+    app = keyes.Keyes(__name__)
+    limiter = RateLimiter(**options)
+    bp = keyes.Blueprint('api', __name__)
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    @app.route('/login')
+    @limiter.limit(2, 60)
+    def login():
+        return 'login'
+
+    @bp.route('/api')
+    def api():
+        return 'api'
+
+    limiter.limit_blueprint(bp, 1, 60, key_func=header_key('X-Api-Key'))
+    app.register_blueprint(bp)
+    limiter.init_app(app)
+    return app, limiter
+
+
+def test_view_and_blueprint_limits():
+    app, limiter = make_app()
+    c = app.test_client()
+    for x in range(5):
+        assert c.get('/').status_code == 200
+    assert c.get('/login').status_code == 200
+    assert c.get('/login').status_code == 200
+    rv = c.get('/login')
+    assert rv.status_code == 429
+    assert 0 < int(rv.headers['Retry-After']) <= 30
+
+    assert c.get('/api', headers={'X-Api-Key': 'a'}).status_code == 200
+    assert c.get('/api', headers={'X-Api-Key': 'a'}).status_code == 429
+    assert c.get('/api', headers={'X-Api-Key': 'b'}).status_code == 200
+
+
+def test_default_limit():
+    app, limiter = make_app(default=(3, 60))
+    c = app.test_client()
+    assert [c.get('/').status_code for x in range(4)] == [200, 200, 200, 429]
+    rv = c.get('/', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert rv.status_code == 200
+
+
+@pytest.mark.parametrize('make_storage', [
+    lambda tmpdir: MemoryStorage(eviction_interval=10),
+    lambda tmpdir: SQLiteStorage(str(tmpdir.join('limits.db')),
+                                 eviction_interval=10),
+])
+def test_storage_refills_and_evicts(tmpdir, make_storage):
+    storage = make_storage(tmpdir)
+    limit = Limit(2, 10)
+    consume = lambda now: storage.consume('key', limit.interval,
+                                          limit.tolerance, now)
+    assert consume(0) == 0
+    assert consume(0) == 0
+    assert consume(1) == 4
+    assert consume(5) == 0
+    assert consume(5) == 5
+
+    storage.evict(100)
+    assert consume(100) == 0
+    assert consume(100) == 0
+    assert consume(100) == 5
+
+
+@pytest.mark.parametrize('make_storage', [
+    lambda tmpdir: MemoryStorage(),
+    lambda tmpdir: SQLiteStorage(str(tmpdir.join('limits.db'))),
+])
+@pytest.mark.parametrize('count, period', [(10, 1), (3, 1), (7, 3),
+                                           (100, 60)])
+def test_storage_inexact_intervals(tmpdir, make_storage, count, period):
+    storage = make_storage(tmpdir)
+    limit = Limit(count, period)
+    for now in 0, 1445000000.25:
+        key = 'key-%s' % now
+        consume = lambda now: storage.consume(key, limit.interval,
+                                              limit.tolerance, now)
+        assert [consume(now) for x in range(count)] == [0] * count
+        assert consume(now) > 0
+        # after one interval exactly one more request is allowed.
+        later = now + limit.interval
+        assert consume(later) == 0
+        assert consume(later) > 0
+
+
+def test_sqlite_storage_is_shared(tmpdir):
+    filename = str(tmpdir.join('limits.db'))
+    first = SQLiteStorage(filename)
+    second = SQLiteStorage(filename)
+    assert first.consume('key', 10, 10, 0) == 0
+    assert second.consume('key', 10, 10, 0) == 10
+
+
+def test_memory_storage_eviction():
+    storage = MemoryStorage(eviction_interval=10)
+    storage.consume('a', 1, 5, 0)
+    storage.consume('b', 100, 500, 0)
+    assert len(storage) == 2
+    storage.consume('c', 1, 5, 20)
+    assert len(storage) == 2
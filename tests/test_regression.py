@@ -100,3 +100,24 @@ def test_aborting():
         assert rv.headers['Location'] == 'http://localhost/test'
         rv = c.get('/test')
         assert rv.data == b'42'
+
+
+def test_lazy_imports():
+    import subprocess
+    source = (
+        'import sys, keyes\n'
+        'assert [m for m in sys.modules if m.startswith("keyes.")] == []\n'
+        'app = keyes.Keyes("app")\n'
+        'assert "click" not in sys.modules\n'
+        'assert keyes.Session is keyes.sessions.SecureCookieSession\n'
+        'app.cli\n'
+        'assert "click" in sys.modules\n'
+    )
+    subprocess.check_call([sys.executable, '-c', source])
+    source = (
+        'import sys\n'
+        'from keyes import *\n'
+        'assert "click" not in sys.modules\n'
+        'assert "keyes.cli" not in sys.modules\n'
+    )
+    subprocess.check_call([sys.executable, '-c', source])
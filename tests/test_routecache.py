@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.routecache
+    ~~~~~~~~~~~~~~~~
+
+    Tests storing the compiled URL rules in a file.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import pickle
+
+from werkzeug.routing import Rule
+
+import keyes
+from keyes.routecache import RouteCache, CachedRule, LazyPattern
+
+
+def make_app(filename, extra_route=False):
+    app = keyes.Keyes(__name__)
+    cache = RouteCache(app, filename=filename)
+    bp = keyes.Blueprint('items', __name__, url_prefix='/items')
+
+    @bp.route('/<int:id>', methods=['GET', 'POST'])
+    def item(id):
+        return 'item %d %s' % (id, keyes.url_for('.item', id=id + 1))
+
+    @bp.route('/<name>/')
+    def named(name):
+        return 'named %s' % name
+
+    app.register_blueprint(bp)
+
+    if extra_route:
+        @app.route('/extra')
+        def extra():
+            return 'extra'
+
+    return app, cache
+
+
+def test_route_cache(tmpdir):
+    filename = str(tmpdir.join('url_map.cache'))
+    app, cache = make_app(filename)
+    assert app.url_rule_class is CachedRule
+    assert cache.hits == 0
+    assert cache.misses == 2
+    assert not tmpdir.join('url_map.cache').check()
+
+    c = app.test_client()
+    assert c.get('/items/1').data == b'item 1 /items/2'
+    assert tmpdir.join('url_map.cache').check()
+    assert cache.misses == 0
+
+    app, cache = make_app(filename)
+    assert cache.hits == 2
+    assert cache.misses == 0
+    rules = dict((rule.endpoint, rule) for rule in app.url_map.iter_rules())
+    assert isinstance(rules['items.item']._regex, LazyPattern)
+    assert rules['items.item'].map is app.url_map
+    assert rules['items.item']._converters['id'].map is app.url_map
+    assert rules['items.item'].allowed_methods == \
+        frozenset(['GET', 'HEAD', 'POST', 'OPTIONS'])
+
+    c = app.test_client()
+    assert c.get('/items/1').data == b'item 1 /items/2'
+    assert c.post('/items/3').data == b'item 3 /items/4'
+    assert c.get('/items/1/2').status_code == 404
+    rv = c.get('/items/spam')
+    assert rv.status_code == 301
+    assert rv.headers['Location'] == 'http://localhost/items/spam/'
+    assert c.get('/items/spam/').data == b'named spam'
+    rv = c.open('/items/spam/', method='OPTIONS')
+    assert sorted(rv.allow) == ['GET', 'HEAD', 'OPTIONS']
+    with app.test_request_context():
+        assert keyes.url_for('items.named', name='a') == '/items/a/'
+
+
+def test_route_cache_missing_rules(tmpdir):
+    filename = str(tmpdir.join('url_map.cache'))
+    app, cache = make_app(filename)
+    app.test_client().get('/')
+
+    app, cache = make_app(filename, extra_route=True)
+    assert cache.hits == 2
+    assert cache.misses == 1
+    c = app.test_client()
+    assert c.get('/extra').data == b'extra'
+
+    app, cache = make_app(filename, extra_route=True)
+    assert cache.hits == 3
+    assert cache.misses == 0
+
+
+def test_route_cache_ignores_other_versions(tmpdir):
+    filename = str(tmpdir.join('url_map.cache'))
+    app, cache = make_app(filename)
+    app.test_client().get('/')
+
+    with open(filename, 'rb') as f:
+        header, rules = pickle.load(f)
+    header['werkzeug'] = '0.1'
+    with open(filename, 'wb') as f:
+        pickle.dump((header, rules), f)
+    app, cache = make_app(filename)
+    assert cache.hits == 0
+    assert cache.misses == 2
+
+    tmpdir.join('url_map.cache').write('garbage')
+    app, cache = make_app(filename)
+    assert cache.hits == 0
+    assert app.test_client().get('/items/1').status_code == 200
+
+
+def test_route_cache_custom_rule_class(tmpdir):
+    class MyRule(Rule):
+        pass
+
+    app = keyes.Keyes(__name__)
+    app.url_rule_class = MyRule
+    cache = RouteCache(app, filename=str(tmpdir.join('url_map.cache')))
+    assert app.url_rule_class is MyRule
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    assert cache.misses == 1
+    assert app.test_client().get('/').data == b'index'
+    with open(cache.filename, 'rb') as f:
+        assert pickle.load(f)[1] == []
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.sse
+    ~~~~~~~~~
+
+    Tests the server-sent event streams.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import pytest
+
+import keyes
+from keyes.sse import Event, EventPublisher, EventStream
+
+
+def test_event_encoding():
+    assert Event('hello').encode() == b'data: hello\n\n'
+    assert Event('a\nb', event='update', id=3, retry=100).encode() == \
+        b'id: 3\nevent: update\nretry: 100\ndata: a\ndata: b\n\n'
+    assert Event({'x': 1}).encode() == b'data: {"x": 1}\n\n'
+    for kwargs in {'event': 'a\ndata: b'}, {'id': '1\r2'}:
+        with pytest.raises(ValueError):
+            Event('x', **kwargs)
+
+
+def test_event_stream_from_iterable():
+    app = keyes.Keyes(__name__)
+
+    @app.route('/')
+    def index():
+        return EventStream(['a', Event('b', id=1)], retry=500)
+
+    rv = app.test_client().get('/')
+    assert rv.mimetype == 'text/event-stream'
+    assert rv.headers['Cache-Control'] == 'no-cache'
+    assert rv.data == b'retry: 500\n\ndata: a\n\nid: 1\ndata: b\n\n'
+
+
+def test_publisher_stream_heartbeat_resume_and_teardown():
+    app = keyes.Keyes(__name__)
+    publisher = EventPublisher(history=10, queue_size=10)
+    torn_down = []
+
+    @app.teardown_request
+    def teardown(exc):
+        torn_down.append(keyes.request.path)
+
+    @app.route('/events')
+    def events():
+        return EventStream(publisher, heartbeat=0.01)
+
+    for x in range(3):
+        publisher.publish('event %d' % x)
+
+    c = app.test_client()
+    rv = c.get('/events', headers={'Last-Event-ID': '1'}, buffered=False)
+    chunks = iter(rv.response)
+    assert next(chunks) == b'id: 2\ndata: event 1\n\n'
+    assert next(chunks) == b'id: 3\ndata: event 2\n\n'
+    assert next(chunks) == b': heartbeat\n\n'
+    assert len(publisher) == 1
+    publisher.publish('live')
+    assert next(chunks) == b'id: 4\ndata: live\n\n'
+    assert torn_down == []
+
+    rv.close()
+    assert len(publisher) == 0
+    assert torn_down == ['/events']
+
+
+def test_slow_client_is_disconnected():
+    publisher = EventPublisher(queue_size=2)
+    subscription = publisher.subscribe()
+    for x in range(3):
+        publisher.publish(x)
+    assert len(publisher) == 0
+    assert subscription.closed
+    stream = EventStream._iter_subscription(subscription, 1)
+    assert list(stream) == [b'id: 1\ndata: 0\n\n', b'id: 2\ndata: 1\n\n']
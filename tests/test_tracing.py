@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.tracing
+    ~~~~~~~~~~~~~
+
+    Tests the request phase tracer.
+
+    :copyright: (c) 2015 by Armin Ronacher.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import time
+
+import keyes
+from keyes.tracing import RequestTracer, PhaseTimer
+
+
+def test_phase_timings_attached_to_request():
+    app = keyes.Keyes(__name__)
+    app.secret_key = 'testing'
+    RequestTracer(app)
+    recorded = []
+
+    @app.before_request
+    def before():
+        keyes.session['x'] = 1
+
+    @app.route('/')
+    def index():
+        recorded.append(keyes.request.phase_timings)
+        return keyes.render_template_string('{{ 42 }}')
+
+    @app.teardown_request
+    def teardown(exc):
+        pass
+
+    rv = app.test_client().get('/')
+    assert rv.data == b'42'
+    timings = recorded[0]
+    phases = [name for name, duration in timings.items()]
+    assert phases == ['routing', 'session_open', 'before_request', 'render',
+                      'view', 'serialize', 'session_save', 'teardown']
+    assert timings.total >= timings.get('view') >= timings.get('render')
+
+    header = rv.headers['Server-Timing']
+    assert header.startswith('routing;dur=')
+    assert 'render;dur=' in header
+    assert 'total;dur=' in header
+    assert 'teardown' not in header
+
+
+def test_no_timings_without_tracer():
+    app = keyes.Keyes(__name__)
+
+    @app.route('/')
+    def index():
+        assert keyes.request.phase_timings is None
+        with PhaseTimer('custom'):
+            pass
+        return 'x'
+
+    rv = app.test_client().get('/')
+    assert 'Server-Timing' not in rv.headers
+
+
+def test_server_timing_disabled_and_custom_phase():
+    app = keyes.Keyes(__name__)
+    RequestTracer(app, server_timing=False)
+
+    @app.route('/')
+    def index():
+        with PhaseTimer('database'):
+            pass
+        return keyes.jsonify(value=42)
+
+    rv = app.test_client().get('/')
+    assert 'Server-Timing' not in rv.headers
+
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        rv = app.dispatch_request()
+        timings = keyes.request.phase_timings
+        assert timings.get('database') is not None
+        assert timings.get('serialize') is not None
+
+
+def test_slow_hooks_reported():
+    app = keyes.Keyes(__name__)
+    reported = []
+
+    class Tracer(RequestTracer):
+        def report_slow_hook(self, kind, func, duration):
+            reported.append((kind, func))
+
+    Tracer(app, slow_hook_threshold=0.01)
+
+    def slow_before():
+        time.sleep(0.02)
+
+    def fast_before():
+        pass
+
+    app.before_request(slow_before)
+    app.before_request(fast_before)
+
+    @app.after_request
+    def slow_after(response):
+        time.sleep(0.02)
+        return response
+
+    @app.route('/')
+    def index():
+        return keyes.request.phase_timings.slow_hooks[0][1]
+
+    rv = app.test_client().get('/')
+    assert rv.data.decode('utf-8').endswith('slow_before')
+    assert reported == [('before_request', slow_before),
+                        ('after_request', slow_after)]
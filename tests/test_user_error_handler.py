@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from werkzeug.exceptions import Forbidden, InternalServerError
+from werkzeug.exceptions import Forbidden, InternalServerError, NotFound
 import keyes
 
 
@@ -138,3 +138,65 @@ def test_error_handler_blueprint():
 
     assert c.get('/error').data == b'app-error'
     assert c.get('/bp/error').data == b'bp-error'
+
+
+def test_error_handler_resolution_cache():
+    app = keyes.Keyes(__name__)
+
+    class CustomError(Exception):
+        pass
+
+    @app.route('/custom')
+    def custom():
+        raise CustomError()
+
+    c = app.test_client()
+    assert c.get('/missing').status_code == 404
+    assert app._error_handler_cache[(None, NotFound)] is None
+
+    @app.errorhandler(404)
+    def not_found(e):
+        return 'custom-404', 404
+
+    assert c.get('/missing').data == b'custom-404'
+    assert app._error_handler_cache[(None, NotFound)] is not_found
+
+    @app.errorhandler(Exception)
+    def handle_any(e):
+        return 'handled', 500
+
+    assert c.get('/custom').data == b'handled'
+    assert c.get('/custom').data == b'handled'
+    assert app._error_handler_cache[(None, CustomError)] is handle_any
+
+
+def test_error_handler_spec_assignment_clears_cache():
+    app = keyes.Keyes(__name__)
+    bp = keyes.Blueprint('bp', __name__)
+
+    @bp.route('/missing')
+    def missing():
+        keyes.abort(404)
+
+    app.register_blueprint(bp, url_prefix='/bp')
+    c = app.test_client()
+    assert c.get('/missing').status_code == 404
+    assert c.get('/bp/missing').status_code == 404
+    assert app._error_handler_cache
+
+    def page_not_found(e):
+        return 'assigned', 404
+    app.error_handler_spec[None][404] = {NotFound: page_not_found}
+    assert c.get('/missing').data == b'assigned'
+
+    def bp_not_found(e):
+        return 'bp-assigned', 404
+    app.error_handler_spec['bp'] = {}
+    app.error_handler_spec['bp'].setdefault(404, {})[NotFound] = bp_not_found
+    assert c.get('/bp/missing').data == b'bp-assigned'
+
+    del app.error_handler_spec['bp'][404][NotFound]
+    assert c.get('/bp/missing').data == b'assigned'
+    app.error_handler_spec[None].clear()
+    assert c.get('/missing').status_code == 404
+    assert c.get('/missing').data != b'assigned'